@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# Fetch a freeze into the working directory from its content-addressed
+# manifest (see freeze.py), replacing `aws s3 sync`. Only files whose hash
+# differs from the local copy are touched; blobs are kept in a local cache so
+# switching back to an older freeze costs no downloads at all. Files written
+# get the freeze's index time as their mtime, so a restored input doesn't look
+# fresher than it is (market_fetch.py dates stale copies by it).
+#
+# Index entries from before the manifest store point at a whole-tree zip
+# (".../freeze_37.zip"); those are downloaded once into the cache, checked
+# against the index hash, and unpacked the same way: only files whose hash
+# differs are replaced. `freeze.py import DIR ID` republishes one as a
+# manifest freeze.
+import argparse, hashlib, json, os, shutil, sys, time, zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from file_hashes import cached_sha256, load_hash_cache, save_hash_cache, sha256_file
+from freeze_store import (HASH_CACHE, blob_key, fetch_zip, freeze_time, split_manifest_uri,
+                          zip_members)
+from stage_metrics import record
+
+INDEX = "data/FREEZE_INDEX.json"
+BLOB_CACHE = os.path.join(".cache", "blobs")
+SKIP = (".env",)
+
+def pick_entry(index, version=None):
+    if version:
+        key = version if version in index else f"v{version}"
+        if key not in index:
+            raise SystemExit(f"Freeze {version} not in {INDEX}")
+        return key, index[key]
+    # Newest by ts; ts has one-second resolution, so ties go to the higher version
+    key = max(index, key=lambda k: (index[k].get("ts", ""), _version_number(k)))
+    return key, index[key]
+
+def _version_number(key):
+    try:
+        return int(key.lstrip("v"))
+    except ValueError:
+        return -1
+
+def _fetchable(args):
+    # Every freeze holds the index as it was before that freeze existed;
+    # fetching it would roll the index back and the next run would pick an
+    # older freeze, so the index being read is never replaced
+    index = os.path.relpath(os.path.abspath(args.index), os.path.abspath(args.dest))
+    keep = {INDEX, index.replace(os.sep, "/")}
+    return lambda rel: os.path.basename(rel) not in SKIP and rel not in keep
+
+def fetch_blob(backend, digest, cache_dir):
+    path = os.path.join(cache_dir, digest[:2], digest)
+    if os.path.exists(path):
+        return path, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    backend.get_file(blob_key(digest), tmp)
+    if sha256_file(tmp) != digest:
+        os.unlink(tmp)
+        raise ValueError(f"blob {digest} failed hash verification")
+    os.replace(tmp, path)
+    return path, True
+
+def _stamp(path, mtime):
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+def install(backend, rel, entry, dest, cache_dir, mtime=None):
+    blob, downloaded = fetch_blob(backend, entry["sha256"], cache_dir)
+    target = os.path.join(dest, rel)
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    shutil.copyfile(blob, tmp)
+    os.chmod(tmp, entry.get("mode", 0o644))
+    _stamp(tmp, mtime)
+    os.replace(tmp, target)
+    return rel, downloaded
+
+def sync_zip(version, entry, args, t0, mtime=None):
+    # Legacy freeze: whole-tree zip, cached by its hash from the index
+    name = entry["uri"].rpartition("/")[2]
+    try:
+        path, downloaded = fetch_zip(entry, os.path.join(args.cache_dir, "zips"))
+    except ValueError:
+        print(f"❌ {version}: {name} hash does not match {args.index}", file=sys.stderr)
+        return 3
+
+    cache = load_hash_cache(args.dest, HASH_CACHE)
+    updated = 0
+    with zipfile.ZipFile(path) as zf:
+        members = zip_members(zf)
+        wanted = list(filter(_fetchable(args), args.paths or members))
+        unknown = [rel for rel in wanted if rel not in members]
+        if unknown:
+            print(f"❌ {version}: not in freeze: {', '.join(unknown[:10])}", file=sys.stderr)
+            return 2
+        for rel in wanted:
+            data = zf.read(members[rel])
+            if cached_sha256(args.dest, rel, cache) == hashlib.sha256(data).hexdigest():
+                continue
+            target = os.path.join(args.dest, rel)
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            tmp = f"{target}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            _stamp(tmp, mtime)
+            os.replace(tmp, target)
+            cached_sha256(args.dest, rel, cache)
+            updated += 1
+    save_hash_cache(args.dest, cache, HASH_CACHE)
+
+    elapsed = time.perf_counter() - t0
+    record(freeze=version, files=len(wanted), updated=updated, downloaded=int(downloaded), legacy_zip=True)
+    print(f"Fetched {version} (legacy zip): {updated}/{len(wanted)} file(s) updated, "
+          f"{'downloaded' if downloaded else 'cached'} {name} in {elapsed:.2f}s")
+    return 0
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--version", default=os.getenv("FREEZE_VERSION"), help="e.g. v38 (default: newest)")
+    p.add_argument("--index", default=INDEX)
+    p.add_argument("--dest", default=".")
+    p.add_argument("--cache-dir", default=BLOB_CACHE)
+    p.add_argument("--workers", type=int, default=16)
+    p.add_argument("paths", nargs="*", help="only these files (default: whole freeze)")
+    args = p.parse_args()
+
+    t0 = time.perf_counter()
+    with open(args.index, encoding="utf-8") as f:
+        index = json.load(f)
+    version, entry = pick_entry(index, args.version)
+    mtime = freeze_time(entry["ts"]) if entry.get("ts") else None
+    if entry["uri"].endswith(".zip"):
+        return sync_zip(version, entry, args, t0, mtime)
+    try:
+        backend, freeze_id = split_manifest_uri(entry["uri"])
+    except ValueError as e:
+        print(f"❌ {version}: {e}", file=sys.stderr)
+        return 2
+
+    body = backend.get_bytes(f"manifests/freeze_{freeze_id}.json")
+    if hashlib.sha256(body).hexdigest() != entry["snapshot"]:
+        print(f"❌ {version}: manifest hash does not match {args.index}", file=sys.stderr)
+        return 3
+    files = json.loads(body)["files"]
+    wanted = list(filter(_fetchable(args), args.paths or files))
+    unknown = [rel for rel in wanted if rel not in files]
+    if unknown:
+        print(f"❌ {version}: not in freeze: {', '.join(unknown[:10])}", file=sys.stderr)
+        return 2
+
+    cache = load_hash_cache(args.dest, HASH_CACHE)
+    stale = [rel for rel in wanted if cached_sha256(args.dest, rel, cache) != files[rel]["sha256"]]
+
+    downloaded = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as ex:
+        for rel, got in ex.map(lambda rel: install(backend, rel, files[rel], args.dest,
+                                                   args.cache_dir, mtime), stale):
+            downloaded += got
+            cached_sha256(args.dest, rel, cache)
+    save_hash_cache(args.dest, cache, HASH_CACHE)
+
+    elapsed = time.perf_counter() - t0
+    record(freeze=version, files=len(wanted), updated=len(stale), downloaded=downloaded)
+    print(f"Fetched {version}: {len(stale)}/{len(wanted)} file(s) updated, "
+          f"{downloaded} blob(s) downloaded in {elapsed:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import argparse, json, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from freeze_store import (DEFAULT_EXCLUDES, create_freeze, load_manifest, open_backend,
+                          restore_freeze, walk_tree)
+import freeze_catalog
+
+STORE = os.getenv("FREEZE_STORE", "s3://daily-report-freezes-michael/daily-report/cas")
+INDEX = "data/FREEZE_INDEX.json"
+
+def update_index(path, freeze_id, stats):
+    index = read_index(path)
+    index[f"v{freeze_id}"] = {"snapshot": stats["snapshot"], "uri": stats["uri"], "ts": stats["ts"]}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+        f.write("\n")
+
+def read_index(path=INDEX):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def cmd_create(args, backend):
+    t0 = time.perf_counter()
+    excludes = DEFAULT_EXCLUDES + tuple(args.exclude)
+    manifest, stats = create_freeze(args.root, args.id, backend, excludes=excludes)
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    if not args.no_index:
+        update_index(os.path.join(args.root, INDEX), args.id, stats)
+        with freeze_catalog.connect(args.catalog) as db:
+            freeze_catalog.add_freeze(db, f"v{args.id}", stats, manifest)
+    print(f">>> Freeze {args.id}: {stats['files']} files ({stats['bytes']} bytes), "
+          f"hashed {stats['hashed']}, uploaded {stats['uploaded_blobs']} new blobs "
+          f"({stats['uploaded_bytes']} bytes) in {stats['seconds']}s")
+    print(f">>> Manifest {stats['uri']} sha256 {stats['snapshot']}")
+    return 0
+
+def cmd_import(args, backend):
+    # Publish an existing freeze directory (e.g. freeze_31/) as a manifest
+    # freeze and record it in this tree's index
+    if not os.path.isdir(args.dir):
+        print(f"❌ {args.dir} is not a directory", file=sys.stderr)
+        return 2
+    t0 = time.perf_counter()
+    # Dated by its newest file, not today, so it doesn't become the default
+    # freeze and restored files keep their age
+    newest = max((os.path.getmtime(os.path.join(args.dir, rel)) for rel in walk_tree(args.dir)),
+                 default=0)
+    ts = args.ts or time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(newest))
+    manifest, stats = create_freeze(args.dir, args.id, backend, created=ts)
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    update_index(args.index, args.id, stats)
+    with freeze_catalog.connect(args.catalog) as db:
+        freeze_catalog.add_freeze(db, f"v{args.id}", stats, manifest)
+    print(f">>> Imported {args.dir} as freeze {args.id}: {stats['files']} files, "
+          f"uploaded {stats['uploaded_blobs']} new blobs in {stats['seconds']}s")
+    print(f">>> Manifest {stats['uri']} sha256 {stats['snapshot']}")
+    return 0
+
+def cmd_restore(args, backend):
+    n = restore_freeze(backend, args.id, args.dest, paths=args.paths or None)
+    print(f"Restored {n} file(s) from freeze {args.id} into {args.dest}")
+    return 0
+
+def cmd_show(args, backend):
+    m = load_manifest(backend, args.id)
+    for path, e in sorted(m["files"].items()):
+        print(f"{e['sha256']}  {e['size']:>10}  {path}")
+    return 0
+
+def cmd_catalog(args, backend):
+    db = freeze_catalog.connect(args.catalog)
+    added = freeze_catalog.sync_index(db, read_index(args.index))
+    if added:
+        print(f"Catalogued {', '.join(added)}", file=sys.stderr)
+    if args.action == "sync":
+        return 0
+    if args.action == "versions":
+        for r in freeze_catalog.versions(db, args.since, args.until):
+            print(f"{r['version']:<8} {r['ts']}  {r['files']:>6} files  {r['bytes']:>12} bytes  {r['uri']}")
+    elif args.action == "files":
+        for r in freeze_catalog.files_in(db, args.arg):
+            print(f"{r['sha256']}  {r['size']:>10}  {r['path']}")
+    elif args.action == "path":
+        for r in freeze_catalog.find_path(db, args.arg):
+            print(f"{r['version']:<8} {r['ts']}  {r['sha256']}  {r['size']:>10}")
+    elif args.action == "hash":
+        for r in freeze_catalog.find_hash(db, args.arg):
+            print(f"{r['version']:<8} {r['ts']}  {r['sha256']}  {r['path']}")
+    elif args.action == "restore":
+        version, path = args.arg, args.path
+        dest = args.dest or os.path.basename(path)
+        digest = freeze_catalog.restore(db, version, path, dest)
+        print(f"Restored {path} from {version} ({digest[:12]}) to {dest}")
+    return 0
+
+def main():
+    p = argparse.ArgumentParser(description="Content-addressed freeze bundles")
+    p.add_argument("--store", default=STORE, help="s3://bucket/prefix or file:///dir (env FREEZE_STORE)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    c = sub.add_parser("create", help="snapshot the working tree as freeze ID")
+    c.add_argument("id")
+    c.add_argument("--root", default=".")
+    c.add_argument("--exclude", action="append", default=[], help="extra glob to skip (trailing / = directories only, leading / = from the root)")
+    c.add_argument("--no-index", action="store_true", help=f"don't record the freeze in {INDEX}")
+
+    m = sub.add_parser("import", help="publish an existing freeze directory (freeze_NN/) as freeze ID")
+    m.add_argument("dir")
+    m.add_argument("id")
+    m.add_argument("--index", default=INDEX)
+    m.add_argument("--ts", help="freeze timestamp for the index (default: newest file mtime)")
+
+    r = sub.add_parser("restore", help="materialise a freeze (or some of its files)")
+    r.add_argument("id")
+    r.add_argument("dest")
+    r.add_argument("paths", nargs="*")
+
+    s = sub.add_parser("show", help="list the files in a freeze")
+    s.add_argument("id")
+
+    k = sub.add_parser("catalog", help="query the freeze catalog (synced from the index first)")
+    k.add_argument("action", choices=("sync", "versions", "files", "path", "hash", "restore"))
+    k.add_argument("arg", nargs="?", help="version (files/restore), path (path) or sha256 prefix (hash)")
+    k.add_argument("path", nargs="?", help="restore: file path inside the freeze")
+    k.add_argument("dest", nargs="?", help="restore: output path (default: basename)")
+    k.add_argument("--since", help="versions: ISO timestamp lower bound")
+    k.add_argument("--until", help="versions: ISO timestamp upper bound")
+    k.add_argument("--index", default=INDEX)
+
+    p.add_argument("--catalog", default=freeze_catalog.CATALOG, help="SQLite catalog (env FREEZE_CATALOG)")
+    args = p.parse_args()
+    if args.cmd == "catalog":
+        if args.action in ("files", "path", "hash", "restore") and not args.arg:
+            p.error(f"catalog {args.action} needs an argument")
+        if args.action == "restore" and not args.path:
+            p.error("catalog restore needs VERSION PATH [DEST]")
+        return cmd_catalog(args, None)
+    backend = open_backend(args.store)
+    return {"create": cmd_create, "import": cmd_import, "restore": cmd_restore,
+            "show": cmd_show}[args.cmd](args, backend)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,31 +1,13 @@
 #!/bin/bash
 set -euo pipefail
 
+# Thin wrapper kept for muscle memory; see freeze.py for the content-addressed
+# store (FREEZE_STORE=s3://bucket/prefix or file:///dir).
 FREEZE_ID="${1:-}"
-FREEZE_DIR="freeze_${FREEZE_ID}"
-ZIP_FILE="${FREEZE_DIR}.zip"
-BUCKET="daily-report-freezes-michael"
-KEY="daily-report/${ZIP_FILE}"
+if [[ -z "${FREEZE_ID}" ]]; then
+  echo "usage: $0 FREEZE_ID" >&2
+  exit 2
+fi
 
-echo ">>> Creating ${FREEZE_DIR} ..."
-mkdir -p "${FREEZE_DIR}"
-
-echo ">>> Copying files (excluding old freezes) ..."
-rsync -a --exclude 'freeze_*' --exclude '.env' ./ "${FREEZE_DIR}/"
-
-echo ">>> Zipping to ${ZIP_FILE} ..."
-zip -r "${ZIP_FILE}" "${FREEZE_DIR}" >/dev/null
-
-echo ">>> Calculating SHA-256 ..."
-shasum -a 256 "${ZIP_FILE}"
-
-echo ">>> Uploading to S3 using instance role ..."
-aws s3 cp "${ZIP_FILE}" "s3://${BUCKET}/${KEY}"
-
-echo ">>> Verifying upload ..."
-aws s3api head-object \
-  --bucket "${BUCKET}" \
-  --key "${KEY}" \
-  --query '{Size:ContentLength, ETag:ETag, LastModified:LastModified}'
-
-echo ">>> Done. Freeze ${FREEZE_ID} available at s3://${BUCKET}/${KEY}"
+cd "$(dirname "$0")"
+exec python3 freeze.py create "${FREEZE_ID}"
@@ -1,118 +1,219 @@
 #!/usr/bin/env python3
-import json, csv, sys, os, html
+import json, sys, os, html, hashlib, re, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from report_model import WatchlistRow, Dividend, NewsItem, iter_records
+from stage_metrics import run_main
+
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", ".cache/templates")
+INPUT_SNAPSHOT = os.getenv("INPUT_SNAPSHOT")  # packed inputs instead of the loose files
+MARKET_STATUS = os.getenv("MARKET_STATUS", "market_status.json")  # from src/market_fetch.py
+QUOTE_JSON = os.getenv("QUOTE_JSON", "quote.json")  # from src/quote_store.py pick
+COMPILED_VERSION = 1
+DEFAULT_RECOMMENDATION = "Maintain core positions; add selectively on weakness."
+
+PLACEHOLDER_RE = re.compile(r"\{\{[^}]+\}\}")
+PLACEHOLDERS = (
+    "{{UK_CPI}}", "{{US_CPI}}", "{{WTI}}",
+    "{{NEWS_GENERAL}}", "{{NEWS_FINANCE}}",
+    "{{WATCHLIST_ROWS}}", "{{DIVIDEND_ROWS}}",
+    "{{RECOMMENDATION}}", "{{QUOTE}}", "{{QUOTE_ATTR}}",
+    "{{STALE_NEWS}}", "{{STALE_MACRO}}", "{{STALE_PRICES}}", "{{STALE_DIVIDENDS}}",
+)
+# Staleness markers: market_fetch.py sources behind each section
+STALE_SOURCES = {
+    "{{STALE_NEWS}}": ("news_general", "news_finance"),
+    "{{STALE_MACRO}}": ("macro",),
+    "{{STALE_PRICES}}": ("prices",),
+    "{{STALE_DIVIDENDS}}": ("dividends",),
+}
 
-tpl_path = sys.argv[1] if len(sys.argv) > 1 else "daily_report_full.html"
-out_path = sys.argv[2] if len(sys.argv) > 2 else "daily_report_rendered.html"
+# Record fields shown under the template's table headers
+WL_COLUMNS  = ("ticker", "name", "last")
+DIV_COLUMNS = ("ticker", "ex_date", "pay_date", "amount")
+
+def tokenize(src):
+    # Split the template once into [literal, placeholder, literal, ...] segments
+    segs, pos = [], 0
+    for m in PLACEHOLDER_RE.finditer(src):
+        if m.start() > pos:
+            segs.append(("lit", src[pos:m.start()]))
+        segs.append(("ph", m.group(0)))
+        pos = m.end()
+    if pos < len(src):
+        segs.append(("lit", src[pos:]))
+    return segs
+
+def compile_template(path, cache_dir=TEMPLATE_CACHE_DIR):
+    with open(path, "rb") as f:
+        raw = f.read()
+    key = hashlib.sha256(raw).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{key}.v{COMPILED_VERSION}.json")
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            return [tuple(s) for s in json.load(f)]
+    except (OSError, ValueError):
+        pass
+    segs = tokenize(raw.decode("utf-8"))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(segs, f)
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass  # the cache is only an optimisation
+    return segs
+
+def unknown_placeholders(segs):
+    return sorted({v for kind, v in segs if kind == "ph" and v not in PLACEHOLDERS})
+
+def render(segs, values, out_path):
+    # A value is either a string or a zero-arg callable returning an iterable
+    # of chunks, so large sections stream straight into the file.
+    with open(out_path, "w", encoding="utf-8") as f:
+        for kind, v in segs:
+            if kind == "lit":
+                f.write(v)
+            elif callable(values[v]):
+                f.writelines(values[v]())
+            else:
+                f.write(values[v])
 
 def read_json(p):
     try:
         with open(p, encoding="utf-8") as f: return json.load(f)
-    except Exception:
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"⚠️ {p} is unreadable, rendering without it: {e}\n")
         return {}
 
-def read_csv_rows(p):
+def iter_rows(p, cls):
+    try:
+        yield from iter_records(p, cls)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"⚠️ {p} is unreadable, rendering without it: {e}\n")
+
+def read_news(kind):
+    from news_normalize import load_news
     try:
-        with open(p, newline="", encoding="utf-8") as f:
-            return list(csv.DictReader(f))
-    except Exception:
+        return load_news(kind)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"⚠️ {kind} news feed is unreadable, rendering without it: {e}\n")
         return []
 
-macro        = read_json("macro.json") or {}
-news_general = read_json("news_general.json") or {}
-news_finance = read_json("news_finance.json") or {}
-watchlist    = read_csv_rows("prices.csv")
-dividends    = read_csv_rows("dividends.csv")
-
-def find_list(blob):
-    # Normalize to a list of items from many possible shapes
-    if isinstance(blob, list):
-        return blob
-    if not isinstance(blob, dict):
-        return []
-    for path in (
-        ("articles",),
-        ("items",),
-        ("news",),
-        ("data","articles"),
-        ("payload","items"),
-        ("results",),
-    ):
-        cur = blob
-        ok = True
-        for k in path:
-            if isinstance(cur, dict) and k in cur:
-                cur = cur[k]
-            else:
-                ok = False
-                break
-        if ok and isinstance(cur, list):
-            return cur
-    return []
-
-def li_news(blob):
-    items = find_list(blob)
-    lis = []
+def read_quote(doc):
+    # (text, author) the quotes stage picked; None if it picked nothing
+    text = (doc or {}).get("text")
+    return (str(text), str(doc.get("author") or "")) if text else None
+
+def stale_marker(status, names):
+    # "" unless a source behind the section was served from an old copy
+    sources = (status or {}).get("sources") or {}
+    stale = [sources[n] for n in names if (sources.get(n) or {}).get("stale")]
+    if not stale:
+        return ""
+    times = [st.get("as_of") for st in stale]
+    when = ("as of " + time.strftime("%d %b %H:%M UTC", time.gmtime(min(times)))
+            if all(isinstance(t, (int, float)) for t in times) else "not updated today")
+    return f' <small class="stale">(stale: {when})</small>'
+
+def li_news(items):
+    empty = True
     for it in items:
-        if not isinstance(it, dict): 
-            continue
-        title = it.get("title") or it.get("headline") or it.get("name") or it.get("summary") or ""
-        url   = it.get("url")   or it.get("link")     or it.get("href")    or "#"
-        if not title:
-            continue
-        lis.append(f'<li><a href="{html.escape(str(url))}">{html.escape(str(title))}</a></li>')
-    return "<li>No items</li>" if not lis else "".join(lis)
+        empty = False
+        copies = f" <small>({it.copies} reports)</small>" if (it.copies or 1) > 1 else ""
+        yield f'<li><a href="{html.escape(it.url)}">{html.escape(it.title)}</a>{copies}</li>'
+    if empty:
+        yield "<li>No items</li>"
+
+def cell(v):
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        return f"{v:.2f}"
+    return html.escape(str(v))
 
 def table_rows(rows, keys, empty_cols=3):
-    if not rows:
-        return f"<tr><td colspan='{empty_cols}'>No data</td></tr>"
-    out=[]
+    empty = True
     for r in rows:
-        tds = [f"<td>{html.escape(str(r.get(k,'')))}</td>" for k in keys]
-        out.append("<tr>"+"".join(tds)+"</tr>")
-    return "".join(out)
-
-# Column guesses
-wl_keys = ("Ticker","Name","Price")
-if watchlist and not all(k in watchlist[0] for k in wl_keys):
-    wl_keys = tuple(list(watchlist[0].keys())[:3])
-
-div_keys = ("Ticker","Ex-Date","Pay Date","Amount")
-if dividends and not all(k in dividends[0] for k in div_keys):
-    div_keys = tuple(list(dividends[0].keys())[:4])
-
-# Map your actual macro keys → template placeholders
-UK_CPI = macro.get("UK_CPI") or macro.get("uk_cpi_yoy") or ""
-US_CPI = macro.get("US_CPI") or macro.get("us_cpi_yoy") or ""
-WTI    = macro.get("WTI")    or macro.get("wti")        or ""
-
-RECO   = macro.get("RECOMMENDATION") or macro.get("recommendation") or macro.get("note") or ""
-QUOTE  = macro.get("QUOTE")          or (macro.get("quote") or {}).get("text")   or macro.get("quote_text")  or ""
-QATTR  = macro.get("QUOTE_ATTR")     or (macro.get("quote") or {}).get("author") or macro.get("quote_author") or ""
-
-repl = {
-    "{{UK_CPI}}":         str(UK_CPI),
-    "{{US_CPI}}":         str(US_CPI),
-    "{{WTI}}":            str(WTI),
-    "{{NEWS_GENERAL}}":   li_news(news_general),
-    "{{NEWS_FINANCE}}":   li_news(news_finance),
-    "{{WATCHLIST_ROWS}}": table_rows(watchlist, wl_keys),
-    "{{DIVIDEND_ROWS}}":  table_rows(dividends, div_keys),
-    "{{RECOMMENDATION}}": html.escape(str(RECO)),
-    "{{QUOTE}}":          html.escape(str(QUOTE)),
-    "{{QUOTE_ATTR}}":     html.escape(str(QATTR)),
-}
-
-html_src = open(tpl_path, encoding="utf-8").read()
-for k, v in repl.items():
-    html_src = html_src.replace(k, v)
-
-with open(out_path, "w", encoding="utf-8") as f:
-    f.write(html_src)
-
-if "{{" in html_src and "}}" in html_src:
-    import re, sys
-    missing = sorted(set(re.findall(r"\{\{[^}]+\}\}", html_src)))
-    sys.stderr.write("Unfilled placeholders remain: " + ", ".join(missing[:10]) + "\n")
-    sys.exit(2)
-
-print(f"Wrote {out_path}")
+        empty = False
+        tds = [f"<td>{cell(getattr(r, k))}</td>" for k in keys]
+        yield "<tr>"+"".join(tds)+"</tr>"
+    if empty:
+        yield f"<tr><td colspan='{empty_cols}'>No data</td></tr>"
+
+def main():
+    tpl_path = sys.argv[1] if len(sys.argv) > 1 else "daily_report_full.html"
+    out_path = sys.argv[2] if len(sys.argv) > 2 else "daily_report_rendered.html"
+
+    # Compile (or load the cached compile) before touching any data, so a
+    # broken template fails fast.
+    segs = compile_template(tpl_path)
+    unknown = unknown_placeholders(segs)
+    if unknown:
+        sys.stderr.write("Unknown placeholders in template: " + ", ".join(unknown[:10]) + "\n")
+        return 2
+
+    if INPUT_SNAPSHOT:
+        # Checksums are verified up front: a damaged snapshot fails the render
+        # instead of quietly turning into "No data" sections
+        from input_snapshot import Snapshot, SnapshotError
+        try:
+            snap = Snapshot(INPUT_SNAPSHOT)
+            snap.verify()
+        except (OSError, SnapshotError) as e:
+            sys.stderr.write(f"Input snapshot unusable: {e}\n")
+            return 2
+        macro = snap.json("macro")
+        status = snap.json("market_status") if "market_status" in snap.sections else {}
+        quote = snap.json("quote") if "quote" in snap.sections else {}
+        news_general = lambda: snap.records("news_general", NewsItem)
+        news_finance = lambda: snap.records("news_finance", NewsItem)
+        prices = lambda: snap.records("prices", WatchlistRow)
+        dividends = lambda: snap.records("dividends", Dividend)
+    else:
+        macro = read_json("macro.json") or {}
+        status = read_json(MARKET_STATUS)
+        quote = read_json(QUOTE_JSON)
+        # news.json from the normalizer stage, else the raw feeds streamed
+        general, finance = read_news("general"), read_news("finance")
+        news_general = lambda: iter(general)
+        news_finance = lambda: iter(finance)
+        prices = lambda: iter_rows("prices.csv", WatchlistRow)
+        dividends = lambda: iter_rows("dividends.csv", Dividend)
+
+    # Map your actual macro keys → template placeholders
+    UK_CPI = macro.get("UK_CPI") or macro.get("uk_cpi_yoy") or ""
+    US_CPI = macro.get("US_CPI") or macro.get("us_cpi_yoy") or ""
+    WTI    = macro.get("WTI")    or macro.get("wti")        or ""
+
+    RECO   = macro.get("RECOMMENDATION") or macro.get("recommendation") or macro.get("note") or DEFAULT_RECOMMENDATION
+    # Quote of the day as picked by the quotes stage; macro.json only as a fallback
+    QUOTE, QATTR = read_quote(quote) or (
+        macro.get("QUOTE")      or (macro.get("quote") or {}).get("text")   or macro.get("quote_text")  or "",
+        macro.get("QUOTE_ATTR") or (macro.get("quote") or {}).get("author") or macro.get("quote_author") or "")
+
+    repl = {
+        "{{UK_CPI}}":         str(UK_CPI),
+        "{{US_CPI}}":         str(US_CPI),
+        "{{WTI}}":            str(WTI),
+        "{{NEWS_GENERAL}}":   lambda: li_news(news_general()),
+        "{{NEWS_FINANCE}}":   lambda: li_news(news_finance()),
+        "{{WATCHLIST_ROWS}}": lambda: table_rows(prices(), WL_COLUMNS),
+        "{{DIVIDEND_ROWS}}":  lambda: table_rows(dividends(), DIV_COLUMNS),
+        "{{RECOMMENDATION}}": html.escape(str(RECO)),
+        "{{QUOTE}}":          html.escape(str(QUOTE)),
+        "{{QUOTE_ATTR}}":     html.escape(str(QATTR)),
+    }
+    repl.update({ph: stale_marker(status, names) for ph, names in STALE_SOURCES.items()})
+
+    render(segs, repl, out_path)
+    print(f"Wrote {out_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run_main(main))
@@ -9,47 +9,84 @@ if [[ -d .venv ]]; then
   source .venv/bin/activate
 fi
 
-# 1) Pull the freeze bundle (keep your current source; change when you version-bump)
-aws s3 sync "s3://daily-report-freezes-michael/daily-report/freeze_31/" . --exclude ".env" || true
+# Per-stage timing: one JSON line per stage in $STAGE_LOG.
+# `run_daily_report.sh --profile` also dumps cProfile/tracemalloc for Python stages.
+export STAGE_LOG="${STAGE_LOG:-stage_timings.jsonl}"
+if [[ "${1:-}" == "--profile" ]]; then
+  export STAGE_PROFILE_DIR="profiles/$(date -u +%Y%m%dT%H%M%SZ)"
+fi
+stage() {
+  local name="$1"; shift
+  python3 src/stage_metrics.py --stage "$name" -- "$@"
+}
 
-# 2) Load mail/env settings for Postmark
+# 0b) Load settings: Postmark, market data API keys (EODHD/FRED/NewsAPI)
 set -a
 # shellcheck disable=SC1091
 source .env
 set +a
 
-# 3) Normalize news JSON into a predictable { "articles": [ {title,url} ] } shape
-if command -v jq >/dev/null 2>&1; then
-  jq '{articles: ((.articles? // .items? // .news? // .data?.articles? // .payload?.items? // .results?)
-        | map({title: (.title // .headline // .name // .summary // ""),
-                url:   (.url   // .link     // .href    // "#")})))}' \
-    news_general.json > news_general.normalized.json && mv news_general.normalized.json news_general.json || true
-
-  jq '{articles: ((.articles? // .items? // .news? // .data?.articles? // .payload?.items? // .results?)
-        | map({title: (.title // .headline // .name // .summary // ""),
-                url:   (.url   // .link     // .href    // "#")})))}' \
-    news_finance.json > news_finance.normalized.json && mv news_finance.normalized.json news_finance.json || true
+# 1) Pull the freeze: the newest in data/FREEZE_INDEX.json, no longer a fixed
+#    freeze_31. Pin one with FREEZE_VERSION (e.g. v31 after `freeze.py import
+#    freeze_31 31`). Only files whose hash changed are replaced (legacy zip
+#    freezes too), never the index itself; failures are logged, not hidden.
+if ! stage fetch python3 fetch_snapshot.py; then
+  echo "⚠️ Freeze fetch failed; rendering from the files already on disk." >&2
+fi
+
+# 1a) Refresh prices, dividends, macro and the raw news feeds from the market
+#     data APIs (src/market_fetch.py: concurrent, HTTP-cached in .cache/http).
+#     Each source has a latency budget (FETCH_BUDGET_<SOURCE>); one that fails
+#     or runs over is served from its last-known-good copy, flagged stale in
+#     the report, and finished in the background for the next run.
+if ! stage market python3 src/market_fetch.py; then
+  echo "⚠️ Some market data could not be fetched; using the files on disk for those." >&2
+fi
+
+# 1b) Record today's closes in the price history store (data/price_history).
+#     Skipped when market_status.json says prices.csv is a stale copy, so an
+#     old close is never stored under today's date.
+if ! stage history python3 src/price_history.py append prices.csv; then
+  echo "⚠️ Could not append today's closes to the price history." >&2
+fi
+
+# 1c) Referential integrity: tickers must exist in data/stock.csv, ISINs must
+#     have valid check digits. Reported, not fatal: unknown tickers still render.
+if ! stage integrity python3 src/validators/integrity.py; then
+  echo "⚠️ Referential integrity problems found (see above)." >&2
+fi
+
+# 3) Normalize the news feeds into news.json: top 5 general + top 5 financial,
+#    streamed so feed size doesn't matter. Render falls back to the raw feeds.
+if ! stage news python3 src/news_normalize.py; then
+  echo "⚠️ News normalization failed; rendering from the raw feeds." >&2
+  rm -f news.json
 fi
 
-# 4) Quote + default recommendation into macro.json (cheap, reliable)
-if [[ ! -f quotes.txt ]]; then
-  cat > quotes.txt <<'TXT'
-Everything compounds.|Charlie Munger
-In investing, what is comfortable is rarely profitable.|Robert Arnott
-It's supposed to be hard. If it were easy, everyone would do it.|Tom Hanks
-The stock market transfers money from the impatient to the patient.|Warren Buffett
-TXT
+# 4) Quote of the day from the quote store (deduplicated quotes.txt, no
+#    repeats within $QUOTE_WINDOW days), written to quote.json for render.
+if ! stage quotes python3 src/quote_store.py pick; then
+  echo "⚠️ Could not pick a quote from quotes.txt; the report will have no quote." >&2
+  rm -f quote.json
 fi
-if command -v shuf >/dev/null 2>&1; then
-  IFS='|' read -r QTEXT QAUTH < <(shuf -n 1 quotes.txt)
-  jq --arg qt "$QTEXT" --arg qa "$QAUTH" \
-     '.QUOTE=$qt | .QUOTE_ATTR=$qa | .RECOMMENDATION //= "Maintain core positions; add selectively on weakness."' \
-     macro.json > /tmp/m && mv /tmp/m macro.json
+
+# 4b) Watchlist sparklines (cached per series; a failure leaves the previous images)
+if ! stage sparklines python3 src/sparklines.py; then
+  echo "⚠️ Sparkline generation failed; keeping existing sparkline files." >&2
+fi
+
+# 4c) Pack the inputs into one checksummed snapshot; render reads only that.
+#     If packing fails (e.g. malformed JSON), fall back to the loose files.
+if stage pack python3 src/input_snapshot.py pack -o daily_inputs.snap; then
+  export INPUT_SNAPSHOT=daily_inputs.snap
+else
+  echo "⚠️ Could not pack inputs; rendering from the loose files." >&2
+  unset INPUT_SNAPSHOT
 fi
 
 # 5) Render HTML from the template + data
 #    This writes daily_report_rendered.html and fails if placeholders remain.
-python3 render_template.py daily_report_full.html daily_report_rendered.html
+stage render python3 render_template.py daily_report_full.html daily_report_rendered.html
 
 # 6) Sanity guard – refuse to send a template
 if grep -q "{{" daily_report_rendered.html; then
@@ -59,6 +96,6 @@ fi
 
 # 7) Send via Postmark
 export HTML_PATH=daily_report_rendered.html
-python3 send_report.py
+stage send python3 send_report.py
 
 echo "✅ Daily Report pipeline completed."
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# Cold-start (one process per render) and warm (reused Renderer) latency of
+# src/email_renderer.py, with no cache, bytecode cache and precompiled modules.
+import argparse, json, os, statistics, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_DIR = os.path.join(ROOT, "templates", "email")
+RENDERER = os.path.join(ROOT, "src", "email_renderer.py")
+
+PAYLOAD = {
+    "subject": "Daily Report — bench",
+    "headline": "Daily Report — bench",
+    "exec_summary": [f"Line {i}" for i in range(5)],
+    "movers": [{"ticker": f"T{i}", "name": f"Name {i}", "delta_pct": (i % 9) - 4} for i in range(50)],
+    "dividends": [],
+    "news": [],
+}
+
+def cold(tmp, extra, runs):
+    data = os.path.join(tmp, "payload.json")
+    times = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, RENDERER, "--template-dir", TEMPLATE_DIR, "--data", data,
+                        "--snapshot", "bench", "--freeze", "0", "--out", os.path.join(tmp, "out.html")]
+                       + extra, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    return times
+
+def warm(runs, **kw):
+    sys.path.insert(0, os.path.join(ROOT, "src"))
+    from email_renderer import Renderer
+    t0 = time.perf_counter()
+    r = Renderer(TEMPLATE_DIR, **kw)
+    first = time.perf_counter() - t0
+    times = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        r.render(PAYLOAD, "bench", str(i))
+        times.append(time.perf_counter() - t0)
+    return first, times
+
+def ms(xs):
+    return f"median {statistics.median(xs) * 1e3:7.2f} ms  p95 {sorted(xs)[int(len(xs) * .95) - 1] * 1e3:7.2f} ms"
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--cold-runs", type=int, default=10)
+    p.add_argument("--warm-runs", type=int, default=2000)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "payload.json"), "w", encoding="utf-8") as f:
+            json.dump(PAYLOAD, f)
+        bcc = os.path.join(tmp, "bcc")
+        compiled = os.path.join(tmp, "compiled")
+        subprocess.run([sys.executable, RENDERER, "--template-dir", TEMPLATE_DIR,
+                        "--precompile", compiled], check=True, stdout=subprocess.DEVNULL)
+        cold(tmp, ["--cache-dir", bcc], 1)  # prime the bytecode cache
+
+        print("cold start, one process per render:")
+        print(f"  no cache        {ms(cold(tmp, ['--cache-dir', ''], args.cold_runs))}")
+        print(f"  bytecode cache  {ms(cold(tmp, ['--cache-dir', bcc], args.cold_runs))}")
+        print(f"  precompiled     {ms(cold(tmp, ['--compiled-dir', compiled], args.cold_runs))}")
+
+        first, times = warm(args.warm_runs, cache_dir=None)
+        print(f"warm, reused Renderer ({args.warm_runs} renders):")
+        print(f"  first render setup {first * 1e3:.2f} ms (compile from source)")
+        print(f"  per render      {ms(times)}")
+
+if __name__ == "__main__":
+    main()
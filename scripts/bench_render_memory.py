@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# Peak RSS of render_template.py as prices.csv grows; should stay flat.
+import argparse, csv, os, shutil, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_prices(path, n):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["ticker", "name", "last", "prev_close", "month_ago_close"])
+        for i in range(n):
+            w.writerow([f"T{i:06d}", f"Company {i}", "101.25", "100.00", "95.50"])
+
+def run_once(workdir):
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "render_template.py"),
+         "daily_report_full.html", "out.html"],
+        cwd=workdir, stdout=subprocess.DEVNULL,
+    )
+    _, status, ru = os.wait4(proc.pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise SystemExit(f"render failed in {workdir}")
+    return time.perf_counter() - t0, ru.ru_maxrss
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", default="8,1000,20000,200000")
+    args = p.parse_args()
+
+    print(f"{'rows':>8} {'wall_s':>8} {'max_rss_kb':>11} {'out_mb':>7}")
+    for n in (int(x) for x in args.rows.split(",")):
+        with tempfile.TemporaryDirectory() as d:
+            for name in ("daily_report_full.html", "macro.json", "news_general.json",
+                         "news_finance.json", "dividends.csv"):
+                shutil.copy(os.path.join(ROOT, name), d)
+            write_prices(os.path.join(d, "prices.csv"), n)
+            wall, rss = run_once(d)
+            size = os.path.getsize(os.path.join(d, "out.html")) / 1e6
+            print(f"{n:>8} {wall:>8.3f} {rss:>11} {size:>7.1f}")
+
+if __name__ == "__main__":
+    main()
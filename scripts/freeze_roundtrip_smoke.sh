@@ -0,0 +1,40 @@
+#!/usr/bin/env bash
+# Freeze the working tree into a scratch file:// store, fetch it into an empty
+# directory and check every tracked file comes back byte for byte, except the
+# ones freezes leave out on purpose (vendored aws/, old freeze_NN/ bundles,
+# .env) and the index, which a fetch never replaces.
+set -euo pipefail
+PYBIN="$(command -v python || command -v python3)"
+
+WORK="$(mktemp -d)"
+trap 'rm -rf "$WORK"' EXIT
+
+$PYBIN - "$WORK" <<'PY'
+import json, os, sys
+sys.path.insert(0, "src")
+from freeze_store import LocalBackend, create_freeze
+work = sys.argv[1]
+_, stats = create_freeze(".", "roundtrip", LocalBackend(os.path.join(work, "store")))
+with open(os.path.join(work, "index.json"), "w", encoding="utf-8") as f:
+    json.dump({"v0": {k: stats[k] for k in ("snapshot", "uri", "ts")}}, f)
+PY
+$PYBIN fetch_snapshot.py --index "$WORK/index.json" --version v0 --dest "$WORK/tree" \
+  --cache-dir "$WORK/blobs" >/dev/null
+
+missing=0
+while IFS= read -r -d '' rel; do
+  case "$rel" in
+    aws/*|freeze_[0-9]*/*|.env|data/FREEZE_INDEX.json) continue ;;
+  esac
+  [ -f "$rel" ] || continue  # tracked but deleted in this checkout
+  if ! cmp -s "$rel" "$WORK/tree/$rel"; then
+    echo "❌ not restored by freeze + fetch: $rel" >&2
+    missing=$((missing + 1))
+  fi
+done < <(git ls-files -z)
+
+if [ "$missing" -ne 0 ]; then
+  echo "❌ $missing tracked file(s) lost in the freeze round trip" >&2
+  exit 1
+fi
+echo "✅ Freeze round trip restored every tracked file"
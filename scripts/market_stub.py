@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# Local stand-in for the EODHD, FRED and NewsAPI endpoints src/market_fetch.py
+# uses, for tests and benchmarks. Data is deterministic per symbol/series and
+# day; every response carries an ETag and If-None-Match is answered with 304.
+# Speaks HTTP/1.1 keep-alive, can inject 429/503 responses and latency, and
+# prints request/connection counts on exit. Point the fetcher at it with
+# EODHD_BASE=FRED_BASE=NEWS_BASE=http://127.0.0.1:8026.
+import argparse, gzip, hashlib, json, random, signal, sys, threading, time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+STATS = {"connections": 0, "requests": 0, "not_modified": 0, "injected_errors": 0}
+LOCK = threading.Lock()
+
+def _h(*parts):
+    return int.from_bytes(hashlib.sha256("|".join(map(str, parts)).encode()).digest()[:8], "big")
+
+def _price(code, day):
+    base = 20 + _h(code) % 500
+    return round(base * (1 + (_h(code, day) % 2001 - 1000) / 20000), 2)
+
+def quote(sym, today):
+    code = sym.rpartition(".")[0] or sym
+    prev = (today - timedelta(days=1)).isoformat()
+    return {"code": sym, "timestamp": int(time.time()), "close": _price(code, today.isoformat()),
+            "previousClose": _price(code, prev), "change_p": 0}
+
+def eod_bulk(exchange, day, symbols):
+    if date.fromisoformat(day).weekday() >= 5:
+        return []
+    return [{"code": c, "exchange_short_name": exchange, "date": day, "close": _price(c, day)}
+            for c in symbols]
+
+def dividends(sym, since):
+    if _h(sym, "div") % 3:
+        return []
+    ex = date.fromisoformat(since) + timedelta(days=_h(sym, "ex") % 40)
+    cur = "GBX" if sym.endswith(".LSE") else "USD"
+    value = round(0.5 + _h(sym, "amt") % 300 / 100, 2)
+    return [{"date": ex.isoformat(), "paymentDate": (ex + timedelta(days=30)).isoformat(),
+             "value": value, "currency": cur}]
+
+def observations(series, limit):
+    today = date.today()
+    monthly = series != "DCOILWTICO"
+    out, d = [], today.replace(day=1) if monthly else today
+    while len(out) < limit:
+        if monthly:
+            n = d.year * 12 + d.month
+            level = 250 * 1.025 ** ((n - 24000) / 12) * (1 + _h(series, n) % 30 / 10000)
+            out.append({"date": d.isoformat(), "value": f"{level:.3f}"})
+            d = (d - timedelta(days=1)).replace(day=1)
+        else:
+            if d.weekday() < 5:
+                out.append({"date": d.isoformat(), "value": f"{70 + _h(series, d) % 1500 / 100:.2f}"})
+            d -= timedelta(days=1)
+    return {"observations": out}
+
+def headlines(category):
+    return {"status": "ok", "totalResults": 20, "articles": [
+        {"title": f"{category.title()} story {i}", "url": f"https://news.example/{category}/{i}",
+         "publishedAt": f"{date.today().isoformat()}T{i:02d}:00:00Z"} for i in range(20)]}
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 1 << 16  # headers and body in one segment (no Nagle stall on keep-alive)
+    fail_rate = 0.0
+    latency = 0.0
+
+    def setup(self):
+        super().setup()
+        with LOCK:
+            STATS["connections"] += 1
+
+    def log_message(self, *a):
+        pass
+
+    def _reply(self, status, obj, headers=()):
+        body = json.dumps(obj).encode("utf-8") if obj is not None else b""
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            with LOCK:
+                STATS["not_modified"] += 1
+            status, body = 304, b""
+        gz = status == 200 and "gzip" in self.headers.get("Accept-Encoding", "") and len(body) > 512
+        if gz:
+            body = gzip.compress(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status in (200, 304):
+            self.send_header("ETag", etag)
+        if gz:
+            self.send_header("Content-Encoding", "gzip")
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with LOCK:
+            STATS["requests"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            with LOCK:
+                STATS["injected_errors"] += 1
+            code = random.choice((429, 503))
+            return self._reply(code, {"message": "injected"}, [("Retry-After", "0")])
+        u = urlsplit(self.path)
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        parts = u.path.strip("/").split("/")
+        today = date.today()
+        if parts[:2] == ["api", "real-time"] and len(parts) == 3:
+            syms = [parts[2]] + [s for s in q.get("s", "").split(",") if s]
+            data = [quote(s, today) for s in syms]
+            return self._reply(200, data if len(data) > 1 else data[0])
+        if parts[:2] == ["api", "eod-bulk-last-day"] and len(parts) == 3:
+            return self._reply(200, eod_bulk(parts[2], q.get("date", today.isoformat()),
+                                             [s for s in q.get("symbols", "").split(",") if s]))
+        if parts[:2] == ["api", "div"] and len(parts) == 3:
+            return self._reply(200, dividends(parts[2], q.get("from", today.isoformat())))
+        if u.path == "/fred/series/observations":
+            return self._reply(200, observations(q.get("series_id", ""), int(q.get("limit", 10))))
+        if u.path == "/v2/top-headlines":
+            return self._reply(200, headlines(q.get("category", "general")))
+        self._reply(404, {"message": "Not found"})
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--port", type=int, default=8026)
+    p.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered 429/503")
+    p.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    args = p.parse_args()
+
+    Handler.fail_rate, Handler.latency = args.fail_rate, args.latency
+    srv = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    srv.daemon_threads = True
+
+    def stop(*_):
+        print(json.dumps(STATS), flush=True)
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Market data stub on http://127.0.0.1:{args.port}", file=sys.stderr)
+    srv.serve_forever()
+
+if __name__ == "__main__":
+    main()
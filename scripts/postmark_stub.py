@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Local stand-in for the Postmark API (/email and /email/batch) for tests and
+# benchmarks. Speaks HTTP/1.1 keep-alive, accepts gzip bodies, and can inject
+# 429/503 responses and latency. Prints request/connection counts on exit.
+import argparse, gzip, json, random, signal, sys, threading, time, uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATS = {"connections": 0, "requests": 0, "messages": 0, "injected_errors": 0, "bytes_in": 0}
+LOCK = threading.Lock()
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fail_rate = 0.0
+    latency = 0.0
+    token = None
+
+    def setup(self):
+        super().setup()
+        with LOCK:
+            STATS["connections"] += 1
+
+    def log_message(self, *a):
+        pass
+
+    def _reply(self, status, obj, headers=()):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with LOCK:
+            STATS["requests"] += 1
+            STATS["bytes_in"] += len(raw)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.token and self.headers.get("X-Postmark-Server-Token") != self.token:
+            return self._reply(401, {"ErrorCode": 10, "Message": "Bad or missing Server API token."})
+        if random.random() < self.fail_rate:
+            with LOCK:
+                STATS["injected_errors"] += 1
+            code = random.choice((429, 503))
+            return self._reply(code, {"ErrorCode": code, "Message": "injected"}, [("Retry-After", "0")])
+        if self.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        payload = json.loads(raw)
+
+        def ok(m):
+            return {"To": m.get("To"), "SubmittedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "MessageID": str(uuid.uuid4()), "ErrorCode": 0, "Message": "OK"}
+
+        if self.path.endswith("/email/batch"):
+            if not isinstance(payload, list) or len(payload) > 500:
+                return self._reply(422, {"ErrorCode": 300, "Message": "Invalid batch"})
+            with LOCK:
+                STATS["messages"] += len(payload)
+            return self._reply(200, [ok(m) for m in payload])
+        if self.path.endswith("/email"):
+            with LOCK:
+                STATS["messages"] += 1
+            return self._reply(200, ok(payload))
+        self._reply(404, {"ErrorCode": 404, "Message": "Not found"})
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--port", type=int, default=8025)
+    p.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered 429/503")
+    p.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    p.add_argument("--token", default=None, help="require this X-Postmark-Server-Token")
+    args = p.parse_args()
+
+    Handler.fail_rate, Handler.latency, Handler.token = args.fail_rate, args.latency, args.token
+    srv = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    srv.daemon_threads = True
+
+    def stop(*_):
+        print(json.dumps(STATS), flush=True)
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Postmark stub on http://127.0.0.1:{args.port}", file=sys.stderr)
+    srv.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# Differential check for src/validators/schema_engine.py: the whole-column
+# fast path (Column.column_ok) may only pass a column when check_value passes
+# every one of its cells. Random columns mix in-range, edge, out-of-range,
+# nan/inf, empty and malformed cells against every bound combination.
+import itertools, os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "src", "validators"))
+from schema_engine import Column
+
+CELLS = ("0", "0.5", "1", "1.0", "2", "2.5", "3", "-1", "10", "nan", "NaN", "inf", "-inf",
+         "", " ", "abc", "1e3", " 2 ")
+BOUNDS = ("minimum", "exclusiveMinimum", "maximum", "exclusiveMaximum")
+
+def specs():
+    for n in range(len(BOUNDS) + 1):
+        for keys in itertools.combinations(BOUNDS, n):
+            for required in (False, True):
+                spec = {"type": "number", "required": required}
+                spec.update({k: (1 if "inimum" in k else 3) for k in keys})
+                yield spec
+
+def main(trials=300, seed=17):
+    rng = random.Random(seed)
+    failures = 0
+    for spec in specs():
+        col = Column("x", spec)
+        for _ in range(trials):
+            values = [rng.choice(CELLS) for _ in range(rng.randint(1, 6))]
+            bad = [v for v in values if col.check_value(v)]
+            if col.column_ok(set(values)) and bad:
+                failures += 1
+                if failures <= 10:
+                    print(f"❌ {spec}: fast path passed {values}, check_value rejects {bad}",
+                          file=sys.stderr)
+    # the reported case: nan between in-range values
+    col = Column("coupon", {"type": "number", "minimum": 0})
+    if col.column_ok({"1.0", "nan", "2.0", "3.0"}):
+        failures += 1
+        print("❌ nan inside the column passed the fast path", file=sys.stderr)
+    if failures:
+        print(f"❌ {failures} column(s) where the fast path and check_value disagree", file=sys.stderr)
+        return 1
+    print("✅ column_ok agrees with check_value")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,222 @@
 #!/usr/bin/env python3
-import os, json, argparse, urllib.request
+import os, sys, csv, gzip, json, time, random, argparse, select, threading, http.client
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+BATCH_LIMIT = 500                  # Postmark's max messages per /email/batch call
+BATCH_BYTES = 45 * 1024 * 1024     # stay under the 50 MB request cap
+# Sends are not idempotent: once a request is written it is only resent on an
+# explicit "not processed" answer. A lost response or a gateway/server error
+# after the write may still have delivered, so it is reported as unknown.
+RETRY_STATUS = {429, 503}
+UNKNOWN_STATUS = {500, 502, 504}
+
+class DeliveryUnknown(Exception):
+    pass
+
+class PostmarkClient:
+    # One keep-alive HTTP/1.1 connection per worker thread, gzip request
+    # bodies, retry with jittered backoff on 429/503 and on failures before
+    # the request was written (connect errors, a keep-alive the server closed).
+    def __init__(self, base, token, compress=True, timeout=30, retries=5):
+        u = urlsplit(base)
+        self.https = u.scheme == "https"
+        self.host = u.hostname
+        self.port = u.port or (443 if self.https else 80)
+        self.prefix = u.path.rstrip("/")
+        self.token = token
+        self.compress = compress
+        self.timeout = timeout
+        self.retries = retries
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = 0
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None and conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            # readable while idle = the server closed it (or sent junk); don't reuse
+            self._drop()
+            conn = None
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self.local.conn = cls(self.host, self.port, timeout=self.timeout)
+            with self.lock:
+                self.connections += 1
+        return conn
+
+    def _drop(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def post(self, path, payload):
+        body = json.dumps(payload).encode("utf-8")
+        headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "X-Postmark-Server-Token": self.token,
+            "Connection": "keep-alive",
+        }
+        if self.compress:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+
+        for attempt in range(self.retries + 1):
+            delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2)
+            try:
+                conn = self._conn()
+                if conn.sock is None:
+                    conn.connect()
+                # A write that fails leaves the server an incomplete request,
+                # which it cannot act on, so this phase is safe to repeat
+                conn.request("POST", self.prefix + path, body=body, headers=headers)
+            except (http.client.HTTPException, OSError):
+                self._drop()
+                if attempt == self.retries:
+                    raise
+                time.sleep(delay)
+                continue
+            try:
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, OSError) as e:
+                self._drop()
+                raise DeliveryUnknown(f"no response to POST {path} after it was sent: "
+                                      f"{type(e).__name__}: {e}")
+            if resp.will_close:
+                self._drop()
+            if resp.status in RETRY_STATUS and attempt < self.retries:
+                retry_after = resp.getheader("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    delay = float(retry_after)
+                time.sleep(delay)
+                continue
+            try:
+                parsed = json.loads(data or b"null")
+            except ValueError:
+                parsed = {"Message": data.decode("utf-8", "replace")}
+            return resp.status, parsed
+
+def read_manifest(path):
+    # Rows of to[, subject][, html]; .jsonl/.json lines or .csv with a header
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".json")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+def build_batches(rows, from_addr, subject, html_path, tag=None, stream=None):
+    bodies = {}
+    batch, size = [], 0
+    for row in rows:
+        to = (row.get("to") or row.get("To") or "").strip()
+        if not to:
+            continue
+        path = row.get("html") or html_path
+        if path not in bodies:
+            with open(path, "r", encoding="utf-8") as f:
+                bodies[path] = f.read()
+        msg = {
+            "From": from_addr,
+            "To": to,
+            "Subject": row.get("subject") or subject,
+            "HtmlBody": bodies[path],
+        }
+        if tag:
+            msg["Tag"] = tag
+        if stream:
+            msg["MessageStream"] = stream
+        msg_size = len(msg["HtmlBody"]) + 512
+        if batch and (len(batch) >= BATCH_LIMIT or size + msg_size > BATCH_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(msg)
+        size += msg_size
+    if batch:
+        yield batch
+
+def send_batch(client, batch):
+    try:
+        status, resp = client.post("/email/batch", batch)
+    except DeliveryUnknown as e:
+        return [{"To": m["To"], "ErrorCode": None, "Unknown": True, "Message": str(e)} for m in batch]
+    if status in UNKNOWN_STATUS:
+        msg = f"HTTP {status} after the batch was sent; it may have been delivered"
+        return [{"To": m["To"], "ErrorCode": status, "Unknown": True, "Message": msg} for m in batch]
+    if status != 200 or not isinstance(resp, list):
+        err = resp.get("Message") if isinstance(resp, dict) else resp
+        return [{"To": m["To"], "ErrorCode": status, "Message": err} for m in batch]
+    return resp
+
+def run_bulk(args, token):
+    client = PostmarkClient(args.api, token, compress=not args.no_gzip)
+    batches = build_batches(read_manifest(args.manifest), args.from_addr, args.subject,
+                            args.html, tag=args.tag, stream=args.stream)
+    t0 = time.perf_counter()
+    sent = failed = unknown = 0
+    out = open(args.results, "w", encoding="utf-8") if args.results else None
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+            # Bounded in-flight window so huge manifests aren't built up front
+            pending = []
+            for batch in batches:
+                pending.append(ex.submit(send_batch, client, batch))
+                if len(pending) >= args.concurrency * 2:
+                    sent, failed, unknown = _collect(pending.pop(0), out, sent, failed, unknown)
+            for fut in pending:
+                sent, failed, unknown = _collect(fut, out, sent, failed, unknown)
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({"sent": sent, "failed": failed, "unknown": unknown,
+                      "connections": client.connections, "seconds": round(elapsed, 3),
+                      "msgs_per_s": round((sent + failed + unknown) / elapsed, 1) if elapsed else None}))
+    if unknown:
+        print(f"⚠️ {unknown} message(s) in an unknown state; check Postmark activity before resending "
+              "(\"Unknown\": true in the results)", file=sys.stderr)
+    return 0 if not (failed or unknown) else 1
+
+def _collect(fut, out, sent, failed, unknown):
+    for r in fut.result():
+        if r.get("Unknown"):
+            unknown += 1
+        elif r.get("ErrorCode") == 0:
+            sent += 1
+        else:
+            failed += 1
+        if out:
+            out.write(json.dumps(r) + "\n")
+    return sent, failed, unknown
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--from", dest="from_addr", required=True)
-    p.add_argument("--to", dest="to_addr", required=True)
+    p.add_argument("--to", dest="to_addr")
     p.add_argument("--subject", required=True)
-    p.add_argument("--html", required=True)
+    p.add_argument("--html", required=True, help="HTML body (default for manifest rows without one)")
+    p.add_argument("--manifest", help="bulk mode: CSV/JSONL of to[,subject][,html] per message")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--results", help="bulk mode: write per-recipient results as JSONL")
+    p.add_argument("--tag", default=os.getenv("POSTMARK_TAG"))
+    p.add_argument("--stream", default=os.getenv("POSTMARK_STREAM"))
+    p.add_argument("--no-gzip", action="store_true", help="bulk mode: send uncompressed bodies")
+    p.add_argument("--api", default=os.getenv("POSTMARK_API", "https://api.postmarkapp.com"))
     args = p.parse_args()
+    if not args.to_addr and not args.manifest:
+        p.error("one of --to or --manifest is required")
 
     token = os.getenv("POSTMARK_TOKEN")
     if not token:
         raise SystemExit("POSTMARK_TOKEN env var not set")
 
+    if args.manifest:
+        return run_bulk(args, token)
+
     with open(args.html, "r", encoding="utf-8") as f:
         html_body = f.read()
 
@@ -23,18 +227,13 @@ def main():
         "HtmlBody": html_body
     }
 
-    req = urllib.request.Request(
-        "https://api.postmarkapp.com/email",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-            "X-Postmark-Server-Token": token
-        },
-        method="POST"
-    )
-    with urllib.request.urlopen(req) as resp:
-        print(resp.status, resp.read().decode())
+    try:
+        status, resp = PostmarkClient(args.api, token, compress=False).post("/email", payload)
+    except DeliveryUnknown as e:
+        print(f"⚠️ delivery unknown, check Postmark activity before resending: {e}", file=sys.stderr)
+        return 1
+    print(status, json.dumps(resp))
+    return 0 if status == 200 else 1
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
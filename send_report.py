@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
-import os, smtplib, ssl, sys, time
+import json, os, smtplib, ssl, sys, threading, time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from stage_metrics import record, run_main
+from smtp_pool import SMTPPool, load_port, permanent, race_connect, save_port, send_bulk
+
 def fail(msg, code=1):
     print(msg, file=sys.stderr)
     sys.exit(code)
@@ -19,66 +23,191 @@ HTML_PATH = os.getenv("HTML_PATH", "daily_report_rendered.html")
 PM_TAG = os.getenv("POSTMARK_TAG", "daily-report-v2")
 PM_STREAM = os.getenv("POSTMARK_STREAM", "outbound")
 
-if not SMTP_USER:
-    fail("Missing SMTP_USER (Postmark Server Token).")
-if not FROM:
-    fail("Missing FROM_EMAIL/MAIL_FROM.")
-if not TO:
-    fail("Missing recipient (TO_EMAIL / TO_EMAILS / MAIL_TO).")
-
-recipients = [a.strip() for a in TO.replace(";", ",").split(",") if a.strip()]
-if not recipients:
-    fail("Recipient list is empty after parsing.")
-
-try:
-    with open(HTML_PATH, "r", encoding="utf-8") as f:
-        html = f.read()
-except Exception as e:
-    fail(f"Failed to read HTML_PATH '{HTML_PATH}': {e}")
-
-msg = MIMEMultipart("alternative")
-msg["From"] = FROM
-msg["To"] = ", ".join(recipients)
-msg["Subject"] = SUBJECT
-msg["X-PM-Tag"] = PM_TAG
-msg["X-PM-Message-Stream"] = PM_STREAM
-msg.attach(MIMEText("HTML report inline.", "plain"))
-msg.attach(MIMEText(html, "html"))
-
-# Candidate ports: configured first, then alternates
-_ports = []
-try:
-    first = int(SMTP_PORT)
-except Exception:
-    first = 587
-for p in (first, 2525, 25, 465):
-    if p not in _ports:
-        _ports.append(p)
-
-last_error = None
-for p in _ports:
-    for attempt in (1, 2, 3):
+# DELIVERY=bulk sends one message per recipient over a pool of reused
+# connections instead of one message with every address in To.
+DELIVERY = os.getenv("DELIVERY", "single")
+RECIPIENTS_FILE = os.getenv("RECIPIENTS_FILE", "")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SEND_RATE = float(os.getenv("SEND_RATE", "10"))  # messages/second, 0 = no cap
+SEND_RESULTS = os.getenv("SEND_RESULTS", "send_results.jsonl")
+
+# Ports are raced concurrently within SMTP_DEADLINE seconds overall; the
+# winner is remembered in SMTP_STATE and tried first next run.
+SMTP_DEADLINE = float(os.getenv("SMTP_DEADLINE", "120"))
+SMTP_STAGGER = float(os.getenv("SMTP_STAGGER", "0.25"))
+SMTP_STATE = os.getenv("SMTP_STATE", ".smtp_port.json")
+
+def candidate_ports():
+    # Last winning port first, then configured, then alternates
+    ports = []
+    try:
+        first = int(SMTP_PORT)
+    except Exception:
+        first = 587
+    for p in (load_port(SMTP_STATE, SMTP_HOST), first, 2525, 25, 465):
+        if p is not None and p not in ports:
+            ports.append(p)
+    return ports
+
+def handshake(port, timeout=20):
+    if port == 465:
+        s = smtplib.SMTP_SSL(SMTP_HOST, port, timeout=timeout, context=ssl.create_default_context())
+        s.ehlo()
+    else:
+        s = smtplib.SMTP(SMTP_HOST, port, timeout=timeout)
+        s.ehlo()
         try:
-            if p == 465:
-                with smtplib.SMTP_SSL(SMTP_HOST, p, timeout=20, context=ssl.create_default_context()) as s:
-                    s.ehlo()
-                    s.login(SMTP_USER, SMTP_PASS or SMTP_USER)
-                    s.sendmail(FROM, recipients, msg.as_string())
-                    print(f"✅ Daily Report sent via port {p} (SSL).")
-                    sys.exit(0)
-            else:
-                with smtplib.SMTP(SMTP_HOST, p, timeout=20) as s:
-                    s.ehlo()
-                    try:
-                        s.starttls(context=ssl.create_default_context()); s.ehlo()
-                    except Exception:
-                        pass
-                    s.login(SMTP_USER, SMTP_PASS or SMTP_USER)
-                    s.sendmail(FROM, recipients, msg.as_string())
-                    print(f"✅ Daily Report sent via port {p}.")
-                    sys.exit(0)
+            s.starttls(context=ssl.create_default_context()); s.ehlo()
+        except Exception:
+            pass
+    return s
+
+def login(s):
+    try:
+        s.login(SMTP_USER, SMTP_PASS or SMTP_USER)
+    except Exception:
+        s.close()
+        raise
+    return s
+
+def connect_any(deadline):
+    # Race every candidate port; returns (port, logged-in SMTP, probes). The
+    # port is only remembered once it has accepted the login.
+    port, s, probes = race_connect(handshake, candidate_ports(), deadline, stagger=SMTP_STAGGER)
+    s = login(s)
+    save_port(SMTP_STATE, SMTP_HOST, port)
+    return port, s, probes
+
+def read_recipients():
+    addrs = [a.strip() for a in TO.replace(";", ",").split(",") if a.strip()]
+    if RECIPIENTS_FILE:
+        try:
+            with open(RECIPIENTS_FILE, encoding="utf-8") as f:
+                addrs += [l.strip() for l in f if l.strip() and not l.startswith("#")]
+        except Exception as e:
+            fail(f"Failed to read RECIPIENTS_FILE '{RECIPIENTS_FILE}': {e}")
+    return list(dict.fromkeys(addrs))
+
+def base_message(html):
+    msg = MIMEMultipart("alternative")
+    msg["From"] = FROM
+    msg["Subject"] = SUBJECT
+    msg["X-PM-Tag"] = PM_TAG
+    msg["X-PM-Message-Stream"] = PM_STREAM
+    msg.attach(MIMEText("HTML report inline.", "plain"))
+    msg.attach(MIMEText(html, "html"))
+    return msg
+
+def deliver_bulk(recipients, html):
+    # Serialise the shared body once; each recipient only gets its own To line
+    body = base_message(html).as_string()
+    chosen, denied = [], []
+    race = threading.Lock()
+
+    def connect():
+        # The first connection races the ports; the rest reuse the winner.
+        # Workers that connect while the race runs wait for it instead of
+        # racing too. Rejected credentials fail every later connect without
+        # dialing.
+        try:
+            if not chosen:
+                with race:
+                    if denied:
+                        raise denied[0]
+                    if not chosen:
+                        port, s, _ = connect_any(time.monotonic() + SMTP_DEADLINE)
+                        chosen[:1] = [port]
+                        return s
+            if denied:
+                raise denied[0]
+            return login(handshake(chosen[0]))
+        except smtplib.SMTPAuthenticationError as e:
+            denied[:1] = [e]
+            raise
+
+    pool = SMTPPool(connect, size=SMTP_POOL_SIZE)
+    t0 = time.perf_counter()
+    sent = failed = attempts = 0
+    try:
+        with open(SEND_RESULTS, "w", encoding="utf-8") as out:
+            for r in send_bulk(pool, FROM, recipients, lambda rcpt: f"To: {rcpt}\n{body}",
+                               workers=SMTP_POOL_SIZE, rate=SEND_RATE):
+                out.write(json.dumps(r) + "\n")
+                attempts += r["attempts"]
+                if r["ok"]:
+                    sent += 1
+                else:
+                    failed += 1
+                    print(f"❌ {r['recipient']}: {r['error']}", file=sys.stderr)
+    finally:
+        pool.close()
+    elapsed = time.perf_counter() - t0
+
+    port = chosen[0] if chosen else None
+    record(smtp_port=port, attempts=attempts, connections=pool.opened,
+           sent=sent, failed=failed)
+    print(f"{'✅' if not failed else '⚠️'} Daily Report bulk delivery: {sent} sent, {failed} failed "
+          f"via port {port} over {pool.opened} connection(s) in {elapsed:.1f}s "
+          f"(results: {SEND_RESULTS}).")
+    return 0 if not failed else 1
+
+def main():
+    if not SMTP_USER:
+        fail("Missing SMTP_USER (Postmark Server Token).")
+    if not FROM:
+        fail("Missing FROM_EMAIL/MAIL_FROM.")
+    if not TO and not RECIPIENTS_FILE:
+        fail("Missing recipient (TO_EMAIL / TO_EMAILS / MAIL_TO).")
+
+    recipients = read_recipients()
+    if not recipients:
+        fail("Recipient list is empty after parsing.")
+
+    try:
+        with open(HTML_PATH, "r", encoding="utf-8") as f:
+            html = f.read()
+    except Exception as e:
+        fail(f"Failed to read HTML_PATH '{HTML_PATH}': {e}")
+
+    if DELIVERY == "bulk":
+        return deliver_bulk(recipients, html)
+
+    msg = base_message(html)
+    msg["To"] = ", ".join(recipients)
+
+    deadline = time.monotonic() + SMTP_DEADLINE
+    last_error = None
+    attempts = 0
+    backoff = 1.0
+    ports = len(candidate_ports())
+    while time.monotonic() < deadline:
+        # Bad credentials and 5xx rejections end the loop; anything else is
+        # retried until the deadline
+        try:
+            port, s, probes = connect_any(deadline)
         except Exception as e:
             last_error = e
-            time.sleep(2)
+            attempts += ports
+            if permanent(e):
+                break
+        else:
+            attempts += probes
+            record(smtp_port=port, attempts=attempts)
+            try:
+                with s:
+                    s.sendmail(FROM, recipients, msg.as_string())
+                print(f"✅ Daily Report sent via port {port}{' (SSL)' if port == 465 else ''}.")
+                return 0
+            except Exception as e:
+                last_error = e
+                if permanent(e):
+                    break
+        # Back off within what is left of the budget, not a fixed sleep
+        time.sleep(max(0.0, min(backoff, deadline - time.monotonic())))
+        backoff = min(backoff * 2, 15.0)
+
+    record(smtp_port=None, attempts=attempts)
+    raise last_error or TimeoutError(f"SMTP deadline of {SMTP_DEADLINE:.0f}s exceeded")
 
-raise last_error
+if __name__ == "__main__":
+    sys.exit(run_main(main))
@@ -1,27 +1,199 @@
-import argparse, json, os, sys
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+import argparse, glob, itertools, json, os, re, shutil, sys, tempfile, time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from jinja2 import (Environment, FileSystemBytecodeCache, FileSystemLoader,
+                    ModuleLoader, select_autoescape)
+
+TEMPLATE = "base_email.html.j2"
+CACHE_DIR = os.getenv("EMAIL_TEMPLATE_CACHE", ".cache/jinja")
+
+@lru_cache(maxsize=None)
+def get_environment(template_dir, cache_dir=CACHE_DIR, compiled_dir=None):
+    # One environment per process. compiled_dir points at modules written by
+    # --precompile (no parsing at all); otherwise templates are loaded from
+    # source with a bytecode cache that is invalidated by the source checksum.
+    bcc = None
+    if compiled_dir:
+        loader = ModuleLoader(compiled_dir)
+    else:
+        loader = FileSystemLoader(template_dir)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            bcc = FileSystemBytecodeCache(cache_dir)
+    return Environment(
+        loader=loader,
+        autoescape=select_autoescape(["html", "xml"]),
+        bytecode_cache=bcc,
+    )
+
+def precompile(template_dir, target):
+    env = Environment(
+        loader=FileSystemLoader(template_dir),
+        autoescape=select_autoescape(["html", "xml"]),
+    )
+    env.compile_templates(target, zip=None, ignore_errors=False)
+
+class Renderer:
+    # Keeps the environment and compiled template alive across many renders
+    def __init__(self, template_dir, template=TEMPLATE, cache_dir=CACHE_DIR, compiled_dir=None):
+        self.env = get_environment(template_dir, cache_dir, compiled_dir)
+        self.tpl = self.env.get_template(template)
+
+    def render(self, payload, snapshot, freeze):
+        return self.tpl.render(snapshot=snapshot, freeze=freeze, **payload)
+
+    def render_to(self, payload, snapshot, freeze, out):
+        html = self.render(payload, snapshot, freeze)
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        # Write-then-rename so readers never see a half-written file
+        tmp = f"{out}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(tmp, out)
+
+# --- batch mode -------------------------------------------------------------
+# Payloads come from a directory of *.json, a glob, or a JSONL file ('-' for
+# stdin). A payload may carry "id", "snapshot" and "freeze" keys that override
+# the output name and the CLI defaults for that render. An id must be a plain
+# file name (SAFE_ID) and unique within the batch: a bad or repeated id fails
+# that payload instead of writing outside --out-dir or over another output.
+
+SAFE_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,127}\Z")
+
+def iter_jobs(source):
+    if source == "-" or source.endswith(".jsonl"):
+        f = sys.stdin if source == "-" else open(source, encoding="utf-8")
+        with f:
+            for i, line in enumerate(f):
+                if line.strip():
+                    yield (f"{i:06d}", None, line)
+        return
+    paths = sorted(glob.glob(os.path.join(source, "*.json"))) if os.path.isdir(source) \
+        else sorted(glob.glob(source))
+    for path in paths:
+        yield (os.path.splitext(os.path.basename(path))[0], path, None)
+
+_worker = None
+
+def _init_worker(template_dir, cache_dir, compiled_dir, out_dir, snapshot, freeze, claims):
+    global _worker
+    _worker = (Renderer(template_dir, cache_dir=cache_dir, compiled_dir=compiled_dir),
+               out_dir, snapshot, freeze, claims)
+
+def claim_id(name, claims):
+    # Atomic across worker processes: the first payload with an id owns it
+    if not SAFE_ID.match(name):
+        raise ValueError(f"unsafe id {name!r} (letters, digits, '.', '_', '-' only)")
+    try:
+        os.close(os.open(os.path.join(claims, name), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        raise ValueError(f"duplicate id {name!r}; another payload in this batch already has it")
+
+def _render_job(job):
+    renderer, out_dir, snapshot, freeze, claims = _worker
+    name, path, line = job
+    try:
+        if path is not None:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        else:
+            payload = json.loads(line)
+        name = str(payload.pop("id", name))
+        claim_id(name, claims)
+        snap = payload.pop("snapshot", snapshot)
+        frz = payload.pop("freeze", freeze)
+        out = os.path.join(out_dir, f"{name}.html")
+        renderer.render_to(payload, snap, frz, out)
+        return name, out, None
+    except Exception as e:
+        return name, None, f"{type(e).__name__}: {e}"
+
+def _render_chunk(jobs):
+    return [_render_job(job) for job in jobs]
+
+def render_batch(source, out_dir, template_dir, snapshot, freeze, workers=None,
+                 cache_dir=CACHE_DIR, compiled_dir=None, chunksize=16):
+    # Each worker builds its Renderer once; with a bytecode cache or compiled
+    # modules the template is compiled once and shared by all of them. Jobs go
+    # out in chunks of `chunksize`, at most two chunks per worker in flight,
+    # so a huge JSONL source is read only as fast as it is rendered.
+    os.makedirs(out_dir, exist_ok=True)
+    get_environment(template_dir, cache_dir, compiled_dir).get_template(TEMPLATE)  # warm the cache
+    ok = failed = 0
+    t0 = time.perf_counter()
+    claims = tempfile.mkdtemp(prefix="email-ids-")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(template_dir, cache_dir, compiled_dir, out_dir,
+                                           snapshot, freeze, claims)) as ex:
+            jobs = iter_jobs(source)
+            window = 2 * (workers or os.cpu_count() or 1)
+            running = set()
+            while True:
+                while len(running) < window:
+                    chunk = list(itertools.islice(jobs, chunksize))
+                    if not chunk:
+                        break
+                    running.add(ex.submit(_render_chunk, chunk))
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    for name, out, err in fut.result():
+                        if err:
+                            failed += 1
+                            print(f"FAILED {name}: {err}", file=sys.stderr)
+                        else:
+                            ok += 1
+    finally:
+        shutil.rmtree(claims, ignore_errors=True)
+    elapsed = time.perf_counter() - t0
+    return ok, failed, elapsed
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--template-dir", required=True)
-    p.add_argument("--data", required=True)
-    p.add_argument("--snapshot", required=True)
-    p.add_argument("--freeze", required=True)
-    p.add_argument("--out", required=True)
+    p.add_argument("--data")
+    p.add_argument("--snapshot")
+    p.add_argument("--freeze")
+    p.add_argument("--out")
+    p.add_argument("--cache-dir", default=CACHE_DIR,
+                   help="Jinja bytecode cache directory ('' to disable)")
+    p.add_argument("--compiled-dir", help="load templates precompiled with --precompile")
+    p.add_argument("--precompile", metavar="DIR",
+                   help="compile every template in --template-dir into DIR and exit")
+    p.add_argument("--batch", metavar="SOURCE",
+                   help="render many payloads: a directory of *.json, a glob, or JSONL ('-' = stdin)")
+    p.add_argument("--out-dir", help="batch mode: directory for <id>.html outputs")
+    p.add_argument("--workers", type=int, default=None, help="batch mode: process count")
     args = p.parse_args()
 
+    if args.precompile:
+        precompile(args.template_dir, args.precompile)
+        print(f"Compiled templates into {args.precompile}")
+        return 0
+
+    if args.batch:
+        if not args.out_dir:
+            p.error("--batch requires --out-dir")
+        ok, failed, elapsed = render_batch(
+            args.batch, args.out_dir, args.template_dir, args.snapshot or "", args.freeze or "",
+            workers=args.workers, cache_dir=args.cache_dir or None, compiled_dir=args.compiled_dir)
+        rate = ok / elapsed if elapsed else 0.0
+        print(f"Rendered {ok} payload(s) into {args.out_dir} in {elapsed:.2f}s "
+              f"({rate:.1f} renders/s, {failed} failed)")
+        return 1 if failed else 0
+
+    missing = [f"--{k}" for k in ("data", "snapshot", "freeze", "out") if getattr(args, k) is None]
+    if missing:
+        p.error("the following arguments are required: " + ", ".join(missing))
+
     with open(args.data, "r", encoding="utf-8") as f:
         payload = json.load(f)
 
-    env = Environment(
-        loader=FileSystemLoader(args.template_dir),
-        autoescape=select_autoescape(["html", "xml"])
-    )
-    tpl = env.get_template("base_email.html.j2")
-    html = tpl.render(snapshot=args.snapshot, freeze=args.freeze, **payload)
-
-    os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    with open(args.out, "w", encoding="utf-8") as f:
-        f.write(html)
+    renderer = Renderer(args.template_dir, cache_dir=args.cache_dir or None,
+                        compiled_dir=args.compiled_dir)
+    renderer.render_to(payload, args.snapshot, args.freeze, args.out)
     print(f"Wrote {args.out}")
 
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+# SHA-256 of files, cached by (size, mtime_ns).
+#
+# A cache is a small JSON file {relpath: [size, mtime_ns, sha256]}; each caller
+# keeps its own (freeze/fetch share .cache/freeze_hashes.json, the pipeline
+# stages each have one under their .cache/ directory) so one stage never
+# rewrites another's.
+import hashlib, json, os
+
+CHUNK = 1 << 20
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_hash_cache(root, cache_path):
+    try:
+        with open(os.path.join(root, cache_path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_hash_cache(root, cache, cache_path):
+    cache_file = os.path.join(root, cache_path)
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass
+
+def cached_sha256(root, rel, cache):
+    # Re-read the file only if its size or mtime changed; None if missing
+    try:
+        st = os.stat(os.path.join(root, rel))
+    except OSError:
+        return None
+    hit = cache.get(rel)
+    if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+        return hit[2]
+    digest = sha256_file(os.path.join(root, rel))
+    cache[rel] = [st.st_size, st.st_mtime_ns, digest]
+    return digest
@@ -0,0 +1,155 @@
+# SQLite catalog of every freeze and every file in it.
+#
+# data/FREEZE_INDEX.json stays the small committed list of versions; the
+# catalog is the queryable index built from it and the freeze manifests:
+# lookups by version, timestamp range, path or content hash are single index
+# probes, and any file from any freeze can be restored straight from its blob
+# (or, for a legacy zip freeze, from the cached zip fetch_snapshot.py shares).
+import hashlib, json, os, sqlite3, zipfile
+
+from freeze_store import (ZIP_CACHE, fetch_zip, freeze_time, restore_file, split_manifest_uri,
+                          zip_manifest, zip_members)
+
+CATALOG = os.getenv("FREEZE_CATALOG", os.path.join(".cache", "freeze_catalog.sqlite"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS freezes (
+    id       INTEGER PRIMARY KEY,
+    version  TEXT NOT NULL UNIQUE,
+    snapshot TEXT NOT NULL,
+    uri      TEXT NOT NULL,
+    ts       TEXT NOT NULL,
+    files    INTEGER NOT NULL DEFAULT 0,
+    bytes    INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS freezes_ts ON freezes(ts);
+CREATE TABLE IF NOT EXISTS files (
+    freeze INTEGER NOT NULL REFERENCES freezes(id) ON DELETE CASCADE,
+    path   TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size   INTEGER NOT NULL,
+    mode   INTEGER NOT NULL,
+    PRIMARY KEY (freeze, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_path ON files(path, freeze);
+CREATE INDEX IF NOT EXISTS files_sha ON files(sha256);
+"""
+
+def connect(path=CATALOG):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA foreign_keys = ON")
+    db.execute("PRAGMA journal_mode = WAL")
+    db.executescript(SCHEMA)
+    return db
+
+def add_freeze(db, version, entry, manifest=None):
+    files = (manifest or {}).get("files", {})
+    with db:
+        db.execute("DELETE FROM freezes WHERE version = ?", (version,))
+        cur = db.execute(
+            "INSERT INTO freezes (version, snapshot, uri, ts, files, bytes) VALUES (?, ?, ?, ?, ?, ?)",
+            (version, entry["snapshot"], entry["uri"], entry["ts"], len(files),
+             sum(e["size"] for e in files.values())))
+        db.executemany(
+            "INSERT INTO files (freeze, path, sha256, size, mode) VALUES (?, ?, ?, ?, ?)",
+            ((cur.lastrowid, p, e["sha256"], e["size"], e.get("mode", 0o644))
+             for p, e in files.items()))
+
+def sync_index(db, index, zip_cache=ZIP_CACHE):
+    # Catalog versions from FREEZE_INDEX.json that aren't in (or changed in)
+    # the catalog. Legacy zip freezes are listed from their (cached) zip; one
+    # catalogued before that, with no files, is listed again.
+    known = {r["version"]: (r["snapshot"], r["files"])
+             for r in db.execute("SELECT version, snapshot, files FROM freezes")}
+    added = []
+    for version, entry in index.items():
+        snapshot, files = known.get(version, (None, 0))
+        if snapshot == entry.get("snapshot") and files:
+            continue
+        if entry["uri"].endswith(".zip"):
+            add_freeze(db, version, entry, zip_manifest(fetch_zip(entry, zip_cache)[0]))
+            added.append(version)
+            continue
+        manifest = None
+        try:
+            backend, freeze_id = split_manifest_uri(entry["uri"])
+        except ValueError:
+            pass
+        else:
+            body = backend.get_bytes(f"manifests/freeze_{freeze_id}.json")
+            if hashlib.sha256(body).hexdigest() != entry["snapshot"]:
+                raise ValueError(f"{version}: manifest hash does not match the index")
+            manifest = json.loads(body)
+        add_freeze(db, version, entry, manifest)
+        added.append(version)
+    return added
+
+def versions(db, since=None, until=None):
+    q, args = "SELECT version, ts, snapshot, uri, files, bytes FROM freezes WHERE 1=1", []
+    if since:
+        q += " AND ts >= ?"; args.append(since)
+    if until:
+        q += " AND ts <= ?"; args.append(until)
+    return db.execute(q + " ORDER BY ts", args).fetchall()
+
+def files_in(db, version):
+    return db.execute(
+        "SELECT f.path, f.sha256, f.size FROM files f JOIN freezes z ON z.id = f.freeze "
+        "WHERE z.version = ? ORDER BY f.path", (version,)).fetchall()
+
+def find_path(db, path):
+    # Every freeze containing `path`, oldest first
+    return db.execute(
+        "SELECT z.version, z.ts, f.sha256, f.size FROM files f JOIN freezes z ON z.id = f.freeze "
+        "WHERE f.path = ? ORDER BY z.ts", (path,)).fetchall()
+
+def find_hash(db, digest):
+    # Accepts a full hash or a unique-ish prefix, in either case
+    digest = digest.lower()
+    if len(digest) == 64:
+        where, args = "f.sha256 = ?", (digest,)
+    else:
+        where, args = "f.sha256 >= ? AND f.sha256 < ?", (digest, digest + "g")
+    return db.execute(
+        "SELECT z.version, z.ts, f.path, f.sha256, f.size FROM files f JOIN freezes z ON z.id = f.freeze "
+        f"WHERE {where} ORDER BY z.ts, f.path", args).fetchall()
+
+def restore(db, version, path, dest, zip_cache=ZIP_CACHE):
+    # The file gets the freeze's time as mtime, like freeze.py restore and
+    # fetch_snapshot.py, so it doesn't pass for fresh data
+    row = db.execute(
+        "SELECT z.uri, z.snapshot, z.ts, f.sha256, f.size, f.mode FROM files f "
+        "JOIN freezes z ON z.id = f.freeze WHERE z.version = ? AND f.path = ?",
+        (version, path)).fetchone()
+    if row is None:
+        raise KeyError(f"{path} is not in freeze {version}")
+    mtime = freeze_time(row["ts"])
+    if row["uri"].endswith(".zip"):
+        _restore_from_zip(row, path, dest, mtime, zip_cache)
+    else:
+        backend, _ = split_manifest_uri(row["uri"])
+        restore_file(backend, {"sha256": row["sha256"], "mode": row["mode"]}, dest, mtime)
+    return row["sha256"]
+
+def _restore_from_zip(row, path, dest, mtime, zip_cache):
+    zpath, _ = fetch_zip({"uri": row["uri"], "snapshot": row["snapshot"]}, zip_cache)
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    h = hashlib.sha256()
+    try:
+        with zipfile.ZipFile(zpath) as zf, zf.open(zip_members(zf)[path]) as src, \
+                open(tmp, "wb") as out:
+            for chunk in iter(lambda: src.read(1 << 20), b""):
+                h.update(chunk)
+                out.write(chunk)
+        if h.hexdigest() != row["sha256"]:
+            raise ValueError(f"hash mismatch restoring {dest}")
+        os.chmod(tmp, row["mode"])
+        os.utime(tmp, (mtime, mtime))
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
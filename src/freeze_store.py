@@ -0,0 +1,287 @@
+# Content-addressed freeze store.
+#
+# Every file is stored once as blobs/<sha256[:2]>/<sha256>; a freeze is just a
+# small manifest (manifests/freeze_<id>.json) mapping relative paths to blob
+# hashes, sizes and modes. Creating a freeze uploads only the blobs the store
+# doesn't hold yet, so time and storage scale with what changed.
+import fnmatch, hashlib, json, os, shutil, stat, tempfile, threading, zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from file_hashes import CHUNK, load_hash_cache, save_hash_cache, sha256_file
+
+# gitignore-style globs: a trailing "/" matches directories only and a leading
+# "/" anchors the pattern at the tree root; anything else matches a file or
+# directory name at any depth
+DEFAULT_EXCLUDES = ("/.git/", ".env", "/freeze_*/", "*.zip", "__pycache__/", "/.cache/",
+                    "/.venv/", "/venv/", "/out/", "/profiles/", "/aws/",
+                    # per-run state and logs, not report inputs
+                    "/send_results.jsonl", "/stage_timings.jsonl", "/.smtp_port.json",
+                    "/.quote_state.json", "/quote.json", "/market_status.json")
+# shared by freeze and fetch
+HASH_CACHE = os.path.join(".cache", "freeze_hashes.json")
+ZIP_CACHE = os.path.join(".cache", "blobs", "zips")
+
+class LocalBackend:
+    # Directory stand-in for the S3 bucket; keys are relative paths under root
+    def __init__(self, root):
+        self.root = root
+        self.uri = "file://" + os.path.abspath(root)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def list_keys(self, prefix):
+        base = self._path(prefix)
+        keys = set()
+        for dirpath, _, files in os.walk(base):
+            rel = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            keys.update(f"{rel}/{f}" for f in files if not f.endswith(".tmp"))
+        return keys
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def put_file(self, key, src):
+        dest = self._path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+
+    def put_bytes(self, key, data):
+        dest = self._path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, dest)
+
+    def get_bytes(self, key):
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def get_file(self, key, dest):
+        shutil.copyfile(self._path(key), dest)
+
+class S3Backend:
+    def __init__(self, bucket, prefix=""):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise SystemExit("S3 freeze store needs boto3 (pip install boto3), "
+                             "or use a file:// store")
+        # One client shared by all worker threads; botocore pools its connections
+        self.s3 = boto3.client("s3", config=Config(max_pool_connections=32))
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.uri = f"s3://{bucket}/{self.prefix}".rstrip("/")
+
+    def _key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def list_keys(self, prefix):
+        keys = set()
+        strip = len(self._key(""))
+        pages = self.s3.get_paginator("list_objects_v2").paginate(
+            Bucket=self.bucket, Prefix=self._key(prefix))
+        for page in pages:
+            keys.update(o["Key"][strip:] for o in page.get("Contents", ()))
+        return keys
+
+    def exists(self, key):
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except self.s3.exceptions.ClientError:
+            return False
+
+    def put_file(self, key, src):
+        self.s3.upload_file(src, self.bucket, self._key(key))
+
+    def put_bytes(self, key, data):
+        self.s3.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def get_bytes(self, key):
+        return self.s3.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+
+    def get_file(self, key, dest):
+        self.s3.download_file(self.bucket, self._key(key), dest)
+
+def open_backend(uri):
+    u = urlsplit(uri)
+    if u.scheme == "s3":
+        return S3Backend(u.netloc, u.path)
+    if u.scheme in ("", "file"):
+        return LocalBackend(u.path if u.scheme else uri)
+    raise SystemExit(f"Unsupported freeze store: {uri}")
+
+def split_manifest_uri(uri):
+    # ".../manifests/freeze_<id>.json" -> (backend for "...", freeze id)
+    base, sep, name = uri.rpartition("/manifests/")
+    if not sep or not name.startswith("freeze_") or not name.endswith(".json"):
+        raise ValueError(f"not a freeze manifest URI: {uri}")
+    return open_backend(base), name[len("freeze_"):-len(".json")]
+
+# Legacy freezes: one whole-tree zip per version, hashed in the index
+def fetch_zip(entry, cache_dir=ZIP_CACHE):
+    # -> (local path, downloaded?); cached by the index hash and verified
+    base, _, name = entry["uri"].rpartition("/")
+    path = os.path.join(cache_dir, f"{entry['snapshot']}.zip")
+    if os.path.exists(path):
+        return path, False
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    open_backend(base).get_file(name, tmp)
+    if sha256_file(tmp) != entry["snapshot"]:
+        os.unlink(tmp)
+        raise ValueError(f"{name} hash does not match the index")
+    os.replace(tmp, path)
+    return path, True
+
+def zip_members(zf):
+    # {relpath: ZipInfo}; a single top-level directory wrapping everything is
+    # stripped, and absolute or ".." paths are refused
+    infos = [i for i in zf.infolist() if not i.is_dir()]
+    tops = {i.filename.split("/", 1)[0] for i in infos}
+    strip = len(tops.pop()) + 1 if len(tops) == 1 and all("/" in i.filename for i in infos) else 0
+    members = {}
+    for i in infos:
+        rel = i.filename[strip:]
+        if rel.startswith("/") or ".." in rel.split("/"):
+            raise ValueError(f"unsafe path in freeze zip: {i.filename}")
+        members[rel] = i
+    return members
+
+def zip_manifest(path):
+    # Manifest-shaped {"files": {relpath: {sha256, size, mode}}} for a zip freeze
+    files = {}
+    with zipfile.ZipFile(path) as zf:
+        for rel, info in zip_members(zf).items():
+            h = hashlib.sha256()
+            with zf.open(info) as f:
+                for chunk in iter(lambda: f.read(CHUNK), b""):
+                    h.update(chunk)
+            files[rel] = {"sha256": h.hexdigest(), "size": info.file_size,
+                          "mode": (info.external_attr >> 16) & 0o777 or 0o644}
+    return {"files": files}
+
+def blob_key(digest):
+    return f"blobs/{digest[:2]}/{digest}"
+
+def manifest_key(freeze_id):
+    return f"manifests/freeze_{freeze_id}.json"
+
+def _excluded(rel, is_dir, excludes):
+    name = rel.rpartition("/")[2]
+    for pat in excludes:
+        if pat.endswith("/"):
+            if not is_dir:
+                continue
+            pat = pat[:-1]
+        if fnmatch.fnmatchcase(rel, pat[1:]) if pat.startswith("/") else fnmatch.fnmatchcase(name, pat):
+            return True
+    return False
+
+def walk_tree(root, excludes=DEFAULT_EXCLUDES):
+    # Yields relative POSIX paths. Older freeze_NN/ directories at the root
+    # are never nested into new ones; src/freeze_store.py and the like are
+    # ordinary files.
+    for dirpath, dirs, files in os.walk(root):
+        base = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        base = "" if base == "." else base + "/"
+        dirs[:] = sorted(d for d in dirs if not _excluded(base + d, True, excludes))
+        for f in sorted(files):
+            if not _excluded(base + f, False, excludes):
+                full = os.path.join(dirpath, f)
+                if os.path.isfile(full) and not os.path.islink(full):
+                    yield base + f
+
+def hash_tree(root, excludes=DEFAULT_EXCLUDES, cache_path=HASH_CACHE, workers=8):
+    cache = load_hash_cache(root, cache_path)
+    files, todo = {}, []
+    for rel in walk_tree(root, excludes):
+        st = os.stat(os.path.join(root, rel))
+        entry = {"size": st.st_size, "mode": stat.S_IMODE(st.st_mode)}
+        hit = cache.get(rel)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            entry["sha256"] = hit[2]
+        else:
+            todo.append((rel, st))
+        files[rel] = entry
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        digests = ex.map(lambda item: sha256_file(os.path.join(root, item[0])), todo)
+        for (rel, st), digest in zip(todo, digests):
+            files[rel]["sha256"] = digest
+            cache[rel] = [st.st_size, st.st_mtime_ns, digest]
+
+    save_hash_cache(root, {k: v for k, v in cache.items() if k in files}, cache_path)
+    return files, len(todo)
+
+def create_freeze(root, freeze_id, backend, excludes=DEFAULT_EXCLUDES, workers=8, created=None):
+    files, hashed = hash_tree(root, excludes, workers=workers)
+    have = backend.list_keys("blobs/")
+    missing = {}
+    for rel, e in files.items():
+        key = blob_key(e["sha256"])
+        if key not in have and key not in missing:
+            missing[key] = os.path.join(root, rel)
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        list(ex.map(lambda kv: backend.put_file(*kv), missing.items()))
+
+    manifest = {
+        "id": str(freeze_id),
+        "created": created or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "files": files,
+    }
+    body = json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    backend.put_bytes(manifest_key(freeze_id), body)
+    stats = {
+        "files": len(files),
+        "bytes": sum(e["size"] for e in files.values()),
+        "hashed": hashed,
+        "uploaded_blobs": len(missing),
+        "uploaded_bytes": sum(os.path.getsize(p) for p in missing.values()),
+        "snapshot": hashlib.sha256(body).hexdigest(),
+        "uri": f"{backend.uri}/{manifest_key(freeze_id)}",
+        "ts": manifest["created"],
+    }
+    return manifest, stats
+
+def freeze_time(ts):
+    # Index/manifest timestamp ("2025-09-12T21:57:00Z") -> epoch seconds
+    return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp()
+
+def load_manifest(backend, freeze_id):
+    return json.loads(backend.get_bytes(manifest_key(freeze_id)))
+
+def restore_file(backend, entry, dest, mtime=None):
+    # Download to a temp file, verify the hash, then move into place. The
+    # file gets `mtime` (the freeze time) so its age is the data's, not now.
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        backend.get_file(blob_key(entry["sha256"]), tmp)
+        if sha256_file(tmp) != entry["sha256"]:
+            raise ValueError(f"hash mismatch restoring {dest}")
+        os.chmod(tmp, entry.get("mode", 0o644))
+        if mtime is not None:
+            os.utime(tmp, (mtime, mtime))
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+def restore_freeze(backend, freeze_id, dest, paths=None, workers=8):
+    manifest = load_manifest(backend, freeze_id)
+    files, mtime = manifest["files"], freeze_time(manifest["created"])
+    wanted = {p: files[p] for p in (paths or files)}
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        list(ex.map(lambda kv: restore_file(backend, kv[1], os.path.join(dest, kv[0]), mtime),
+                    wanted.items()))
+    return len(wanted)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# Packed, versioned snapshot of the daily inputs.
+#
+# One file stands in for macro.json, news_general.json, news_finance.json,
+# prices.csv, dividends.csv, market_status.json (staleness) and quote.json
+# (the day's quote); news is the top-N that news_normalize.py selects. Layout (little-endian):
+#
+#   header  magic "DRSNAP\r\n", u16 version, u16 section count, u32 crc32 of
+#           the header fields + TOC
+#   toc     one 64-byte entry per section: name[32], u8 kind, u32 rows,
+#           u64 offset, u64 length, u32 crc32
+#   data    the sections, each 8-byte aligned
+#
+# Tables are stored one column per section ("prices.last", ...): float64 and
+# datetime64[D] columns are NumPy views straight off the mmap, strings are a
+# u32 offset array plus UTF-8 bytes; int fields (news copies) are stored as
+# float64. Each section is checksummed and verified on first access, so a
+# stage only pays for the sections it reads and damage raises SnapshotError
+# naming the section instead of rendering as "No data".
+import argparse, csv, json, mmap, os, struct, sys, zlib
+import numpy as np
+
+from news_normalize import load_news
+from report_model import Dividend, NewsItem, WatchlistRow, _date, iter_records
+
+MAGIC = b"DRSNAP\r\n"
+VERSION = 2
+HEADER = struct.Struct("<8sHHI")
+ENTRY = struct.Struct("<32sB3xIQQI4x")
+JSON, F8, DATE, STR = 1, 2, 3, 4
+KINDS = {JSON: "json", F8: "f8", DATE: "date", STR: "str"}
+
+# section prefix -> (loose file, record type); news tables are title/url
+TABLES = {
+    "prices": ("prices.csv", WatchlistRow),
+    "dividends": ("dividends.csv", Dividend),
+    "news_general": ("news_general.json", NewsItem),
+    "news_finance": ("news_finance.json", NewsItem),
+}
+DOCS = {"macro": "macro.json", "market_status": os.getenv("MARKET_STATUS", "market_status.json"),
+        "quote": os.getenv("QUOTE_JSON", "quote.json")}
+
+class SnapshotError(ValueError):
+    pass
+
+def _kind(parse):
+    return F8 if parse in (float, int) else DATE if parse is _date else STR
+
+# --- writing ----------------------------------------------------------------
+
+def encode_column(kind, values):
+    if kind == F8:
+        return np.array([np.nan if v is None else v for v in values], "<f8").tobytes()
+    if kind == DATE:
+        return np.array(values, "<M8[D]").tobytes()
+    blobs = [(v or "").encode("utf-8") for v in values]
+    offsets = np.zeros(len(blobs) + 1, "<u4")
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    return offsets.tobytes() + b"".join(blobs)
+
+def table_sections(name, cls, records):
+    cols = {field: [] for field in cls.columns()}
+    for rec in records:
+        for field in cols:
+            cols[field].append(getattr(rec, field))
+    rows = len(next(iter(cols.values())))
+    return [(f"{name}.{field}", _kind(parse), rows, encode_column(_kind(parse), cols[field]))
+            for field, parse in cls.FIELDS]
+
+def write_snapshot(out, sections):
+    # sections: [(name, kind, rows, payload bytes)]
+    toc_size = HEADER.size + ENTRY.size * len(sections)
+    pos = (toc_size + 7) & ~7
+    entries, layout = [], []
+    for name, kind, rows, payload in sections:
+        if len(name.encode()) > 32:
+            raise SnapshotError(f"section name too long: {name}")
+        entries.append(ENTRY.pack(name.encode(), kind, rows, pos, len(payload),
+                                  zlib.crc32(payload)))
+        layout.append((pos, payload))
+        pos = (pos + len(payload) + 7) & ~7
+    toc = b"".join(entries)
+    fields = HEADER.pack(MAGIC, VERSION, len(sections), 0)[:-4]
+    header = fields + struct.pack("<I", zlib.crc32(fields + toc))
+    tmp = f"{out}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header + toc)
+        for off, payload in layout:
+            f.write(b"\0" * (off - f.tell()))
+            f.write(payload)
+    os.replace(tmp, out)
+    return pos
+
+def pack(out, root="."):
+    # Missing files pack as empty sections; unreadable or malformed ones raise
+    sections = []
+    for name, fname in DOCS.items():
+        doc = _load_json(os.path.join(root, fname), {})
+        sections.append((name, JSON, 0, json.dumps(doc, separators=(",", ":")).encode("utf-8")))
+    for name, (fname, cls) in TABLES.items():
+        path = os.path.join(root, fname)
+        if cls is NewsItem:
+            try:
+                records = load_news(name.split("_", 1)[1], root=root)
+            except ValueError as e:
+                raise SnapshotError(f"{path}: not valid JSON ({e})")
+        elif os.path.exists(path):
+            records = list(iter_records(path, cls))
+            bad = sum(1 for r in records if r.invalid)
+            if bad:
+                print(f"⚠️ {fname}: {bad} row(s) with unparseable cells packed as empty",
+                      file=sys.stderr)
+        else:
+            records = []
+        sections += table_sections(name, cls, records)
+    size = write_snapshot(out, sections)
+    return len(sections), size
+
+def _load_json(path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except ValueError as e:
+        raise SnapshotError(f"{path}: not valid JSON ({e})")
+
+# --- reading ----------------------------------------------------------------
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise SnapshotError(f"{path}: empty file")
+        if len(self._mm) < HEADER.size:
+            raise SnapshotError(f"{path}: truncated header")
+        magic, version, count, crc = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path}: not an input snapshot")
+        if version != VERSION:
+            raise SnapshotError(f"{path}: unsupported snapshot version {version}")
+        end = HEADER.size + ENTRY.size * count
+        if len(self._mm) < end:
+            raise SnapshotError(f"{path}: truncated table of contents")
+        if zlib.crc32(self._mm[:HEADER.size - 4] + self._mm[HEADER.size:end]) != crc:
+            raise SnapshotError(f"{path}: header checksum mismatch")
+        self.sections = {}
+        for i in range(count):
+            name, kind, rows, off, length, scrc = ENTRY.unpack_from(self._mm, HEADER.size + i * ENTRY.size)
+            self.sections[name.rstrip(b"\0").decode()] = (kind, rows, off, length, scrc)
+        self._verified = set()
+
+    def _section(self, name, kind=None):
+        try:
+            skind, rows, off, length, crc = self.sections[name]
+        except KeyError:
+            raise SnapshotError(f"{self.path}: no section {name!r}")
+        if kind is not None and skind != kind:
+            raise SnapshotError(f"{self.path}: section {name!r} is {KINDS.get(skind)}, not {KINDS[kind]}")
+        if name not in self._verified:
+            if off + length > len(self._mm):
+                raise SnapshotError(f"{self.path}: section {name!r} is truncated")
+            if zlib.crc32(memoryview(self._mm)[off:off + length]) != crc:
+                raise SnapshotError(f"{self.path}: section {name!r} checksum mismatch")
+            self._verified.add(name)
+        return skind, rows, off, length
+
+    def verify(self, names=None):
+        for name in names or self.sections:
+            self._section(name)
+
+    def json(self, name):
+        _, _, off, length = self._section(name, JSON)
+        return json.loads(self._mm[off:off + length])
+
+    def column(self, name):
+        # float64/date columns are zero-copy views; strings are decoded (None for "")
+        kind, rows, off, length = self._section(name)
+        if kind == F8:
+            return np.frombuffer(self._mm, "<f8", rows, off)
+        if kind == DATE:
+            return np.frombuffer(self._mm, "<M8[D]", rows, off)
+        if kind != STR:
+            raise SnapshotError(f"{self.path}: section {name!r} is not a column")
+        offsets = np.frombuffer(self._mm, "<u4", rows + 1, off).tolist()
+        data = self._mm[off + 4 * (rows + 1):off + length]
+        if offsets[-1] != len(data):
+            raise SnapshotError(f"{self.path}: section {name!r} has bad string offsets")
+        return [data[a:b].decode("utf-8") or None for a, b in zip(offsets, offsets[1:])]
+
+    def columns(self, table, cls):
+        # Same shape as report_model.read_columns: {field: [typed values]}
+        out = {}
+        for field, parse in cls.FIELDS:
+            col = self.column(f"{table}.{field}")
+            if isinstance(col, np.ndarray):
+                col = col.tolist()  # NaT -> None, dates -> datetime.date
+                if _kind(parse) == F8:
+                    col = [None if v != v else parse(v) for v in col]
+            out[field] = col
+        return out
+
+    def records(self, table, cls):
+        cols = self.columns(table, cls)
+        for values in zip(*(cols[f] for f in cls.columns())):
+            yield cls.from_values(values)
+
+def unpack(path, out_dir="."):
+    snap = Snapshot(path)
+    snap.verify()
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for name, fname in DOCS.items():
+        _write(os.path.join(out_dir, fname), json.dumps(snap.json(name), ensure_ascii=False))
+        written.append(fname)
+    for name, (fname, cls) in TABLES.items():
+        dest = os.path.join(out_dir, fname)
+        if cls is NewsItem:
+            items = [r.as_dict() for r in snap.records(name, cls)]
+            _write(dest, json.dumps({"articles": items}, ensure_ascii=False))
+        else:
+            tmp = f"{dest}.{os.getpid()}.tmp"
+            with open(tmp, "w", newline="", encoding="utf-8") as f:
+                w = csv.writer(f, lineterminator="\n")
+                w.writerow(cls.columns())
+                for r in snap.records(name, cls):
+                    w.writerow("" if v is None else v for v in r.as_dict().values())
+            os.replace(tmp, dest)
+        written.append(fname)
+    return written
+
+def _write(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text + "\n")
+    os.replace(tmp, path)
+
+def main():
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("pack", help="pack the loose input files")
+    a.add_argument("--root", default=".")
+    a.add_argument("-o", "--out", default=os.getenv("INPUT_SNAPSHOT", "daily_inputs.snap"))
+    b = sub.add_parser("unpack", help="write the loose files back out")
+    b.add_argument("snapshot")
+    b.add_argument("--out-dir", default=".")
+    c = sub.add_parser("check", help="verify every section and list them")
+    c.add_argument("snapshot")
+    args = p.parse_args()
+
+    try:
+        if args.cmd == "pack":
+            n, size = pack(args.out, args.root)
+            print(f"Packed {n} sections into {args.out} ({size} bytes)")
+        elif args.cmd == "unpack":
+            files = unpack(args.snapshot, args.out_dir)
+            print(f"Wrote {', '.join(files)} into {args.out_dir}")
+        else:
+            snap = Snapshot(args.snapshot)
+            snap.verify()
+            for name, (kind, rows, off, length, _) in snap.sections.items():
+                print(f"{name:<32} {KINDS.get(kind, kind):<5} {rows:>8} rows {length:>10} bytes")
+            print(f"✅ {args.snapshot}: {len(snap.sections)} sections OK")
+    except SnapshotError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
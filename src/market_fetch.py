@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+# Fetch the daily inputs: prices.csv and dividends.csv (EODHD), macro.json
+# (FRED) and news_general.json / news_finance.json (NewsAPI).
+#
+# Everything runs on one asyncio loop over a small HTTP/1.1 client: one
+# keep-alive pool per host capped at FETCH_CONCURRENCY requests in flight,
+# retries with jittered backoff on 429/5xx and dropped connections (honouring
+# Retry-After), and batch endpoints where the API has them (real-time quotes
+# 20 symbols a call, month-ago closes one bulk call per exchange).
+#
+# Responses are cached in .cache/http (API keys are not part of the key). A
+# cached response younger than its endpoint's TTL is used without a request;
+# an older one is revalidated with If-None-Match / If-Modified-Since, so an
+# unchanged resource costs a 304. Each output file is written atomically and
+# only if all of its requests succeeded.
+#
+# Each source also has a latency budget (FETCH_BUDGET_<SOURCE>). One that
+# fails or runs over is served from its last-known-good copy (.cache/lkg) and
+# marked stale in market_status.json, which render shows next to the section;
+# a late source is finished by a detached process so the next run has it.
+#
+# Base URLs come from EODHD_BASE / FRED_BASE / NEWS_BASE, so the whole thing
+# can run against scripts/market_stub.py.
+import argparse, asyncio, csv, gzip, hashlib, io, json, os, random, ssl, subprocess, sys, time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+from stage_metrics import record
+
+EODHD_BASE = os.getenv("EODHD_BASE", "https://eodhd.com")
+FRED_BASE = os.getenv("FRED_BASE", "https://api.stlouisfed.org")
+NEWS_BASE = os.getenv("NEWS_BASE", "https://newsapi.org")
+EODHD_TOKEN = os.getenv("EODHD_API_TOKEN", "")
+FRED_KEY = os.getenv("FRED_API_KEY", "")
+NEWS_KEY = os.getenv("NEWS_API_KEY", "")
+SECRET_PARAMS = {"api_token", "api_key", "apiKey"}
+
+WATCHLIST = os.getenv("WATCHLIST", "data/watchlist.csv")
+CACHE_DIR = os.path.join(".cache", "http")
+LKG_DIR = os.path.join(".cache", "lkg")
+STATUS = os.getenv("MARKET_STATUS", "market_status.json")
+STATUS_VERSION = 1
+CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))   # per host
+TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "20"))
+RETRIES = 4
+RETRY_STATUS = {429, 500, 502, 503, 504}
+QUOTE_BATCH = 20
+MONTH_DAYS = 30
+DIVIDEND_DAYS = 45     # show dividends that went ex within this many days, or later
+
+# seconds a cached response is used without asking the server
+TTL = {"quotes": 60, "eod_bulk": 7 * 86400, "dividends": 12 * 3600, "fred": 6 * 3600, "news": 600}
+SOURCES = ("prices", "dividends", "macro", "news_general", "news_finance")
+OUTPUTS = {"prices": "prices.csv", "dividends": "dividends.csv", "macro": "macro.json",
+           "news_general": "news_general.json", "news_finance": "news_finance.json"}
+# seconds each source may take before the run goes on without it
+BUDGET = {name: float(os.getenv(f"FETCH_BUDGET_{name.upper()}", default)) for name, default in
+          (("prices", 20), ("dividends", 20), ("macro", 10), ("news_general", 10), ("news_finance", 10))}
+EXCHANGES = {"L": "LSE"}   # watchlist suffix -> EODHD exchange; no suffix = US
+MACRO_SERIES = {"us_cpi": "CPIAUCSL", "uk_cpi": "GBRCPIALLMINMEI", "wti": "DCOILWTICO"}
+NEWS_CATEGORIES = {"news_general": "general", "news_finance": "business"}
+CURRENCY_FMT = {"USD": "${:.2f}", "GBP": "£{:.2f}", "GBX": "{:g}p", "EUR": "€{:.2f}"}
+
+class FetchError(Exception):
+    pass
+
+# --- HTTP -------------------------------------------------------------------
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader, self.writer, self.used = reader, writer, 0
+
+    def close(self):
+        self.writer.close()
+
+class HostPool:
+    # Keep-alive connections to one scheme://host:port; the semaphore caps
+    # requests in flight, so at most `limit` connections are ever open
+    def __init__(self, scheme, host, port, limit):
+        self.scheme, self.host, self.port = scheme, host, port
+        self.sem = asyncio.Semaphore(limit)
+        self.idle = []
+        self.opened = 0
+
+    async def acquire(self):
+        await self.sem.acquire()
+        if self.idle:
+            return self.idle.pop()
+        try:
+            ctx = ssl.create_default_context() if self.scheme == "https" else None
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=ctx), TIMEOUT)
+        except BaseException:
+            self.sem.release()
+            raise
+        self.opened += 1
+        return Connection(reader, writer)
+
+    def release(self, conn, reusable):
+        if reusable:
+            self.idle.append(conn)
+        else:
+            conn.close()
+        self.sem.release()
+
+    def close(self):
+        for conn in self.idle:
+            conn.close()
+        self.idle.clear()
+
+async def _exchange(conn, host, target, headers):
+    # One request/response on an open connection -> (status, headers, body, reusable)
+    lines = [f"GET {target} HTTP/1.1", f"Host: {host}", "User-Agent: daily-report-fetch/1",
+             "Accept: application/json", "Accept-Encoding: gzip", "Connection: keep-alive"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    conn.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await conn.writer.drain()
+    conn.used += 1
+
+    status_line = await conn.reader.readline()
+    if not status_line:
+        raise ConnectionResetError("connection closed before response")
+    version, status = status_line.split(None, 2)[:2]
+    status = int(status)
+    hdrs = {}
+    while True:
+        line = await conn.reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = line.decode("latin-1").partition(":")
+        hdrs[k.strip().lower()] = v.strip()
+    reusable = version == b"HTTP/1.1" and hdrs.get("connection", "").lower() != "close"
+    if status in (204, 304) or 100 <= status < 200:
+        body = b""
+    elif "chunked" in hdrs.get("transfer-encoding", "").lower():
+        parts = []
+        while True:
+            size = int((await conn.reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                while (await conn.reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            parts.append(await conn.reader.readexactly(size))
+            await conn.reader.readexactly(2)
+        body = b"".join(parts)
+    elif "content-length" in hdrs:
+        body = await conn.reader.readexactly(int(hdrs["content-length"]))
+    else:
+        body = await conn.reader.read()
+        reusable = False
+    if hdrs.get("content-encoding", "").lower() == "gzip":
+        body = gzip.decompress(body)
+    return status, hdrs, body, reusable
+
+def _redact(url):
+    u = urlsplit(url)
+    query = [kv for kv in (u.query.split("&") if u.query else []) if kv.split("=", 1)[0] not in SECRET_PARAMS]
+    return u._replace(query="&".join(query)).geturl()
+
+class Fetcher:
+    def __init__(self, cache_dir=CACHE_DIR, limit=CONCURRENCY, retries=RETRIES, use_cache=True,
+                 max_age=None):
+        self.cache_dir = cache_dir if use_cache else None
+        self.max_age = max_age  # caps every TTL (0: always revalidate)
+        self.limit, self.retries = limit, retries
+        self.pools = {}
+        self.stats = {"requests": 0, "fresh": 0, "revalidated": 0, "fetched": 0, "retries": 0}
+
+    def _pool(self, u):
+        port = u.port or (443 if u.scheme == "https" else 80)
+        key = (u.scheme, u.hostname, port)
+        if key not in self.pools:
+            self.pools[key] = HostPool(u.scheme, u.hostname, port, self.limit)
+        return self.pools[key]
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+
+    def connections(self):
+        return sum(p.opened for p in self.pools.values())
+
+    # cache: <key>.json holds the validators and fetch time, <key>.body the bytes
+    def _cache_paths(self, url):
+        key = hashlib.sha256(_redact(url).encode("utf-8")).hexdigest()[:32]
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.json", f"{base}.body"
+
+    def _load(self, url):
+        if not self.cache_dir:
+            return None, None
+        meta_path, body_path = self._cache_paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _store(self, url, meta, body=None):
+        if not self.cache_dir:
+            return
+        meta_path, body_path = self._cache_paths(url)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if body is not None:
+                _write_bytes(body_path, body)
+            _write_bytes(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError:
+            pass  # the cache is only an optimisation
+
+    async def get(self, url, ttl):
+        # -> body bytes of a 200 response (possibly from cache)
+        meta, cached = self._load(url)
+        now = time.time()
+        if self.max_age is not None:
+            ttl = min(ttl, self.max_age)
+        if meta and now - meta["fetched"] < ttl:
+            self.stats["fresh"] += 1
+            return cached
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        u = urlsplit(url)
+        pool = self._pool(u)
+        target = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        for attempt in range(self.retries + 1):
+            delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2)
+            conn = None
+            try:
+                conn = await pool.acquire()
+                self.stats["requests"] += 1
+                status, hdrs, body, reusable = await asyncio.wait_for(
+                    _exchange(conn, u.netloc, target, headers), TIMEOUT)
+            except asyncio.CancelledError:
+                if conn is not None:
+                    pool.release(conn, False)
+                raise
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                reused = conn is not None and conn.used > 1
+                if conn is not None:
+                    pool.release(conn, False)
+                if attempt == self.retries:
+                    raise FetchError(f"{_redact(url)}: {e or type(e).__name__}")
+                self.stats["retries"] += 1
+                if not reused:  # a stale keep-alive connection retries at once
+                    await asyncio.sleep(delay)
+                continue
+            pool.release(conn, reusable)
+            if status in RETRY_STATUS and attempt < self.retries:
+                self.stats["retries"] += 1
+                retry_after = hdrs.get("retry-after", "")
+                await asyncio.sleep(min(float(retry_after), 30.0) if retry_after.isdigit() else delay)
+                continue
+            if status == 304 and meta:
+                self.stats["revalidated"] += 1
+                self._store(url, dict(meta, fetched=now))
+                return cached
+            if status != 200:
+                raise FetchError(f"{_redact(url)}: HTTP {status}")
+            self.stats["fetched"] += 1
+            self._store(url, {"url": _redact(url), "fetched": now, "etag": hdrs.get("etag"),
+                              "last_modified": hdrs.get("last-modified")}, body)
+            return body
+
+    async def get_json(self, url, ttl):
+        body = await self.get(url, ttl)
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise FetchError(f"{_redact(url)}: bad JSON ({e})")
+
+# --- outputs ----------------------------------------------------------------
+
+async def _all(*aws):
+    # gather that lets every sibling finish before raising the first error
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    for r in results:
+        if isinstance(r, BaseException):
+            raise r
+    return results
+
+def _write_bytes(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _csv_bytes(header, rows):
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(header)
+    w.writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+def _num(v):
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        return None
+    return x if x == x else None
+
+def _fmt(x):
+    return "" if x is None else f"{x:.2f}"
+
+def load_watchlist(path=WATCHLIST):
+    # [(ticker, name, EODHD symbol)]; symbol column optional
+    out = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            t = (row.get("ticker") or "").strip()
+            if not t:
+                continue
+            sym = (row.get("symbol") or "").strip()
+            if not sym:
+                base, _, suffix = t.rpartition(".")
+                sym = f"{base}.{EXCHANGES.get(suffix, suffix)}" if base else f"{t}.US"
+            out.append((t, (row.get("name") or "").strip(), sym))
+    return out
+
+def eodhd_url(path, **params):
+    return f"{EODHD_BASE}/api/{path}?" + urlencode(dict(params, api_token=EODHD_TOKEN, fmt="json"))
+
+async def fetch_prices(f, watchlist, today):
+    syms = [s for _, _, s in watchlist]
+    batches = [syms[i:i + QUOTE_BATCH] for i in range(0, len(syms), QUOTE_BATCH)]
+
+    async def quotes(batch):
+        data = await f.get_json(eodhd_url(f"real-time/{batch[0]}", s=",".join(batch[1:])), TTL["quotes"])
+        return data if isinstance(data, list) else [data]
+
+    async def month_ago(exchange, codes):
+        # Bulk last-day closes for the whole exchange, walking back over
+        # weekends/holidays until a day has data
+        for back in range(6):
+            day = (today - timedelta(days=MONTH_DAYS + back)).isoformat()
+            rows = await f.get_json(eodhd_url(f"eod-bulk-last-day/{exchange}", date=day,
+                                              symbols=",".join(codes)), TTL["eod_bulk"])
+            if rows:
+                return {f"{r['code']}.{exchange}": _num(r.get("close")) for r in rows}
+        return {}
+
+    by_exchange = {}
+    for s in syms:
+        code, _, ex = s.rpartition(".")
+        by_exchange.setdefault(ex, []).append(code)
+    results = await _all(*(quotes(b) for b in batches),
+                         *(month_ago(ex, codes) for ex, codes in by_exchange.items()))
+    live = {q.get("code"): q for batch in results[:len(batches)] for q in batch}
+    old = {k: v for m in results[len(batches):] for k, v in m.items()}
+    rows = []
+    for ticker, name, sym in watchlist:
+        q = live.get(sym) or live.get(sym.rpartition(".")[0]) or {}
+        rows.append((ticker, name, _fmt(_num(q.get("close"))), _fmt(_num(q.get("previousClose"))),
+                     _fmt(old.get(sym))))
+    return (_csv_bytes(("ticker", "name", "last", "prev_close", "month_ago_close"), rows),
+            f"{len(rows)} tickers in {len(batches)} quote call(s)")
+
+def _amount(value, currency):
+    x = _num(value)
+    if x is None:
+        return ""
+    return CURRENCY_FMT.get((currency or "").upper(), "{:g} " + (currency or "")).format(x).strip()
+
+async def fetch_dividends(f, watchlist, today):
+    since = today - timedelta(days=DIVIDEND_DAYS)
+
+    async def latest(sym):
+        rows = await f.get_json(eodhd_url(f"div/{sym}", **{"from": since.isoformat()}), TTL["dividends"])
+        rows = [r for r in rows or [] if r.get("date")]
+        return max(rows, key=lambda r: r["date"]) if rows else None
+
+    found = await _all(*(latest(sym) for _, _, sym in watchlist))
+    rows = [(t, name, d["date"], d.get("paymentDate") or "", _amount(d.get("value"), d.get("currency")))
+            for (t, name, _), d in zip(watchlist, found) if d]
+    rows.sort(key=lambda r: r[2])
+    return (_csv_bytes(("ticker", "name", "ex_date", "pay_date", "amount"), rows),
+            f"{len(rows)} dividend(s) from {len(watchlist)} tickers")
+
+def _values(obs):
+    return [(o["date"], float(o["value"])) for o in obs if o.get("value") not in (None, ".", "")]
+
+def _yoy(vals, i):
+    if len(vals) <= i + 12 or not vals[i + 12][1]:
+        return None
+    return round((vals[i][1] / vals[i + 12][1] - 1) * 100, 1)
+
+async def fetch_macro(f, today):
+    async def series(sid, limit):
+        url = f"{FRED_BASE}/fred/series/observations?" + urlencode(
+            {"series_id": sid, "api_key": FRED_KEY, "file_type": "json",
+             "sort_order": "desc", "limit": limit})
+        return _values((await f.get_json(url, TTL["fred"])).get("observations", []))
+
+    us, uk, wti = await _all(series(MACRO_SERIES["us_cpi"], 14),
+                             series(MACRO_SERIES["uk_cpi"], 14),
+                             series(MACRO_SERIES["wti"], 45))
+    if not wti:
+        raise FetchError("no WTI observations")
+    cutoff = (date.fromisoformat(wti[0][0]) - timedelta(days=MONTH_DAYS)).isoformat()
+    month_ago = next((v for d, v in wti if d <= cutoff), None)
+    fresh = {
+        "uk_cpi_yoy": _yoy(uk, 0), "uk_cpi_yoy_prev": _yoy(uk, 1),
+        "us_cpi_yoy": _yoy(us, 0), "us_cpi_yoy_prev": _yoy(us, 1),
+        "wti": wti[0][1], "wti_prev": wti[1][1] if len(wti) > 1 else None, "wti_month_ago": month_ago,
+    }
+    try:
+        with open(OUTPUTS["macro"], encoding="utf-8") as fh:
+            macro = json.load(fh)  # keep keys other stages own
+    except (OSError, ValueError):
+        macro = {}
+    macro.update({k: v for k, v in fresh.items() if v is not None})
+    return (json.dumps(macro, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+            f"{sum(v is not None for v in fresh.values())}/{len(fresh)} values")
+
+async def fetch_news(f, name):
+    url = f"{NEWS_BASE}/v2/top-headlines?" + urlencode(
+        {"category": NEWS_CATEGORIES[name], "language": "en", "pageSize": 100, "apiKey": NEWS_KEY})
+    body = await f.get(url, TTL["news"])
+    return body, f"{len(body)} bytes"  # raw; news_normalize.py reads any shape
+
+# --- driver -----------------------------------------------------------------
+
+def _configured(name):
+    # A source runs if it has a key or points somewhere other than the real API
+    key, base, default = {
+        "prices": (EODHD_TOKEN, EODHD_BASE, "https://eodhd.com"),
+        "dividends": (EODHD_TOKEN, EODHD_BASE, "https://eodhd.com"),
+        "macro": (FRED_KEY, FRED_BASE, "https://api.stlouisfed.org"),
+        "news_general": (NEWS_KEY, NEWS_BASE, "https://newsapi.org"),
+        "news_finance": (NEWS_KEY, NEWS_BASE, "https://newsapi.org"),
+    }[name]
+    return bool(key) or base != default
+
+# Last-known-good store: every successful fetch is also kept in LKG_DIR with
+# the time it was fetched, so a source that is late or down can be served
+# from there and labelled with how old it is.
+def lkg_save(name, data, as_of, lkg_dir=LKG_DIR):
+    os.makedirs(lkg_dir, exist_ok=True)
+    path = os.path.join(lkg_dir, OUTPUTS[name])
+    _write_bytes(path, data)
+    _write_bytes(f"{path}.json", json.dumps({"as_of": as_of}).encode("utf-8"))
+
+def lkg_load(name, lkg_dir=LKG_DIR):
+    # -> (bytes, fetched at) or (None, None)
+    path = os.path.join(lkg_dir, OUTPUTS[name])
+    try:
+        with open(f"{path}.json", encoding="utf-8") as f:
+            as_of = json.load(f)["as_of"]
+        with open(path, "rb") as f:
+            return f.read(), as_of
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+def serve_stale(name, lkg_dir=LKG_DIR):
+    # Put the newest copy we have in place: the last-known-good one unless
+    # the file on disk is newer. -> its age or None. Files restored from a
+    # freeze carry the freeze's time as mtime (fetch_snapshot.py), so a
+    # restore doesn't pass for data fetched just now.
+    out = OUTPUTS[name]
+    data, as_of = lkg_load(name, lkg_dir)
+    try:
+        mtime = os.path.getmtime(out)
+    except OSError:
+        mtime = None
+    if data is not None and (mtime is None or as_of >= mtime):
+        _write_bytes(out, data)
+        return as_of
+    return mtime
+
+def _spawn_refresh(names, args):
+    # Finish the late sources in a detached process; it only updates the
+    # HTTP cache and the last-known-good store, for the next run
+    log = open(os.path.join(args.lkg_dir, "refresh.log"), "ab")
+    cmd = [sys.executable, os.path.abspath(__file__), "--background", "--only", ",".join(names),
+           "--watchlist", args.watchlist, "--cache-dir", args.cache_dir, "--lkg-dir", args.lkg_dir,
+           "--concurrency", str(args.concurrency)]
+    subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                     start_new_session=True)
+    log.close()
+
+def _lock(path):
+    # One background refresh at a time; a lock left by a dead process is taken over
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(path) as f:
+                    os.kill(int(f.read() or 0), 0)
+                return False
+            except (OSError, ValueError):
+                os.unlink(path)
+                continue
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+    return False
+
+async def run(only, watchlist_path=WATCHLIST, cache_dir=CACHE_DIR, use_cache=True,
+              limit=CONCURRENCY, max_age=None, budgets=None, today=None):
+    # -> ({name: (payload, summary) | exception}, http stats). A source past
+    # its budget (seconds) gets a TimeoutError; budgets=None waits for all.
+    today = today or date.today()
+    f = Fetcher(cache_dir, limit, use_cache=use_cache, max_age=max_age)
+    watchlist = load_watchlist(watchlist_path) if {"prices", "dividends"} & set(only) else []
+    jobs = {"prices": lambda: fetch_prices(f, watchlist, today),
+            "dividends": lambda: fetch_dividends(f, watchlist, today),
+            "macro": lambda: fetch_macro(f, today),
+            "news_general": lambda: fetch_news(f, "news_general"),
+            "news_finance": lambda: fetch_news(f, "news_finance")}
+    tasks = {name: asyncio.ensure_future(jobs[name]()) for name in only}
+
+    async def bounded(name):
+        if budgets is None:
+            return await tasks[name]
+        try:  # the deadline cancels the fetch; --background finishes it
+            return await asyncio.wait_for(tasks[name], budgets[name])
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"no answer within its {budgets[name]:g}s budget")
+
+    try:
+        results = await asyncio.gather(*(bounded(n) for n in only), return_exceptions=True)
+    finally:
+        for t in tasks.values():
+            t.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        f.close()
+    return dict(zip(only, results)), dict(f.stats, connections=f.connections())
+
+def _stamp(ts):
+    return time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(ts)) if ts else "unknown"
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--only", default=",".join(SOURCES),
+                   help="comma list of " + ",".join(SOURCES) + " (news = both feeds)")
+    p.add_argument("--watchlist", default=WATCHLIST)
+    p.add_argument("--cache-dir", default=CACHE_DIR)
+    p.add_argument("--lkg-dir", default=LKG_DIR)
+    p.add_argument("--status", default=STATUS)
+    p.add_argument("--no-cache", action="store_true", help="ignore and don't write the HTTP cache")
+    p.add_argument("--max-age", type=float, help="cap cache TTLs at this many seconds (0: revalidate all)")
+    p.add_argument("--concurrency", type=int, default=CONCURRENCY, help="requests in flight per host")
+    p.add_argument("--budget", type=float, help="latency budget in seconds for every source")
+    p.add_argument("--no-background", action="store_true",
+                   help="don't finish late sources in the background")
+    p.add_argument("--background", action="store_true", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    only = []
+    for s in args.only.split(","):
+        for name in (NEWS_CATEGORIES if s == "news" else [s] if s else []):
+            if name not in SOURCES:
+                p.error(f"unknown source: {name}")
+            only.append(name)
+    if args.background:
+        return refresh(only, args)
+
+    for name in [n for n in only if not _configured(n)]:
+        print(f"NOTE: {name}: no API key configured; keeping the existing file.")
+        only.remove(name)
+    budgets = {n: args.budget if args.budget is not None else BUDGET[n] for n in only}
+    t0 = time.perf_counter()
+    results, stats = asyncio.run(run(only, args.watchlist, args.cache_dir, not args.no_cache,
+                                     args.concurrency, args.max_age, budgets))
+    now = time.time()
+    status, late = {}, []
+    for name, res in results.items():
+        out = OUTPUTS[name]
+        if not isinstance(res, BaseException):
+            data, summary = res
+            _write_bytes(out, data)
+            try:
+                lkg_save(name, data, now, args.lkg_dir)
+            except OSError as e:
+                print(f"⚠️ {name}: could not update the last-known-good copy: {e}", file=sys.stderr)
+            status[name] = {"file": out, "stale": False, "as_of": now}
+            print(f"✅ {out}: {summary}")
+            continue
+        if isinstance(res, asyncio.TimeoutError):
+            late.append(name)
+        as_of = serve_stale(name, args.lkg_dir)
+        status[name] = {"file": out, "stale": True, "as_of": as_of, "reason": str(res)}
+        print(f"⚠️ {name}: {res}; serving {out} as of {_stamp(as_of)}.", file=sys.stderr)
+    if status:
+        try:  # an --only run leaves the other sources' entries alone
+            with open(args.status, encoding="utf-8") as f:
+                prev = json.load(f)
+            sources = prev["sources"] if prev.get("version") == STATUS_VERSION else {}
+        except (OSError, ValueError, KeyError, AttributeError):
+            sources = {}
+        doc = {"version": STATUS_VERSION, "generated": now, "sources": dict(sources, **status)}
+        _write_bytes(args.status, json.dumps(doc, separators=(",", ":")).encode("utf-8"))
+    if late and not args.no_background:
+        os.makedirs(args.lkg_dir, exist_ok=True)
+        _spawn_refresh(late, args)
+        print(f"NOTE: finishing {', '.join(late)} in the background for the next run.")
+    print(f"HTTP: {stats['requests']} request(s) on {stats['connections']} connection(s), "
+          f"{stats['fresh']} fresh from cache, {stats['revalidated']} revalidated (304), "
+          f"{stats['retries']} retried, {time.perf_counter() - t0:.2f}s")
+    stale = sorted(n for n, st in status.items() if st["stale"])
+    record(stale_sources=stale, http_requests=stats["requests"], http_connections=stats["connections"])
+    return 1 if stale else 0
+
+def refresh(only, args):
+    # --background: fetch without budgets into the caches only
+    os.makedirs(args.lkg_dir, exist_ok=True)
+    lock = os.path.join(args.lkg_dir, "refresh.lock")
+    if not _lock(lock):
+        print("NOTE: a background refresh is already running.")
+        return 0
+    try:
+        results, stats = asyncio.run(run(only, args.watchlist, args.cache_dir, not args.no_cache,
+                                         args.concurrency, args.max_age))
+        now = time.time()
+        for name, res in results.items():
+            if isinstance(res, BaseException):
+                print(f"{_stamp(now)} ⚠️ {name}: {res}")
+            else:
+                lkg_save(name, res[0], now, args.lkg_dir)
+                print(f"{_stamp(now)} ✅ {name}: {res[1]} (last-known-good updated)")
+    finally:
+        os.unlink(lock)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# Headline deduplication for the news feeds.
+#
+# A headline joins an existing cluster if its canonical URL or its normalised
+# title has been seen (64-bit digests in dicts), or if its MinHash signature
+# collides with a cluster's in any LSH band and the signatures agree on at
+# least THRESHOLD of their slots (estimated Jaccard over words + word pairs).
+# Every step is a constant number of dict lookups, so time is linear in the
+# number of headlines. A story costs about 2.3 KB (its representative item, a
+# 256-byte signature and 16 band entries, which are most of it) and each
+# distinct URL or title another ~150 bytes; there is no per-pair state.
+#
+# With `limit` the deduper keeps only that many stories: when it is full the
+# lowest-ranked story is evicted with its index entries, so memory is flat.
+# A later copy of an evicted story starts a new cluster (its earlier copies
+# are not counted), which only matters for stories that were never near the
+# top. Without a limit every distinct story is kept.
+import hashlib, heapq, re, unicodedata, zlib
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import numpy as np
+
+PERMS = 64
+BANDS = 16            # 4 rows per band: ~99% recall at 0.7, ~5% at 0.3
+THRESHOLD = 0.7
+MIN_SHINGLES = 4      # 1-2 word titles only dedupe exactly
+
+TRACKING = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "cmpid", "ncid",
+            "ref", "ref_src", "referrer", "smid", "igshid", "guccounter", "_ga", "_gl"}
+WORD = re.compile(r"\w+")
+
+_rng = np.random.default_rng(0x6E657773)
+_A = _rng.integers(1, 2**63, PERMS, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, PERMS, dtype=np.uint64)
+_FOLD = _rng.integers(1, 2**63, PERMS, dtype=np.uint64).reshape(BANDS, -1)
+
+def _digest(s):
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+
+def canonical_url(url):
+    # Scheme, www./m., default ports, fragments, trailing slashes and tracking
+    # parameters don't distinguish stories; the rest of the query is sorted
+    url = (url or "").strip()
+    if not url or url == "#":
+        return None
+    try:
+        p = urlsplit(url)
+        port = p.port
+    except ValueError:
+        return url
+    if not p.netloc:
+        return url
+    host = (p.hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if port and port not in (80, 443):
+        host += f":{port}"
+    path = re.sub(r"/{2,}", "/", p.path).rstrip("/")
+    query = sorted((k, v) for k, v in parse_qsl(p.query, keep_blank_values=True)
+                   if not k.lower().startswith("utm_") and k.lower() not in TRACKING)
+    return host + path + ("?" + urlencode(query) if query else "")
+
+def title_words(title):
+    return WORD.findall(unicodedata.normalize("NFKC", title).casefold())
+
+def signature(words):
+    # MinHash over words and adjacent word pairs, packed as 64 uint32 slots
+    # (the hashes keep only their top 32 bits); None if too short to trust
+    shingles = set(words)
+    shingles.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), np.uint64, len(shingles))
+    return ((_A[:, None] * x[None, :] + _B[:, None]) >> np.uint64(32)).min(axis=1) \
+        .astype(np.uint32).tobytes()
+
+def slots(sig):
+    return np.frombuffer(sig, np.uint32)
+
+def band_keys(slots):
+    return (slots.astype(np.uint64).reshape(BANDS, -1) * _FOLD).sum(axis=1).tolist()
+
+class Cluster:
+    # feeds ({feed: copies}) stays None until a copy from another feed joins;
+    # keys lists the index entries pointing at it (only kept with a limit)
+    __slots__ = ("item", "rank", "feed", "copies", "feeds", "sig", "seq", "keys")
+
+    def __init__(self, item, rank, feed, sig, seq):
+        self.item, self.rank, self.feed, self.sig, self.seq = item, rank, feed, sig, seq
+        self.copies, self.feeds, self.keys = 0, None, None
+
+    def feed_counts(self):
+        return self.feeds or {self.feed: self.copies}
+
+class Deduper:
+    def __init__(self, threshold=THRESHOLD, limit=None):
+        # clusters: {seq: Cluster} in the order they were first seen
+        self.threshold, self.limit = threshold, limit or None
+        self.clusters, self.seq, self.evicted = {}, 0, 0
+        self.by_url, self.by_title = {}, {}
+        self.bands = [dict() for _ in range(BANDS)]
+        self.heap = []  # (rank, seq), lazily updated; only with a limit
+
+    def _index(self, table, key, c):
+        if key not in table:
+            table[key] = c
+            if c.keys is not None:
+                c.keys.append((table, key))
+
+    def _watch(self, c):
+        # Rank only ever rises, so stale heap entries are skipped on pop and
+        # the heap is rebuilt once they outnumber the live ones
+        heapq.heappush(self.heap, (c.rank, c.seq))
+        if len(self.heap) > 4 * self.limit + 64:
+            self.heap = [(k.rank, seq) for seq, k in self.clusters.items()]
+            heapq.heapify(self.heap)
+
+    def _evict(self):
+        while len(self.clusters) > self.limit:
+            rank, seq = heapq.heappop(self.heap)
+            c = self.clusters.get(seq)
+            if c is None or c.rank != rank:
+                continue
+            del self.clusters[seq]
+            for table, key in c.keys:
+                del table[key]
+            self.evicted += 1
+
+    def _near(self, mine, keys):
+        for table, key in zip(self.bands, keys):
+            c = table.get(key)
+            if c is not None and np.count_nonzero(slots(c.sig) == mine) >= self.threshold * PERMS:
+                return c
+        return None
+
+    def add(self, item, rank, feed, copies=1, feeds=None, sig=False):
+        # Returns the cluster `item` landed in. The highest-ranked member is
+        # the representative; a cluster stays in the feed it was first seen in.
+        # `copies`/`feeds` merge an already-deduplicated cluster; pass `sig`
+        # to reuse its signature.
+        url = canonical_url(item.url)
+        ukey = _digest(url) if url else None
+        words = title_words(item.title)
+        tkey = _digest(" ".join(words))
+        c = self.by_url.get(ukey) if ukey is not None else None
+        if c is None:
+            c = self.by_title.get(tkey)
+        if c is None:
+            if sig is False:
+                sig = signature(words)
+            mine = slots(sig) if sig is not None else None
+            keys = band_keys(mine) if sig is not None else ()
+            c = self._near(mine, keys) if keys else None
+            if c is None:
+                self.seq += 1
+                c = self.clusters[self.seq] = Cluster(item, rank, feed, sig, self.seq)
+                if self.limit:
+                    c.keys = []
+                    self._watch(c)
+                for table, key in zip(self.bands, keys):
+                    self._index(table, key, c)
+        if rank > c.rank:
+            c.item, c.rank = item, rank
+            if self.limit:
+                self._watch(c)
+        feeds = feeds or {feed: copies}
+        if c.feeds is None and feeds.keys() != {c.feed}:
+            c.feeds = {c.feed: c.copies}
+        c.copies += copies
+        if c.feeds is not None:
+            for f, n in feeds.items():
+                c.feeds[f] = c.feeds.get(f, 0) + n
+        if ukey is not None:
+            self._index(self.by_url, ukey, c)
+        self._index(self.by_title, tkey, c)
+        if self.limit:
+            self._evict()
+        return c
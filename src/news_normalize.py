@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# Streaming news normalizer: top-N general + top-N financial headlines.
+#
+# Replaces the two jq passes. Each feed is read in chunks and only walked as
+# far as the item list; every item is decoded on its own, so the feed is never
+# held in memory however large it is. The list is located with the same rules
+# as report_model.find_list (articles, items, news, data.articles,
+# payload.items, results; a bare top-level list) and the title/url fallbacks
+# are NewsItem.from_item's. Memory stays flat: dedup works on a bounded pool
+# of the best POOL stories per feed (news_dedup.Deduper's limit, about
+# 2.3 KB a story), and with --no-dedup items go straight into a top-N heap.
+# --pool 0 keeps every distinct story for exact copy counts (~70 MB for 50k
+# headlines).
+#
+# Items are ranked by publish time, then score, then feed order, so a feed
+# without either keeps its own order. Duplicate and near-duplicate headlines
+# are collapsed within and across feeds first (news_dedup.py); each shown
+# item carries `copies`. The result is one compact news.json:
+#   {"version": 2, "top": N, "dedup": true, "pool": P, "cross_feed": K,
+#    "general": {"source", "seen", "stories", "articles": [{title, url, copies}]},
+#    "finance": {...}}
+import argparse, heapq, json, os, re, sys
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from news_dedup import Deduper
+from report_model import NewsItem, iter_news
+
+FEEDS = {"general": "news_general.json", "finance": "news_finance.json"}
+OUT = os.getenv("NEWS_JSON", "news.json")
+TOP_N = 5
+POOL = 256            # dedup candidates kept per feed; 0 = unbounded
+VERSION = 2
+CHUNK = 1 << 16
+
+# find_list's paths, in priority order
+LIST_PATHS = (("articles",), ("items",), ("news",), ("data", "articles"), ("payload", "items"), ("results",))
+TOP_KEYS = {p[0] for p in LIST_PATHS if len(p) == 1}
+NESTED = {p[0]: p[1] for p in LIST_PATHS if len(p) == 2}
+TIME_KEYS = ("publishedAt", "published_at", "pubDate", "published", "date", "datetime", "time", "timestamp")
+SCORE_KEYS = ("score", "relevance", "rank_score")
+
+WS = re.compile(r"[ \t\n\r]*")
+SCAN = re.compile(r'[\[\]{}"]')
+STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+NUMBER_TAIL = re.compile(r"[0-9.eE+\-]*\Z")
+DECODER = json.JSONDecoder()
+
+class JsonStream:
+    # Just enough of an incremental JSON reader to walk down to a list and
+    # decode its elements one at a time; skipped values are scanned, not built.
+    def __init__(self, f, chunk=CHUNK):
+        self.f, self.chunk = f, chunk
+        self.buf, self.pos, self.eof = "", 0, False
+
+    def _fill(self, size=None):
+        if self.eof:
+            return False
+        data = self.f.read(size or self.chunk)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, c):
+        if self.peek() != c:
+            raise ValueError(f"expected {c!r} near offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                end = None
+            # A value that runs to the end of the buffer may be cut short, and
+            # a number may only look complete ("1." of "1.5")
+            if end is not None and (self.eof or (end < len(self.buf) and not (
+                    isinstance(obj, (int, float)) and NUMBER_TAIL.match(self.buf, end)))):
+                self.pos = end
+                return obj
+            if not self._fill(max(self.chunk, len(self.buf) - self.pos)):
+                if end is not None:
+                    self.pos = end
+                    return obj
+                raise ValueError(f"invalid JSON near offset {self.pos}")
+
+    def skip(self):
+        if self.peek() not in "[{":
+            self.value()
+            return
+        depth = 0
+        while True:
+            m = SCAN.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise ValueError("unexpected end of JSON")
+                continue
+            if m.group() == '"':
+                s = STRING.match(self.buf, m.start())
+                if s is None:  # string continues past the buffer
+                    self.pos = m.start()
+                    if not self._fill(max(self.chunk, len(self.buf) - self.pos)):
+                        raise ValueError("unterminated string")
+                    continue
+                self.pos = s.end()
+                continue
+            self.pos = m.end()
+            depth += 1 if m.group() in "[{" else -1
+            if depth == 0:
+                return
+
+    def _items(self, close):
+        if self.peek() == close:
+            self.pos += 1
+            return
+        while True:
+            yield
+            c = self.peek()
+            self.pos += 1
+            if c == close:
+                return
+            if c != ",":
+                raise ValueError(f"expected ',' or {close!r} near offset {self.pos - 1}")
+
+    def array(self):
+        # Yields once per element; the caller consumes it (value/skip/...)
+        self.expect("[")
+        yield from self._items("]")
+
+    def object(self):
+        # Yields each key; the caller consumes its value
+        self.expect("{")
+        for _ in self._items("}"):
+            key = self.value()
+            self.expect(":")
+            yield key
+
+def _timestamp(it):
+    for k in TIME_KEYS:
+        v = it.get(k)
+        if v in (None, ""):
+            continue
+        try:
+            if isinstance(v, (int, float)):
+                return v / 1000.0 if v > 1e11 else float(v)  # epoch ms or s
+            v = str(v).strip()
+            try:
+                dt = datetime.fromisoformat(v.replace("Z", "+00:00"))
+            except ValueError:
+                dt = parsedate_to_datetime(v)
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.timestamp()
+        except (TypeError, ValueError, OverflowError):
+            continue
+    return float("-inf")
+
+def _score(it):
+    for k in SCORE_KEYS:
+        v = it.get(k)
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            return float(v)
+    return 0.0
+
+def rank(raw, seq):
+    return (_timestamp(raw), _score(raw), -seq)
+
+class TopN:
+    # Bounded heap of the best n items (no dedup; memory stays flat)
+    def __init__(self, n):
+        self.n, self.heap, self.seen = n, [], 0
+
+    def push(self, raw):
+        item = NewsItem.from_item(raw)
+        if item is None:
+            return
+        self.seen += 1
+        entry = (rank(raw, self.seen), item)
+        if len(self.heap) < self.n:
+            heapq.heappush(self.heap, entry)
+        elif entry[0] > self.heap[0][0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def items(self):
+        return [item for _, item in sorted(self.heap, key=lambda e: e[0], reverse=True)]
+
+class Clusters:
+    # The best `pool` stories of one candidate list, deduplicated within it
+    def __init__(self, feed, pool=POOL):
+        self.feed, self.dedup, self.seen = feed, Deduper(limit=pool), 0
+
+    def push(self, raw):
+        item = NewsItem.from_item(raw)
+        if item is None:
+            return
+        self.seen += 1
+        self.dedup.add(item, rank(raw, self.seen), self.feed)
+
+def _collect(js, sink):
+    # Current value is a list: feed its elements to `sink`
+    for _ in js.array():
+        if js.peek() == "{":
+            sink.push(js.value())
+        else:
+            js.skip()
+
+def _list_at(js, new_sink, found, path):
+    # Value for `path` is next: a fresh sink if it is a list, else None
+    found[path] = None
+    if js.peek() == "[":
+        found[path] = new_sink()
+        _collect(js, found[path])
+    else:
+        js.skip()
+
+def stream_list(f, new_sink):
+    # -> the sink fed from the list find_list would pick (None if there is
+    # none). Each candidate list gets its own sink since the winner is only
+    # known at the end.
+    js = JsonStream(f)
+    c = js.peek()
+    if c == "[":
+        sink = new_sink()
+        _collect(js, sink)
+        return sink
+    if c != "{":
+        if c:
+            js.skip()
+        return None
+    found = {}
+    for key in js.object():
+        if key in TOP_KEYS:
+            _list_at(js, new_sink, found, (key,))
+        elif key in NESTED:
+            path = (key, NESTED[key])
+            found[path] = None
+            if js.peek() != "{":
+                js.skip()
+                continue
+            for sub in js.object():
+                if sub == path[1]:
+                    _list_at(js, new_sink, found, path)
+                else:
+                    js.skip()
+        else:
+            js.skip()
+    return next((found[p] for p in LIST_PATHS if found.get(p) is not None), None)
+
+def stream_top(f, n=TOP_N):
+    return stream_list(f, lambda: TopN(n))
+
+def _stream_feed(path, new_sink):
+    # A missing feed is empty
+    try:
+        with open(path, encoding="utf-8") as f:
+            return stream_list(f, new_sink)
+    except FileNotFoundError:
+        return None
+
+def top_news(path, n=TOP_N):
+    # (NewsItems, items seen) from one raw feed, without dedup
+    top = _stream_feed(path, lambda: TopN(n))
+    return (top.items(), top.seen) if top else ([], 0)
+
+def normalize(feeds, n=TOP_N, dedup=True, pool=POOL):
+    # Cross-feed dedup: each feed's clusters are merged into one Deduper in
+    # feed order, so a story in several feeds is listed once, under the feed
+    # that carried it first, with `copies` counting every copy. The merged
+    # deduper needs no limit of its own: it holds at most every feed's pool.
+    doc = {"version": VERSION, "top": n, "dedup": dedup}
+    if not dedup:
+        for kind, path in feeds.items():
+            items, seen = top_news(path, n)
+            doc[kind] = {"source": path, "seen": seen, "articles": [it.as_dict() for it in items]}
+        return doc
+    doc["pool"] = pool
+    merged = Deduper()
+    for kind, path in feeds.items():
+        local = _stream_feed(path, lambda: Clusters(kind, pool))
+        doc[kind] = {"source": path, "seen": local.seen if local else 0}
+        # Drop the feed's own indexes, and each cluster once merged, so the
+        # peak is one feed's stories, not both copies of them
+        clusters = list(local.dedup.clusters.values())[::-1] if local else []
+        local = None
+        while clusters:
+            c = clusters.pop()
+            merged.add(c.item, c.rank, kind, c.copies, c.feeds, c.sig)
+    for kind in feeds:
+        mine = [c for c in merged.clusters.values() if c.feed == kind]
+        top = heapq.nlargest(n, mine, key=lambda c: c.rank)
+        doc[kind]["stories"] = len(mine)
+        doc[kind]["articles"] = [dict(c.item.as_dict(), copies=c.copies) for c in top]
+    doc["cross_feed"] = sum(1 for c in merged.clusters.values() if len(c.feed_counts()) > 1)
+    return doc
+
+_fallback = {}
+
+def load_news(kind, out=OUT, root=".", n=TOP_N):
+    # The normalized artifact if there is one, else normalize the raw feeds
+    # here (once per process)
+    try:
+        with open(os.path.join(root, out), encoding="utf-8") as f:
+            doc = json.load(f)
+        if doc.get("version") == VERSION:
+            return list(iter_news(doc.get(kind) or {}))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError) as e:
+        sys.stderr.write(f"⚠️ {out} is unreadable, streaming the raw feeds: {e}\n")
+    key = (os.path.abspath(root), n)
+    if key not in _fallback:
+        _fallback[key] = normalize({k: os.path.join(root, f) for k, f in FEEDS.items()}, n)
+    return list(iter_news(_fallback[key].get(kind) or {}))
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--general", default=FEEDS["general"])
+    p.add_argument("--finance", default=FEEDS["finance"])
+    p.add_argument("--top", type=int, default=TOP_N)
+    p.add_argument("--no-dedup", action="store_true",
+                   help="skip headline dedup (per-feed top-N only)")
+    p.add_argument("--pool", type=int, default=POOL,
+                   help="stories kept per feed for dedup (0 = all, exact copy counts)")
+    p.add_argument("-o", "--out", default=OUT)
+    args = p.parse_args()
+
+    try:
+        doc = normalize({"general": args.general, "finance": args.finance}, args.top,
+                        not args.no_dedup, max(args.pool, 0))
+    except (OSError, ValueError) as e:
+        print(f"❌ news feed unreadable: {e}", file=sys.stderr)
+        return 2
+    tmp = f"{args.out}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, args.out)
+    summary = ", ".join(f"{k} {len(doc[k]['articles'])}/{doc[k].get('stories', doc[k]['seen'])}"
+                        f" of {doc[k]['seen']}" for k in FEEDS)
+    if doc["dedup"]:
+        summary += f"; {doc['cross_feed']} stories in more than one feed"
+    print(f"Wrote {args.out}: {summary}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
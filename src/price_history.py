@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# Append-only, memory-mapped columnar store of daily closes.
+#
+#   <root>/meta.json         symbol index + commit point:
+#                            {"version", "gen", "capacity", "length", "tickers"}
+#   <root>/dates.<gen>.m8    datetime64[D] axis, `capacity` slots, first `length` used
+#   <root>/closes.<gen>.f8   float64 (len(tickers), capacity); one contiguous row per
+#                            ticker, NaN where a ticker has no close that day
+#
+# A row per ticker makes any ticker/date window a zero-copy view of the mmap.
+# Appending a day fills one preallocated slot per row and then bumps `length`
+# in meta.json (written with os.replace), so a crash mid-append is invisible.
+# Growing past `capacity`, backfilling and compaction write a new generation
+# of both files and switch to it in the same single meta.json replace.
+import argparse, csv, json, os, sys
+from datetime import datetime, timezone
+import numpy as np
+
+HISTORY_DIR = os.getenv("PRICE_HISTORY", os.path.join("data", "price_history"))
+MARKET_STATUS = os.getenv("MARKET_STATUS", "market_status.json")  # from src/market_fetch.py
+DATE, CLOSE = np.dtype("<M8[D]"), np.dtype("<f8")
+CAPACITY = 512        # day slots per generation; doubled when full
+MONTH_DAYS = 30       # month_ago_close lookback
+ASOF_SLOTS = 10       # how far asof() looks back for a non-NaN close (holidays)
+
+def _day(d):
+    return np.datetime64(d, "D")
+
+class PriceHistory:
+    def __init__(self, root=HISTORY_DIR, writable=False):
+        self.root, self.writable = root, writable
+        self._open()
+
+    # --- layout -------------------------------------------------------------
+
+    def _path(self, kind, gen=None):
+        ext = "m8" if kind == "dates" else "f8"
+        return os.path.join(self.root, f"{kind}.{self.gen if gen is None else gen}.{ext}")
+
+    def _open(self):
+        try:
+            with open(os.path.join(self.root, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            if not self.writable:
+                raise
+            meta = {"version": 1, "gen": 0, "capacity": 0, "length": 0, "tickers": []}
+        self.gen, self.capacity, self.length = meta["gen"], meta["capacity"], meta["length"]
+        self.tickers = list(meta["tickers"])
+        self.index = {t: i for i, t in enumerate(self.tickers)}
+        mode = "r+" if self.writable else "r"
+        if self.capacity:
+            self._dates = np.memmap(self._path("dates"), DATE, mode, shape=(self.capacity,))
+        else:
+            self._dates = np.empty(0, DATE)
+        if self.capacity and self.tickers:
+            self._closes = np.memmap(self._path("closes"), CLOSE, mode,
+                                     shape=(len(self.tickers), self.capacity))
+        else:
+            self._closes = np.empty((len(self.tickers), self.capacity), CLOSE)
+
+    def _commit(self, **changes):
+        meta = {"version": 1, "gen": self.gen, "capacity": self.capacity,
+                "length": self.length, "tickers": self.tickers}
+        meta.update(changes)
+        path = os.path.join(self.root, "meta.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    # --- reads (all zero-copy views) -----------------------------------------
+
+    @property
+    def dates(self):
+        return self._dates[:self.length]
+
+    def window(self, start=None, end=None):
+        d = self.dates
+        i0 = 0 if start is None else int(np.searchsorted(d, _day(start), "left"))
+        i1 = len(d) if end is None else int(np.searchsorted(d, _day(end), "right"))
+        return i0, i1
+
+    def series(self, ticker, start=None, end=None):
+        i0, i1 = self.window(start, end)
+        return self.dates[i0:i1], self._closes[self.index[ticker], i0:i1]
+
+    def matrix(self, start=None, end=None):
+        i0, i1 = self.window(start, end)
+        return self.dates[i0:i1], self._closes[:, i0:i1]
+
+    def asof(self, day, tickers=None):
+        # Last non-NaN close on or before `day`, per ticker (NaN if none or unknown)
+        tickers = self.tickers if tickers is None else list(tickers)
+        out = np.full(len(tickers), np.nan)
+        i1 = int(np.searchsorted(self.dates, _day(day), "right"))
+        if not i1:
+            return out
+        rows = np.array([self.index.get(t, -1) for t in tickers], dtype=np.int64)
+        known = rows >= 0
+        block = self._closes[rows[known], max(0, i1 - ASOF_SLOTS):i1]
+        finite = np.isfinite(block)
+        last = block.shape[1] - 1 - finite[:, ::-1].argmax(axis=1)
+        vals = block[np.arange(len(block)), last]
+        out[known] = np.where(finite.any(axis=1), vals, np.nan)
+        return out
+
+    def returns(self, days, tickers=None, end=None):
+        # % change over `days` calendar days ending at `end` (default: last date)
+        end = self.dates[-1] if end is None else _day(end)
+        now = self.asof(end, tickers)
+        then = self.asof(end - np.timedelta64(days, "D"), tickers)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (now / then - 1.0) * 100.0
+
+    def month_ago_close(self, tickers=None, end=None):
+        end = self.dates[-1] if end is None else _day(end)
+        return self.asof(end - np.timedelta64(MONTH_DAYS, "D"), tickers)
+
+    # --- writes --------------------------------------------------------------
+
+    def _add_tickers(self, new):
+        # New rows go on the end of the closes file; drop anything past the
+        # committed rows first (left over from an interrupted append).
+        path = self._path("closes")
+        committed = len(self.tickers) * self.capacity * CLOSE.itemsize
+        with open(path, "ab") as f:
+            f.truncate(committed)
+            f.write(np.full((len(new), self.capacity), np.nan, CLOSE).tobytes())
+        self.tickers += new
+        self.index.update((t, len(self.index)) for t in new)
+        self._closes = np.memmap(path, CLOSE, "r+", shape=(len(self.tickers), self.capacity))
+
+    def append(self, day, closes):
+        # closes: {ticker: close}. Re-running a day overwrites that day; days
+        # before the last one go through backfill() instead.
+        if not self.writable:
+            raise PermissionError("history opened read-only")
+        day = _day(day)
+        if self.length and day < self.dates[-1]:
+            raise ValueError(f"{day} is before the last stored day {self.dates[-1]}; use backfill")
+        new_day = not self.length or day > self.dates[-1]
+        if new_day and self.length == self.capacity:
+            self.rewrite(capacity=max(CAPACITY, self.capacity * 2))
+        new = [t for t in closes if t not in self.index]
+        if new:
+            self._add_tickers(new)
+        slot = self.length if new_day else self.length - 1
+        if new_day:
+            self._dates[slot] = day
+            self._closes[:, slot] = np.nan
+        rows = np.fromiter((self.index[t] for t in closes), np.int64, len(closes))
+        self._closes[rows, slot] = np.fromiter(closes.values(), CLOSE, len(closes))
+        for mm in (self._closes, self._dates):
+            if isinstance(mm, np.memmap):
+                mm.flush()
+        self.length = slot + 1
+        self._commit()
+        return slot
+
+    def rewrite(self, dates=None, tickers=None, closes=None, capacity=None):
+        # Write a new generation (default: the current data) and switch to it
+        if dates is None:
+            dates, tickers, closes = self.dates, self.tickers, self._closes[:, :self.length]
+        capacity = max(capacity or CAPACITY, len(dates), 1)
+        gen = self.gen + 1
+        os.makedirs(self.root, exist_ok=True)
+        d = np.full(capacity, np.datetime64("NaT"), DATE)
+        d[:len(dates)] = dates
+        d.tofile(self._path("dates", gen))
+        with open(self._path("closes", gen), "wb") as f:
+            # In blocks of rows so a large watchlist isn't doubled in memory
+            block = np.full((1024, capacity), np.nan, CLOSE)
+            for r0 in range(0, len(tickers), len(block)):
+                part = block[:min(len(block), len(tickers) - r0)]
+                part[:, :len(dates)] = closes[r0:r0 + len(part)]
+                part.tofile(f)
+        old = self.gen
+        self._commit(gen=gen, capacity=capacity, length=len(dates), tickers=list(tickers))
+        self._dates = self._closes = None
+        for kind in ("dates", "closes"):
+            try:
+                os.unlink(self._path(kind, old))
+            except FileNotFoundError:
+                pass
+        self._open()
+
+    def backfill(self, rows):
+        # rows: iterable of (date, ticker, close), merged over the existing data
+        # (incoming values win) and written as one new generation.
+        nd, nt, nv = [], [], []
+        for d, t, v in rows:
+            nd.append(d); nt.append(t); nv.append(v)
+        nd = np.array(nd, DATE)
+        dates = np.union1d(self.dates, nd)
+        tickers = self.tickers + sorted(set(nt) - set(self.index))
+        pos = {t: i for i, t in enumerate(tickers)}
+        closes = np.full((len(tickers), len(dates)), np.nan, CLOSE)
+        closes[:len(self.tickers), np.searchsorted(dates, self.dates)] = self._closes[:, :self.length]
+        ri = np.fromiter((pos[t] for t in nt), np.int64, len(nt))
+        closes[ri, np.searchsorted(dates, nd)] = np.array(nv, CLOSE)
+        self.rewrite(dates, tickers, closes, capacity=self.capacity)
+        return len(nt)
+
+    def compact(self, keep_days=None, drop_empty=True):
+        # Trim slack capacity, old days and tickers/days with no data at all
+        dates, closes = self.dates, self._closes[:, :self.length]
+        keep = np.ones(len(dates), bool)
+        if keep_days and len(dates):
+            keep &= dates > dates[-1] - np.timedelta64(keep_days, "D")
+        if drop_empty:
+            keep &= np.isfinite(closes).any(axis=0)
+        rows = np.isfinite(closes[:, keep]).any(axis=1) if drop_empty else np.ones(len(self.tickers), bool)
+        before = (len(self.tickers), self.length, self.capacity)
+        self.rewrite(np.array(dates[keep]), [t for t, k in zip(self.tickers, rows) if k],
+                     closes[rows][:, keep], capacity=int(keep.sum()))
+        return before, (len(self.tickers), self.length, self.capacity)
+
+# --- CLI -------------------------------------------------------------------
+
+def read_last_closes(path):
+    from report_model import WatchlistRow, read_columns
+    cols = read_columns(path, WatchlistRow)
+    return {t: v for t, v in zip(cols["ticker"], cols["last"]) if t and v is not None}
+
+def read_long_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            try:
+                yield r["date"].strip(), r["ticker"].strip(), float(r["close"])
+            except (KeyError, ValueError, AttributeError):
+                continue
+
+def stale_prices(status_path, day):
+    # Why prices.csv is not `day`'s data, or None. market_fetch.py marks it
+    # stale when it served an older copy; a status from another day is ignored.
+    try:
+        with open(status_path, encoding="utf-8") as f:
+            doc = json.load(f)
+        st = doc["sources"]["prices"]
+        generated = datetime.fromtimestamp(doc["generated"], timezone.utc).date().isoformat()
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if generated != day or not st.get("stale"):
+        return None
+    as_of = st.get("as_of")
+    when = datetime.fromtimestamp(as_of, timezone.utc).strftime("%Y-%m-%d %H:%M UTC") if as_of else "unknown"
+    return f"{st.get('reason') or 'not refreshed'}; data as of {when}"
+
+def fmt(v):
+    return None if not np.isfinite(v) else round(float(v), 4)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--root", default=HISTORY_DIR)
+    sub = p.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("append", help="record today's `last` closes from prices.csv")
+    a.add_argument("prices", nargs="?", default="prices.csv")
+    a.add_argument("--date", help="YYYY-MM-DD (default: today, UTC)")
+    a.add_argument("--status", default=MARKET_STATUS,
+                   help="skip the append if this market status marks prices stale")
+    a.add_argument("--force", action="store_true", help="append even if prices are stale")
+    b = sub.add_parser("backfill", help="merge a date,ticker,close CSV")
+    b.add_argument("csv")
+    c = sub.add_parser("compact")
+    c.add_argument("--keep-days", type=int)
+    sub.add_parser("info")
+    s = sub.add_parser("show")
+    s.add_argument("ticker")
+    s.add_argument("--start")
+    s.add_argument("--end")
+    r = sub.add_parser("returns", help="JSON of % returns per ticker")
+    r.add_argument("--days", type=int, nargs="+", default=[5, 30, 91])
+    args = p.parse_args()
+
+    if args.cmd in ("append", "backfill", "compact"):
+        h = PriceHistory(args.root, writable=True)
+        if args.cmd == "append":
+            day = args.date or datetime.now(timezone.utc).date().isoformat()
+            stale = None if args.force else stale_prices(args.status, day)
+            if stale:
+                # yesterday's closes must not be recorded under today's date
+                print(f"NOTE: not recording {args.prices} for {day}: prices are stale ({stale})")
+                return 0
+            closes = read_last_closes(args.prices)
+            h.append(day, closes)
+            print(f"History: {len(closes)} closes for {day} ({h.length} days, {len(h.tickers)} tickers)")
+        elif args.cmd == "backfill":
+            n = h.backfill(read_long_csv(args.csv))
+            print(f"History: {n} closes, {h.length} days, {len(h.tickers)} tickers")
+        else:
+            before, after = h.compact(args.keep_days)
+            print("Compacted: tickers/days/capacity {} -> {}".format(
+                "/".join(map(str, before)), "/".join(map(str, after))))
+        return 0
+
+    try:
+        h = PriceHistory(args.root)
+    except FileNotFoundError:
+        print(f"No price history at {args.root} (run `append` first)", file=sys.stderr)
+        return 2
+    if args.cmd == "info":
+        span = f"{h.dates[0]} .. {h.dates[-1]}" if h.length else "empty"
+        print(f"{h.root}: {len(h.tickers)} tickers, {h.length}/{h.capacity} days ({span}), gen {h.gen}")
+    elif args.cmd == "show":
+        if args.ticker not in h.index:
+            print(f"Unknown ticker: {args.ticker}", file=sys.stderr)
+            return 2
+        for d, v in zip(*h.series(args.ticker, args.start, args.end)):
+            print(f"{d},{'' if np.isnan(v) else v}")
+    else:
+        cols = {f"{d}d": h.returns(d) for d in args.days}
+        out = {t: {k: fmt(v[i]) for k, v in cols.items()} for i, t in enumerate(h.tickers)}
+        print(json.dumps(out, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
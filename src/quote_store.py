@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# Quote of the day from quotes.txt ("text|author" per line).
+#
+# The source is deduplicated once per content change (by normalised text, so
+# curly/straight quotes, case and spacing don't make a new quote) into
+# .cache/quotes/<sha>.txt, next to a fixed-width index of byte offsets:
+#
+#   header  magic "QIDX", u32 version, u32 count, u32 reserved
+#   entry   u64 offset, u32 length, u32 crc32 of the normalised text
+#
+# so picking quote i is two small reads, not a pass over the file. The pick
+# is uniform over the quotes not used in the last QUOTE_WINDOW picks (kept by
+# text crc in .quote_state.json, so the window survives edits to quotes.txt)
+# and repeats within one day return the same quote. The pipeline's quotes
+# stage runs `pick`, which writes the day's quote to quote.json for render
+# and the input snapshot; render itself never touches the rotation.
+import argparse, json, os, random, re, struct, sys, unicodedata, zlib
+from datetime import datetime, timezone
+import numpy as np
+
+from file_hashes import cached_sha256, load_hash_cache, save_hash_cache
+
+QUOTES = os.getenv("QUOTES_FILE", "quotes.txt")
+STATE = os.getenv("QUOTE_STATE", ".quote_state.json")
+OUT = os.getenv("QUOTE_JSON", "quote.json")
+WINDOW = int(os.getenv("QUOTE_WINDOW", "30"))
+CACHE_DIR = os.path.join(".cache", "quotes")
+HASH_CACHE = os.path.join(CACHE_DIR, "hashes.json")
+MAGIC, VERSION = b"QIDX", 1
+HEADER = struct.Struct("<4sIII")
+ENTRY = struct.Struct("<QII")
+ENTRY_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("key", "<u4")])
+FOLD = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"', "—": "-", "–": "-"})
+
+def parse_line(line):
+    # -> (text, author) or None for blank/comment lines
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    text, _, author = line.partition("|")
+    text = text.strip()
+    return (text, author.strip()) if text else None
+
+def quote_key(text):
+    norm = unicodedata.normalize("NFKC", text).translate(FOLD).casefold()
+    return zlib.crc32(" ".join(re.findall(r"\w+|[^\w\s]", norm)).encode("utf-8"))
+
+class QuoteIndex:
+    def __init__(self, base):
+        self.base = base
+        with open(f"{base}.idx", "rb") as f:
+            magic, version, self.count, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{base}.idx: not a quote index")
+
+    def __len__(self):
+        return self.count
+
+    def keys(self):
+        return np.fromfile(f"{self.base}.idx", ENTRY_DTYPE, self.count, offset=HEADER.size)["key"]
+
+    def get(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        with open(f"{self.base}.idx", "rb") as f:
+            f.seek(HEADER.size + i * ENTRY.size)
+            offset, length, key = ENTRY.unpack(f.read(ENTRY.size))
+        with open(f"{self.base}.txt", "rb") as f:
+            f.seek(offset)
+            return parse_line(f.read(length).decode("utf-8")), key
+
+def build(source=QUOTES, cache_dir=CACHE_DIR):
+    # Index for the current content of `source`, built only when it changed.
+    # Returns (QuoteIndex, duplicates dropped or None if it was cached).
+    hashes = load_hash_cache(".", HASH_CACHE)
+    digest = cached_sha256(".", source, hashes)
+    if digest is None:
+        raise FileNotFoundError(source)
+    save_hash_cache(".", hashes, HASH_CACHE)
+    base = os.path.join(cache_dir, digest[:32])
+    try:
+        return QuoteIndex(base), None
+    except (OSError, ValueError):
+        pass
+    seen, lines, entries, dropped, pos = set(), [], [], 0, 0
+    with open(source, encoding="utf-8") as f:
+        for raw in f:
+            q = parse_line(raw)
+            if q is None:
+                continue
+            key = quote_key(q[0])
+            if key in seen:
+                dropped += 1
+                continue
+            seen.add(key)
+            line = (f"{q[0]}|{q[1]}\n" if q[1] else f"{q[0]}\n").encode("utf-8")
+            entries.append(ENTRY.pack(pos, len(line), key))
+            lines.append(line)
+            pos += len(line)
+    os.makedirs(cache_dir, exist_ok=True)
+    for ext, blob in (("txt", b"".join(lines)),
+                      ("idx", HEADER.pack(MAGIC, VERSION, len(entries), 0) + b"".join(entries))):
+        tmp = f"{base}.{ext}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, f"{base}.{ext}")
+    return QuoteIndex(base), dropped
+
+def load_state(path=STATE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state, path=STATE):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def pick(index, state, window=WINDOW, day=None, rng=random):
+    # -> (position, new state). No quote used in the last `window` picks is
+    # chosen (the window shrinks to count-1 for short files).
+    day = day or datetime.now(timezone.utc).date().isoformat()
+    keys = index.keys()
+    if state.get("day") == day:
+        again = np.flatnonzero(keys == state.get("key", -1))
+        if len(again):
+            return int(again[0]), state
+    recent = state.get("recent", [])
+    w = min(window, len(index) - 1)
+    excluded = np.flatnonzero(np.isin(keys, recent[-w:] if w > 0 else []))
+    r = rng.randrange(len(index) - len(excluded))
+    for e in excluded.tolist():  # r-th position that isn't excluded
+        if e > r:
+            break
+        r += 1
+    key = int(keys[r])
+    recent = [k for k in recent if k != key] + [key]
+    return r, {"day": day, "key": key, "recent": recent[-max(window, 1):]}
+
+def todays_quote(source=QUOTES, state_path=STATE, window=WINDOW, day=None):
+    # (text, author) for today, advancing the rotation; None without quotes
+    index, _ = build(source)
+    if not len(index):
+        return None
+    i, state = pick(index, load_state(state_path), window, day)
+    try:
+        save_state(state, state_path)
+    except OSError as e:
+        sys.stderr.write(f"⚠️ could not save quote rotation state: {e}\n")
+    return index.get(i)[0]
+
+def save_quote(quote, day, out=OUT):
+    # {"day", "text", "author"}; no quote removes the file
+    if quote is None:
+        try:
+            os.remove(out)
+        except FileNotFoundError:
+            pass
+        return
+    tmp = f"{out}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"day": day, "text": quote[0], "author": quote[1]}, f, ensure_ascii=False)
+    os.replace(tmp, out)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("cmd", choices=("build", "pick", "show", "info"))
+    p.add_argument("n", nargs="?", type=int, help="position for `show`")
+    p.add_argument("--quotes", default=QUOTES)
+    p.add_argument("--state", default=STATE)
+    p.add_argument("--window", type=int, default=WINDOW)
+    p.add_argument("--date", help="pick for this day (YYYY-MM-DD, default today UTC)")
+    p.add_argument("-o", "--out", default=OUT, help="where `pick` writes the quote for render")
+    args = p.parse_args()
+
+    try:
+        index, dropped = build(args.quotes)
+    except FileNotFoundError:
+        print(f"NOTE: {args.quotes} not found; no quote.", file=sys.stderr)
+        if args.cmd == "pick":
+            save_quote(None, args.date, args.out)
+        return 0
+    if args.cmd == "build":
+        status = "up to date" if dropped is None else f"rebuilt, {dropped} duplicate(s) dropped"
+        print(f"{args.quotes}: {len(index)} quotes ({status})")
+    elif args.cmd == "info":
+        state = load_state(args.state)
+        print(f"{len(index)} quotes, window {min(args.window, max(len(index) - 1, 0))}, "
+              f"{len(state.get('recent', []))} in rotation history, last pick {state.get('day', '-')}")
+    elif args.cmd == "show":
+        print("|".join(index.get(args.n or 0)[0]))
+    else:
+        day = args.date or datetime.now(timezone.utc).date().isoformat()
+        q = todays_quote(args.quotes, args.state, args.window, day) if len(index) else None
+        save_quote(q, day, args.out)
+        if q:
+            print("|".join(q))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+# Shared typed records for the daily report inputs.
+#
+# Each CSV row is parsed exactly once into a __slots__ record with numeric and
+# date fields already converted, so renderers and validators never re-parse
+# strings and a million-row file doesn't cost a dict per row. Empty cells
+# become None; cells that fail to parse also become None and are kept verbatim
+# in ``record.invalid`` so validators can report them.
+import csv, sys
+from datetime import date
+
+def _text(s):
+    return s
+
+def _sym(s):
+    # Low-cardinality columns (exchange, currency, ...) share one string object
+    return sys.intern(s)
+
+def _date(s):
+    return date.fromisoformat(s)
+
+class Record:
+    __slots__ = ("invalid",)
+    FIELDS = ()  # ((attr/column name, parser), ...) in CSV column order
+
+    @classmethod
+    def columns(cls):
+        return tuple(name for name, _ in cls.FIELDS)
+
+    @classmethod
+    def column_index(cls, header):
+        pos = {h.strip(): i for i, h in enumerate(header)}
+        return [pos.get(name) for name, _ in cls.FIELDS]
+
+    @classmethod
+    def from_cells(cls, cells, index):
+        self = cls.__new__(cls)
+        invalid = None
+        n = len(cells)
+        for (name, parse), i in zip(cls.FIELDS, index):
+            raw = cells[i].strip() if i is not None and i < n else ""
+            value = None
+            if raw:
+                try:
+                    value = parse(raw)
+                except ValueError:
+                    if invalid is None:
+                        invalid = {}
+                    invalid[name] = raw
+            setattr(self, name, value)
+        self.invalid = invalid
+        return self
+
+    @classmethod
+    def from_dict(cls, row):
+        cells = [row.get(name) or "" for name, _ in cls.FIELDS]
+        return cls.from_cells(cells, range(len(cells)))
+
+    @classmethod
+    def from_values(cls, values):
+        # Already-typed values in FIELDS order (e.g. a packed snapshot's columns)
+        self = cls.__new__(cls)
+        for (name, _), v in zip(cls.FIELDS, values):
+            setattr(self, name, v)
+        self.invalid = None
+        return self
+
+    def get(self, name, default=None):
+        v = getattr(self, name, None)
+        return default if v is None else v
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name, _ in self.FIELDS}
+
+    def __repr__(self):
+        body = ", ".join(f"{k}={v!r}" for k, v in self.as_dict().items())
+        return f"{type(self).__name__}({body})"
+
+class WatchlistRow(Record):
+    FIELDS = (
+        ("ticker", _text), ("name", _text),
+        ("last", float), ("prev_close", float), ("month_ago_close", float),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+class Dividend(Record):
+    FIELDS = (
+        ("ticker", _text), ("name", _text),
+        ("ex_date", _date), ("pay_date", _date),
+        ("amount", _text),  # free text with unit, e.g. "2.3p", "$0.75"
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+class Stock(Record):
+    FIELDS = (
+        ("ticker", _text), ("isin", _text), ("name", _text),
+        ("exchange", _sym), ("country", _sym), ("sector", _sym), ("currency", _sym),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+class Bond(Record):
+    FIELDS = (
+        ("ticker", _text), ("isin", _text), ("issuer", _text),
+        ("coupon", float), ("maturity", _date), ("price", float),
+        ("ytm", float), ("running_yield", float), ("currency", _sym),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+class NewsItem(Record):
+    # copies: how many feed items were collapsed into this one (news_dedup)
+    FIELDS = (("title", _text), ("url", _text), ("copies", int))
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+    @classmethod
+    def from_item(cls, it):
+        # Same title/url fallbacks the jq normalizer used; None if untitled
+        if not isinstance(it, dict):
+            return None
+        title = it.get("title") or it.get("headline") or it.get("name") or it.get("summary") or ""
+        url   = it.get("url")   or it.get("link")     or it.get("href")    or "#"
+        if not title:
+            return None
+        copies = it.get("copies")
+        self = cls.__new__(cls)
+        self.title, self.url, self.invalid = str(title), str(url), None
+        self.copies = copies if type(copies) is int and copies > 0 else 1
+        return self
+
+def read_header(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [h.strip() for h in next(csv.reader(f), [])]
+
+def iter_records(path, cls):
+    # Stream typed records; the header is resolved once per file
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        index = cls.column_index(next(reader, []))
+        for cells in reader:
+            if cells:
+                yield cls.from_cells(cells, index)
+
+def load_records(path, cls):
+    return list(iter_records(path, cls))
+
+def read_columns(path, cls):
+    # Column-batch form of iter_records: {field: [typed values]} without a
+    # record object per row; feeds the NumPy analytics.
+    names = cls.columns()
+    cols = {name: [] for name in names}
+    appends = [cols[name].append for name in names]
+    for rec in iter_records(path, cls):
+        for name, append in zip(names, appends):
+            append(getattr(rec, name))
+    return cols
+
+def find_list(blob):
+    # Normalize to a list of items from many possible shapes
+    if isinstance(blob, list):
+        return blob
+    if not isinstance(blob, dict):
+        return []
+    for path in (
+        ("articles",),
+        ("items",),
+        ("news",),
+        ("data","articles"),
+        ("payload","items"),
+        ("results",),
+    ):
+        cur = blob
+        ok = True
+        for k in path:
+            if isinstance(cur, dict) and k in cur:
+                cur = cur[k]
+            else:
+                ok = False
+                break
+        if ok and isinstance(cur, list):
+            return cur
+    return []
+
+def iter_news(blob):
+    for it in find_list(blob):
+        item = NewsItem.from_item(it)
+        if item is not None:
+            yield item
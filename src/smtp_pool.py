@@ -0,0 +1,238 @@
+# Pooled SMTP delivery for per-recipient fan-out.
+#
+# A few authenticated connections are opened lazily and reused for many
+# messages; a thread pool sends one message per recipient through them, under
+# a shared send-rate cap, and reports a result per recipient. race_connect()
+# picks the port: candidates are probed concurrently, happy-eyeballs style,
+# and the first completed handshake wins.
+import json, os, queue, smtplib, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+# Errors that mean "this connection is unusable", not "this recipient is bad"
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)
+
+def permanent(e):
+    # Rejected credentials or a 5xx answer to the message itself: sending the
+    # same thing again gets the same answer
+    if isinstance(e, (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused)):
+        return True
+    return isinstance(e, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)) and e.smtp_code >= 500
+
+class RateLimiter:
+    # Token bucket shared by all sender threads; rate <= 0 disables the cap
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+class SMTPPool:
+    def __init__(self, connect, size=4, max_per_conn=200):
+        self.connect = connect  # () -> logged-in smtplib.SMTP
+        self.size = size
+        self.max_per_conn = max_per_conn
+        self.idle = queue.LifoQueue()
+        self.sem = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self):
+        self.sem.acquire()
+        try:
+            conn, used = self.idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn, used = self.connect(), 0
+            except BaseException:
+                self.sem.release()
+                raise
+            with self.lock:
+                self.opened += 1
+        return conn, used
+
+    def release(self, conn, used, broken=False):
+        try:
+            if broken or used >= self.max_per_conn:
+                _quit(conn)
+            else:
+                self.idle.put((conn, used))
+        finally:
+            self.sem.release()
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            _quit(conn)
+
+def _quit(conn):
+    try:
+        conn.quit()
+    except Exception:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+def race_connect(handshake, ports, deadline, stagger=0.25, timeout=20):
+    # handshake(port, timeout) -> connected SMTP (EHLO/STARTTLS done).
+    # Ports start `stagger` seconds apart, or immediately when the previous
+    # one fails. Returns (port, conn, probes_started); losers are closed.
+    results = queue.Queue()
+    pending = list(ports)
+    started = 0
+    running = 0
+    won = threading.Event()
+    lock = threading.Lock()
+    last_error = None
+
+    def attempt(p, t):
+        try:
+            conn = handshake(p, t)
+        except Exception as e:
+            results.put((p, None, e))
+            return
+        with lock:
+            lost = won.is_set()
+            if not lost:
+                results.put((p, conn, None))
+        if lost:
+            _quit(conn)  # a faster port already won
+
+    def finish():
+        with lock:
+            won.set()
+        # Close any other winner that was queued before won was set
+        while True:
+            try:
+                _, other, _ = results.get_nowait()
+            except queue.Empty:
+                return
+            if other is not None:
+                _quit(other)
+
+    def launch():
+        nonlocal started, running
+        p = pending.pop(0)
+        t = max(0.1, min(timeout, deadline - time.monotonic()))
+        threading.Thread(target=attempt, args=(p, t), daemon=True).start()
+        started += 1
+        running += 1
+
+    launch()
+    next_start = time.monotonic() + stagger
+    while running or pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        if pending and (not running or now >= next_start):
+            launch()
+            next_start = now + stagger
+            continue
+        wait = deadline - now
+        if pending:
+            wait = min(wait, next_start - now)
+        try:
+            p, conn, err = results.get(timeout=max(0.0, wait))
+        except queue.Empty:
+            continue
+        running -= 1
+        if conn is not None:
+            finish()
+            return p, conn, started
+        last_error = err
+    finish()
+    raise last_error or TimeoutError(f"no SMTP port answered before the deadline ({ports})")
+
+def load_port(path, host):
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        return int(state[host]["port"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def save_port(path, host, port):
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if not isinstance(state, dict):
+            state = {}
+    except (OSError, ValueError):
+        state = {}
+    state[host] = {"port": port, "ts": int(time.time())}
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # best effort; next run just probes in the default order
+
+def send_one(pool, limiter, sender, rcpt, build, retries=3):
+    result = {"recipient": rcpt, "ok": False, "attempts": 0, "error": None}
+    data = build(rcpt)
+    for attempt in range(1, retries + 1):
+        result["attempts"] = attempt
+        limiter.wait()
+        try:
+            conn, used = pool.acquire()
+        except Exception as e:
+            result["error"] = f"connect: {e}"
+            if permanent(e):
+                return result
+            time.sleep(min(2 ** attempt, 10))
+            continue
+        broken = False
+        try:
+            conn.sendmail(sender, [rcpt], data)
+            used += 1
+            result["ok"], result["error"] = True, None
+            return result
+        except smtplib.SMTPRecipientsRefused as e:
+            # Permanent per-recipient failure; retrying won't help
+            result["error"] = str(e.recipients.get(rcpt, e))
+            return result
+        except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+            # Caught before CONNECTION_ERRORS (SMTPException is an OSError):
+            # a 5xx here is final, a 4xx is worth another connection
+            broken = True
+            result["error"] = str(e)
+            if permanent(e):
+                return result
+        except CONNECTION_ERRORS as e:
+            broken = True
+            result["error"] = str(e) or type(e).__name__
+        except smtplib.SMTPException as e:
+            broken = True  # connection state is unknown after a failed transaction
+            result["error"] = str(e)
+        finally:
+            pool.release(conn, used, broken=broken)
+    return result
+
+def send_bulk(pool, sender, recipients, build, workers=4, rate=0, retries=3):
+    # build(rcpt) -> message string, called in the worker so only in-flight
+    # messages are held in memory. Yields one result dict per recipient.
+    limiter = RateLimiter(rate, burst=workers)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futs = [ex.submit(send_one, pool, limiter, sender, rcpt, build, retries)
+                for rcpt in recipients]
+        for fut in futs:
+            yield fut.result()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# Sparkline engine for the watchlist.
+#
+# Each ticker's close series is downsampled to a fixed point count with LTTB
+# (largest-triangle-three-buckets), vectorized across every series of the same
+# length, then encoded as a tiny 1-bit palette PNG (or an SVG polyline) with
+# nothing but zlib. Images are cached on disk by series hash, so unchanged
+# tickers are never re-encoded, and cache misses are spread over a process
+# pool. Every image must fit the README's 10KB budget.
+import argparse, base64, csv, hashlib, html, math, os, struct, sys, zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+CACHE_DIR = os.path.join(".cache", "sparklines")
+MAX_BYTES = 10 * 1024           # per image, base64 data URI included
+WIDTH, HEIGHT = 100, 24
+UP, DOWN = (5, 150, 105), (220, 38, 38)   # .chg.up / .chg.down in the report CSS
+ENGINE_VERSION = 1
+
+# --- downsampling -----------------------------------------------------------
+
+def lttb(Y, lengths, n_out):
+    # Y: (k, n) series padded to a common width, lengths: (k,) real lengths,
+    # all > n_out. Returns (k, n_out) indices. The bucket walk is sequential,
+    # so it is vectorized across series instead: n_out steps for any watchlist.
+    k = len(Y)
+    rows = np.arange(k)
+    every = (lengths - 2) / (n_out - 2)
+    bounds = np.floor(np.arange(n_out - 1)[None, :] * every[:, None]).astype(np.int64) + 1
+    bounds[:, -1] = lengths - 1
+    nxt = np.concatenate([bounds[:, 2:], lengths[:, None]], axis=1)  # end of the next bucket
+    csum = np.concatenate([np.zeros((k, 1)), np.cumsum(Y, axis=1)], axis=1)
+    idx = np.empty((k, n_out), dtype=np.int64)
+    idx[:, 0], idx[rows, -1] = 0, lengths - 1
+    a = np.zeros(k, dtype=np.int64)
+    span = np.arange((bounds[:, 1:] - bounds[:, :-1]).max())[None, :]
+    for b in range(n_out - 2):
+        lo, hi, nhi = bounds[:, b], bounds[:, b + 1], nxt[:, b]
+        avg_x = (hi + nhi - 1) / 2.0
+        avg_y = (csum[rows, nhi] - csum[rows, hi]) / (nhi - hi)
+        ax, ay = a.astype(np.float64), Y[rows, a]
+        xs = lo[:, None] + span
+        inside = xs < hi[:, None]
+        xs = np.where(inside, xs, lo[:, None])
+        ys = np.take_along_axis(Y, xs, axis=1)
+        area = np.abs((ax - avg_x)[:, None] * (ys - ay[:, None])
+                      - (ax[:, None] - xs) * (avg_y - ay)[:, None])
+        a = np.take_along_axis(xs, np.where(inside, area, -1.0).argmax(axis=1)[:, None], axis=1)[:, 0]
+        idx[:, b + 1] = a
+    return idx
+
+def downsample(series, points):
+    # series: list of 1-D arrays of any lengths -> list of <= points values.
+    # Short series pass through; the rest go through one padded LTTB call.
+    out = list(series)
+    long = [i for i, s in enumerate(series) if len(s) > points]
+    if long:
+        lengths = np.array([len(series[i]) for i in long])
+        Y = np.zeros((len(long), lengths.max()))
+        for row, i in enumerate(long):
+            Y[row, :lengths[row]] = series[i]
+        picked = np.take_along_axis(Y, lttb(Y, lengths, points), axis=1)
+        for row, i in enumerate(long):
+            out[i] = picked[row]
+    return out
+
+# --- encoding ---------------------------------------------------------------
+
+def _chunk(kind, data):
+    body = kind + data
+    return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+def encode_png(y, width=WIDTH, height=HEIGHT):
+    # 1-bit palette PNG: transparent background, one line colour.
+    n = len(y)
+    lo, hi = float(np.min(y)), float(np.max(y))
+    span = hi - lo or 1.0
+    rows = np.rint((hi - y) / span * (height - 1)).astype(np.int64)  # 0 = top
+    cols = np.rint(np.linspace(0, width - 1, n)).astype(np.int64)
+    # Column spans between consecutive points, filled with one broadcast
+    px = np.full(width, -1, dtype=np.int64)
+    px[cols] = rows
+    known = np.flatnonzero(px >= 0)
+    px = np.rint(np.interp(np.arange(width), known, px[known])).astype(np.int64)
+    prev = np.concatenate([px[:1], px[:-1]])
+    top, bot = np.minimum(prev, px), np.maximum(prev, px)
+    grid = np.arange(height)[:, None]
+    mask = (grid >= top[None, :]) & (grid <= bot[None, :])
+
+    raw = np.packbits(mask, axis=1)
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), raw]).tobytes()  # filter 0
+    colour = UP if y[-1] >= y[0] else DOWN
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 1, 3, 0, 0, 0)),
+        _chunk(b"PLTE", bytes((255, 255, 255) + colour)),
+        _chunk(b"tRNS", b"\x00"),
+        _chunk(b"IDAT", zlib.compress(raw, 9)),
+        _chunk(b"IEND", b""),
+    ])
+
+def encode_svg(y, width=WIDTH, height=HEIGHT):
+    lo, hi = float(np.min(y)), float(np.max(y))
+    span = hi - lo or 1.0
+    xs = np.linspace(0, width - 1, len(y))
+    ys = (hi - y) / span * (height - 2) + 1
+    pts = " ".join(f"{a:.1f},{b:.1f}" for a, b in zip(xs, ys))
+    colour = "#%02x%02x%02x" % (UP if y[-1] >= y[0] else DOWN)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">'
+            f'<polyline fill="none" stroke="{colour}" stroke-width="1.5" points="{pts}"/></svg>').encode()
+
+def data_uri(img, fmt):
+    mime = "image/png" if fmt == "png" else "image/svg+xml"
+    return f"data:{mime};base64," + base64.b64encode(img).decode("ascii")
+
+def render_one(y, fmt, points, width, height):
+    # Shrink until the data URI fits the budget (never needed at the defaults)
+    while True:
+        img = encode_png(y, width, height) if fmt == "png" else encode_svg(y, width, height)
+        uri = data_uri(img, fmt)
+        if len(uri) <= MAX_BYTES or len(y) <= 8:
+            break
+        y = downsample([y], max(8, len(y) // 2))[0]
+    if len(uri) > MAX_BYTES:
+        raise ValueError(f"sparkline exceeds {MAX_BYTES} bytes")
+    return uri
+
+def _render_chunk(job):
+    tickers, series, fmt, points, width, height = job
+    small = downsample(series, points)
+    return [(t, render_one(y, fmt, points, width, height)) for t, y in zip(tickers, small)]
+
+# --- cache + fan-out --------------------------------------------------------
+
+def series_key(y, fmt, points, width, height):
+    h = hashlib.sha256(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    h.update(f"{ENGINE_VERSION}:{fmt}:{points}:{width}x{height}".encode())
+    return h.hexdigest()
+
+def generate(series_by_ticker, fmt="png", points=WIDTH, width=WIDTH, height=HEIGHT,
+             cache_dir=CACHE_DIR, workers=None, chunk=256):
+    # Returns ({ticker: data URI}, stats)
+    out, misses = {}, []
+    for t, y in series_by_ticker.items():
+        y = np.asarray(y, dtype=np.float64)
+        y = y[~np.isnan(y)]
+        if len(y) < 2:
+            continue
+        key = series_key(y, fmt, points, width, height)
+        path = os.path.join(cache_dir, key[:2], key)
+        try:
+            with open(path, encoding="ascii") as f:
+                out[t] = f.read()
+        except OSError:
+            misses.append((t, y, path))
+
+    if misses:
+        jobs = [([t for t, _, _ in misses[i:i + chunk]], [y for _, y, _ in misses[i:i + chunk]],
+                 fmt, points, width, height) for i in range(0, len(misses), chunk)]
+        paths = {t: p for t, _, p in misses}
+        if len(jobs) == 1 or workers == 1:
+            batches = map(_render_chunk, jobs)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                batches = list(ex.map(_render_chunk, jobs))
+        for batch in batches:
+            for t, uri in batch:
+                out[t] = uri
+                path = paths[t]
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="ascii") as f:
+                    f.write(uri)
+                os.replace(tmp, path)
+    return out, {"tickers": len(out), "encoded": len(misses), "cached": len(out) - len(misses)}
+
+# --- inputs / outputs -------------------------------------------------------
+
+def read_history_csv(path):
+    # Long format: date,ticker,close (any order; sorted by date per ticker)
+    rows = defaultdict(list)
+    with open(path, newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            try:
+                rows[r["ticker"].strip()].append((r["date"].strip(), float(r["close"])))
+            except (KeyError, ValueError, AttributeError):
+                continue
+    return {t: np.array([c for _, c in sorted(v)]) for t, v in rows.items()}
+
+def read_history_store(root, days, tickers=None):
+    # Zero-copy windows of the mmap'd price history; None if there isn't one
+    from price_history import PriceHistory
+    try:
+        h = PriceHistory(root)
+    except FileNotFoundError:
+        return None
+    if h.length < 2:
+        return None
+    start = h.dates[-1] - np.timedelta64(days, "D")
+    return {t: h.series(t, start)[1] for t in (tickers or h.tickers) if t in h.index}
+
+def read_prices_csv(path):
+    # Fallback when no history exists: month-ago, previous and last close
+    from report_model import WatchlistRow, iter_records
+    out = {}
+    for r in iter_records(path, WatchlistRow):
+        out[r.ticker] = np.array([math.nan if v is None else v
+                                  for v in (r.month_ago_close, r.prev_close, r.last)])
+    return out
+
+def write_outputs(tickers, uris, names, b64_path, html_path, width=WIDTH, height=HEIGHT):
+    # Tickers without a usable series get "n/a" instead of an image
+    with open(b64_path, "w", encoding="utf-8") as f:
+        for t in sorted(uris):
+            f.write(f"{t}|{uris[t]}\n")
+    with open(html_path, "w", encoding="utf-8") as f:
+        for t in sorted(tickers):
+            cell = (f'<img src="{uris[t]}" width="{width}" height="{height}" alt="{html.escape(t)} trend">'
+                    if t in uris else "n/a")
+            f.write(f'<tr><td>{html.escape(t)}</td><td>{html.escape(names.get(t, ""))}</td>'
+                    f'<td>{cell}</td></tr>\n')
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--history", help="CSV of date,ticker,close instead of the history store")
+    p.add_argument("--store", default=None, help="price history store (default: $PRICE_HISTORY)")
+    p.add_argument("--days", type=int, default=92, help="calendar days of history per sparkline")
+    p.add_argument("--prices", default="prices.csv",
+                   help="names, and a 3-point series when there is no history")
+    p.add_argument("--format", choices=("png", "svg"), default="png")
+    p.add_argument("--points", type=int, default=WIDTH)
+    p.add_argument("--width", type=int, default=WIDTH)
+    p.add_argument("--height", type=int, default=HEIGHT)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--cache-dir", default=CACHE_DIR)
+    p.add_argument("--b64-out", default="sparklines_base64.txt")
+    p.add_argument("--html-out", default="watchlist_with_sparklines.html")
+    args = p.parse_args()
+
+    names = {}
+    try:
+        from report_model import WatchlistRow, iter_records
+        names = {r.ticker: r.name or "" for r in iter_records(args.prices, WatchlistRow)}
+    except OSError:
+        pass
+    if args.history:
+        series = read_history_csv(args.history)
+    else:
+        from price_history import HISTORY_DIR
+        stored = read_history_store(args.store or HISTORY_DIR, args.days, list(names)) or {}
+        # Tickers the store can't draw yet fall back to the 3-point series
+        series = read_prices_csv(args.prices) if os.path.exists(args.prices) else {}
+        series.update((t, y) for t, y in stored.items() if np.isfinite(y).sum() >= 2)
+    uris, stats = generate(series, args.format, args.points, args.width, args.height,
+                           cache_dir=args.cache_dir, workers=args.workers)
+    write_outputs(series, uris, names, args.b64_out, args.html_out, args.width, args.height)
+    largest = max((len(u) for u in uris.values()), default=0)
+    print(f"Sparklines: {stats['tickers']} tickers, {stats['encoded']} encoded, "
+          f"{stats['cached']} from cache, largest {largest} bytes")
+
+if __name__ == "__main__":
+    sys.exit(main())
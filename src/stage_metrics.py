@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# Per-stage timing for run_daily_report.sh.
+#
+#   python3 src/stage_metrics.py --stage render -- python3 render_template.py ...
+#
+# runs the command and emits one JSON line (to --log / $STAGE_LOG, else stderr)
+# with wall time, CPU time, peak RSS and bytes read/written for the whole
+# process tree. Python stages can add their own fields with record(), and
+# wrap their entry point in run_main() so $STAGE_PROFILE_DIR dumps cProfile
+# and tracemalloc data.
+import argparse, json, os, subprocess, sys, tempfile, time
+from datetime import datetime, timezone
+
+def _proc_io(pid):
+    io = {}
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                k, _, v = line.partition(":")
+                io[k] = int(v)
+    except (OSError, ValueError):
+        pass
+    return io
+
+def run_stage(stage, cmd, log=None, profile_dir=None):
+    env = dict(os.environ, STAGE_NAME=stage)
+    if profile_dir:
+        env["STAGE_PROFILE_DIR"] = profile_dir
+    fd, extra_path = tempfile.mkstemp(prefix=f"stage-{stage}-", suffix=".json")
+    os.close(fd)
+    env["STAGE_METRICS_FILE"] = extra_path
+
+    started = datetime.now(timezone.utc)
+    t0 = time.perf_counter()
+    try:
+        proc = subprocess.Popen(cmd, env=env)
+    except OSError as e:
+        os.unlink(extra_path)
+        print(f"{stage}: cannot start {cmd[0]}: {e}", file=sys.stderr)
+        return 127
+    # Wait without reaping so /proc/<pid>/io is still readable, then reap
+    # with wait4() to collect the rusage of the child and its descendants.
+    os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+    io = _proc_io(proc.pid)
+    _, status, ru = os.wait4(proc.pid, 0)
+    proc.returncode = code = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - t0
+
+    line = {
+        "stage": stage,
+        "ts": started.isoformat(timespec="seconds"),
+        "exit": code,
+        "wall_s": round(wall, 4),
+        "cpu_user_s": round(ru.ru_utime, 4),
+        "cpu_sys_s": round(ru.ru_stime, 4),
+        "max_rss_kb": ru.ru_maxrss,
+        "read_bytes": io.get("rchar"),
+        "write_bytes": io.get("wchar"),
+    }
+    try:
+        with open(extra_path, encoding="utf-8") as f:
+            line.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    finally:
+        os.unlink(extra_path)
+
+    emit(line, log)
+    return code if code >= 0 else 128 - code
+
+def emit(line, log=None):
+    text = json.dumps(line, separators=(",", ":")) + "\n"
+    log = log or os.getenv("STAGE_LOG")
+    if log:
+        with open(log, "a", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stderr.write(text)
+
+def record(**fields):
+    # Attach stage-specific fields (e.g. smtp_port, attempts) to the JSON line
+    path = os.getenv("STAGE_METRICS_FILE")
+    if not path:
+        return
+    try:
+        with open(path, encoding="utf-8") as f:
+            cur = json.load(f)
+    except (OSError, ValueError):
+        cur = {}
+    cur.update(fields)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cur, f)
+
+def run_main(fn, stage=None):
+    prof_dir = os.getenv("STAGE_PROFILE_DIR")
+    if not prof_dir:
+        return fn()
+    import cProfile, tracemalloc
+    stage = stage or os.getenv("STAGE_NAME") or os.path.basename(sys.argv[0])
+    os.makedirs(prof_dir, exist_ok=True)
+    tracemalloc.start(25)
+    prof = cProfile.Profile()
+    try:
+        return prof.runcall(fn)
+    finally:
+        prof.dump_stats(os.path.join(prof_dir, f"{stage}.prof"))
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+        cur, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(os.path.join(prof_dir, f"{stage}.tracemalloc.txt"), "w", encoding="utf-8") as f:
+            f.write(f"current={cur} peak={peak}\n")
+            for stat in snap.statistics("lineno")[:30]:
+                f.write(f"{stat}\n")
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--stage", required=True)
+    p.add_argument("--log", default=None)
+    p.add_argument("--profile", metavar="DIR", default=None,
+                   help="dump cProfile/tracemalloc output for Python stages into DIR")
+    p.add_argument("cmd", nargs=argparse.REMAINDER)
+    args = p.parse_args()
+    cmd = args.cmd[1:] if args.cmd[:1] == ["--"] else args.cmd
+    if not cmd:
+        p.error("missing command")
+    return run_stage(args.stage, cmd, log=args.log, profile_dir=args.profile)
+
+if __name__ == "__main__":
+    sys.exit(main())
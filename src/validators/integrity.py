@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# Referential integrity across the input files.
+#
+# data/stock.csv is the reference universe. Its (ticker, exchange) listings are
+# built once and cached under .cache/integrity keyed by the file's SHA-256 (its
+# own size/mtime hash cache means an unchanged file isn't even re-read), then
+# every dependent file is checked with set lookups. ISIN check digits are validated
+# for whole columns at once with a vectorized Luhn pass.
+import argparse, csv, json, os, sys
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from file_hashes import cached_sha256, load_hash_cache, save_hash_cache
+
+REFERENCE = "data/stock.csv"
+INDEX_DIR = os.path.join(".cache", "integrity")
+HASH_CACHE = os.path.join(INDEX_DIR, "hashes.json")
+INDEX_VERSION = 2
+# (file, column) pairs whose values must be listings in the reference. These
+# use watchlist tickers: BARC.L for London, bare symbols for US listings
+# (same convention as market_fetch.EXCHANGES), while stock.csv keeps the bare
+# ticker plus the exchange MIC.
+TICKER_REFS = (("prices.csv", "ticker"), ("dividends.csv", "ticker"))
+# (file, column) pairs holding ISINs. Bond tickers are bond identifiers
+# (UKT-1.25-2032), so bonds are checked by ISIN rather than against stock.csv.
+ISIN_COLUMNS = (("data/stock.csv", "isin"), ("data/bonds.csv", "isin"))
+EXCHANGE_SUFFIXES = {"L": ("XLON",)}
+US_MICS = ("XNAS", "XNYS", "XASE", "ARCX", "BATS")
+MAX_ERRORS = 100
+
+def read_column(path, name):
+    # [(line number, value)] for one column, streaming the file once
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader, [])]
+        if name not in header:
+            raise KeyError(f"{path} has no {name} column")
+        i = header.index(name)
+        return [(reader.line_num, (cells[i] if i < len(cells) else "").strip())
+                for cells in reader if cells]
+
+# --- reference index --------------------------------------------------------
+
+def build_index(path):
+    tickers = read_column(path, "ticker")
+    exchanges = dict(read_column(path, "exchange"))
+    return {"listings": sorted({f"{t}:{exchanges.get(line, '').upper()}"
+                                for line, t in tickers if t})}
+
+def load_index(path, cache_dir=INDEX_DIR):
+    # Returns ({"listings": {"TICKER:MIC", ...}}, cache hit?)
+    hashes = load_hash_cache(".", HASH_CACHE)
+    digest = cached_sha256(".", path, hashes)
+    if digest is None:
+        raise FileNotFoundError(path)
+    save_hash_cache(".", hashes, HASH_CACHE)
+    cache_path = os.path.join(cache_dir, f"{digest}.v{INDEX_VERSION}.json")
+    hit = True
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        hit = False
+        index = build_index(path)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp, cache_path)
+        except OSError:
+            pass  # the cache is only an optimisation
+    return {k: set(v) for k, v in index.items()}, hit
+
+# --- ISIN check digits ------------------------------------------------------
+
+def isin_valid(isins):
+    # Vectorized ISO 6166 check: 2 letters, 9 alphanumerics, 1 digit, and the
+    # Luhn sum over the expanded digits (A=10 ... Z=35) divisible by 10.
+    isins = list(isins)
+    ok = np.array([len(s) == 12 and s.isascii() for s in isins], dtype=bool)
+    if not ok.any():
+        return ok
+    raw = np.frombuffer("".join(s if k else "0" * 12 for s, k in zip(isins, ok)).encode("ascii"),
+                        dtype=np.uint8).reshape(-1, 12)
+    is_digit = (raw >= ord("0")) & (raw <= ord("9"))
+    is_letter = (raw >= ord("A")) & (raw <= ord("Z"))
+    ok &= (is_digit | is_letter).all(axis=1)
+    ok &= is_letter[:, :2].all(axis=1) & is_digit[:, 11]
+    val = np.where(is_digit, raw - ord("0"), raw.astype(np.int64) - ord("A") + 10).astype(np.int64)
+    # Each letter expands to two digits; position 0 is the rightmost digit
+    width = 1 + is_letter.astype(np.int64)
+    pos_lo = np.cumsum(width[:, ::-1], axis=1)[:, ::-1] - width
+    def luhn(d, pos):
+        doubled = 2 * d
+        return np.where(pos % 2 == 1, doubled - 9 * (doubled > 9), d)
+    total = luhn(val % 10, pos_lo).sum(axis=1)
+    total += np.where(is_letter, luhn(val // 10, pos_lo + 1), 0).sum(axis=1)
+    return ok & (total % 10 == 0)
+
+# --- checks -----------------------------------------------------------------
+
+def error(line, column, code, value, message):
+    return {"line": line, "column": column, "code": code, "value": value, "message": message}
+
+def listing_keys(ticker):
+    # BARC.L -> ["BARC:XLON"]; MSFT -> ["MSFT:XNAS", "MSFT:XNYS", ...]. A dot
+    # that isn't a known suffix is part of a US symbol (BRK.B).
+    base, _, suffix = ticker.rpartition(".")
+    mics = EXCHANGE_SUFFIXES.get(suffix.upper()) if base else None
+    if mics is None:
+        base, mics = ticker, US_MICS
+    return [f"{base}:{mic}" for mic in mics]
+
+def check_tickers(path, column, listings, reference=REFERENCE, max_errors=MAX_ERRORS):
+    rows = read_column(path, column)
+    errors = [error(line, column, "unknown_ticker", t,
+                    f"ticker {t!r} ({keys[0].partition(':')[0]} on "
+                    f"{'a US exchange' if len(keys) > 1 else keys[0].partition(':')[2]}) "
+                    f"is not listed in {reference}")
+              for line, t in rows if t
+              for keys in [listing_keys(t)] if not any(k in listings for k in keys)]
+    return {"file": path, "check": "tickers", "rows": len(rows),
+            "errors": errors[:max_errors], "truncated": len(errors) > max_errors, "ok": not errors}
+
+def check_isins(path, column, max_errors=MAX_ERRORS):
+    rows = [(line, v) for line, v in read_column(path, column) if v]
+    valid = isin_valid(v for _, v in rows)
+    bad = np.flatnonzero(~valid)
+    errors = [error(rows[i][0], column, "isin_checksum", rows[i][1],
+                    f"ISIN {rows[i][1]!r} has an invalid format or check digit")
+              for i in bad[:max_errors]]
+    return {"file": path, "check": "isins", "rows": len(rows),
+            "errors": errors, "truncated": len(bad) > max_errors, "ok": not len(bad)}
+
+def run(reference=REFERENCE, max_errors=MAX_ERRORS):
+    index, hit = load_index(reference)
+    reports = []
+    for path, column in TICKER_REFS:
+        if os.path.isfile(path):
+            reports.append(check_tickers(path, column, index["listings"], reference, max_errors))
+    for path, column in ISIN_COLUMNS:
+        if os.path.isfile(path):
+            reports.append(check_isins(path, column, max_errors))
+    return {"reference": reference, "listings": len(index["listings"]),
+            "index_cached": hit, "reports": reports, "ok": all(r["ok"] for r in reports)}
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--reference", default=REFERENCE)
+    p.add_argument("--format", choices=("text", "json"), default="text")
+    p.add_argument("--max-errors", type=int, default=MAX_ERRORS, help="per file")
+    args = p.parse_args()
+
+    if not os.path.isfile(args.reference):
+        print(f"NOTE: {args.reference} not found; skipping integrity checks.")
+        return 0
+    result = run(args.reference, args.max_errors)
+    if args.format == "json":
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(f"Reference {args.reference}: {result['listings']} listings "
+              f"({'cached index' if result['index_cached'] else 'index rebuilt'})")
+        for r in result["reports"]:
+            status = "✅" if r["ok"] else "❌"
+            print(f"{status} {r['file']} ({r['check']}): {r['rows']} rows, {len(r['errors'])} error(s)"
+                  f"{' (truncated)' if r['truncated'] else ''}")
+            for e in r["errors"]:
+                print(f" - Line {e['line']}: {e['message']}")
+    return 0 if result["ok"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# Schema-driven CSV validation.
+#
+# A schema (stock.schema.json, bond.schema.json) declares per-column rules:
+#   type      string | number | date (ISO)
+#   required  empty cell is an error
+#   pattern   regex the whole cell must match
+#   enum      allowed values
+#   minimum / exclusiveMinimum / maximum / exclusiveMaximum   for numbers
+#   maxLength for strings
+# plus "unique": lists of column sets that must not repeat.
+#
+# The file is cut into ~8MB byte ranges on line boundaries and each range is
+# checked column-at-a-time in a worker process; results come back in file
+# order, so line numbers are exact and the run stops as soon as --max-errors
+# have been collected. Quoted fields containing newlines are not supported.
+#
+# Complete results are cached in .cache/validation per (file, schema): an
+# unchanged file is a hit without re-reading it, and a file that only grew is
+# recognised by the SHA-256 of the previously validated prefix, so just the
+# appended tail is checked (duplicates against the prefix included).
+import argparse, csv, gc, hashlib, io, json, os, re, sys, time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CHUNK_BYTES = 8 << 20
+MAX_ERRORS = 100
+CACHE_DIR = os.path.join(".cache", "validation")
+CACHE_VERSION = 1
+
+PARSERS = {"string": None, "number": float, "date": date.fromisoformat}
+
+class SchemaError(ValueError):
+    pass
+
+class Column:
+    def __init__(self, name, spec):
+        self.name = name
+        self.type = spec.get("type", "string")
+        if self.type not in PARSERS:
+            raise SchemaError(f"{name}: unknown type {self.type!r}")
+        self.parse = PARSERS[self.type]
+        self.required = bool(spec.get("required"))
+        self.pattern = re.compile(spec["pattern"]).fullmatch if "pattern" in spec else None
+        self.enum = frozenset(spec["enum"]) if "enum" in spec else None
+        self.max_length = spec.get("maxLength")
+        self.bounds = [(spec[k], op, k) for k, op in (
+            ("minimum", lambda x, b: x >= b), ("exclusiveMinimum", lambda x, b: x > b),
+            ("maximum", lambda x, b: x <= b), ("exclusiveMaximum", lambda x, b: x < b),
+        ) if k in spec]
+
+    def check_value(self, raw):
+        # [(code, message)] for one cell
+        v = raw.strip()
+        if not v:
+            return [("required", f"missing {self.name}")] if self.required else []
+        out = []
+        if self.parse is not None:
+            try:
+                x = self.parse(v)
+            except ValueError:
+                return [("type", f"{self.name} is not a valid {self.type}")]
+            out += [(key, f"{self.name} {v} violates {key} {bound}")
+                    for bound, ok, key in self.bounds if not ok(x, bound)]
+        if self.pattern is not None and not self.pattern(v):
+            out.append(("pattern", f"{self.name} {v!r} does not match the expected format"))
+        if self.enum is not None and v not in self.enum:
+            out.append(("enum", f"{self.name} {v!r} is not one of the allowed values"))
+        if self.max_length is not None and len(v) > self.max_length:
+            out.append(("maxLength", f"{self.name} is longer than {self.max_length}"))
+        return out
+
+    def column_ok(self, distinct):
+        # Whole-column pass with C-level builtins; False means "look closer"
+        vals = set(map(str.strip, distinct))
+        if "" in vals:
+            if self.required:
+                return False
+            vals.discard("")
+        if not vals:
+            return True
+        if self.parse is not None:
+            try:
+                xs = list(map(self.parse, vals))
+            except ValueError:
+                return False
+            # min/max skip over a nan in the middle, so look for one first
+            if any(x != x for x in xs):
+                return False
+            lo, hi = min(xs), max(xs)
+            if not all(ok(lo, b) and ok(hi, b) for b, ok, _ in self.bounds):
+                return False
+        if self.pattern is not None and not all(map(self.pattern, vals)):
+            return False
+        if self.enum is not None and not vals <= self.enum:
+            return False
+        return self.max_length is None or max(map(len, vals)) <= self.max_length
+
+    def check(self, values):
+        # Yields (row index, code, raw value, message). Rules only look at the
+        # cell, so each distinct value is checked once, and only a column that
+        # fails the whole-column pass is checked value by value.
+        distinct = set(values)
+        if self.column_ok(distinct):
+            return
+        bad = {}
+        for v in distinct:
+            errs = self.check_value(v)
+            if errs:
+                bad[v] = errs
+        if bad:
+            for i, v in enumerate(values):
+                if v in bad:
+                    for code, msg in bad[v]:
+                        yield i, code, v, msg
+
+class Schema:
+    def __init__(self, spec):
+        self.name = spec.get("name", "schema")
+        self.files = spec.get("files", [])
+        self.columns = [Column(n, c) for n, c in spec.get("columns", {}).items()]
+        self.unique = [tuple(u) for u in spec.get("unique", [])]
+        known = {c.name for c in self.columns}
+        for key in self.unique:
+            if not set(key) <= known:
+                raise SchemaError(f"unique key {key} names unknown columns")
+
+    def missing_columns(self, header):
+        return [c.name for c in self.columns if c.required and c.name not in header]
+
+def schema_path(name):
+    # "stock" -> <repo>/stock.schema.json; paths are used as given
+    if os.path.exists(name):
+        return name
+    return os.path.join(ROOT, f"{name}.schema.json")
+
+@contextmanager
+def no_gc():
+    # Chunks allocate millions of short-lived lists/tuples and no cycles;
+    # letting the cyclic collector run over them costs ~30%
+    was = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was:
+            gc.enable()
+
+# --- worker side ------------------------------------------------------------
+
+_schema = None
+
+def _use_schema(schema):
+    global _schema
+    _schema = schema
+
+def _init_worker(spec):
+    _use_schema(Schema(spec))
+
+def check_chunk(job):
+    with no_gc():
+        return _check_chunk(*job)
+
+def _check_chunk(path, start, end, header, max_errors):
+    # Returns (lines, rows, [(rel line, column, code, value, message)],
+    #          {unique key index: [(64-bit key digest, rel line)]})
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8", errors="replace")
+    nlines = text.count("\n") + (1 if text and not text.endswith("\n") else 0)
+
+    if '"' in text:
+        reader = csv.reader(io.StringIO(text))
+        lines, rows = [], []
+        for cells in reader:
+            if cells:
+                lines.append(reader.line_num)
+                rows.append(cells)
+    else:
+        # No quoting anywhere in the range: plain splits give the same cells
+        parts = text.replace("\r\n", "\n").split("\n")
+        lines = [n for n, line in enumerate(parts, 1) if line]
+        rows = [line.split(",") for line in parts if line]
+    pos = {h: i for i, h in enumerate(header)}
+    width = len(header)
+    for cells in rows:
+        if len(cells) < width:
+            cells.extend([""] * (width - len(cells)))
+    columns = list(zip(*rows)) if rows else [()] * width
+
+    errors = []
+    for col in _schema.columns:
+        i = pos.get(col.name)
+        if i is None:
+            continue
+        for row, code, raw, msg in col.check(columns[i]):
+            errors.append((lines[row], col.name, code, raw, msg))
+    errors.sort()
+    del errors[max_errors:]
+
+    keys = {}
+    for k, key in enumerate(_schema.unique):
+        idx = [pos[c] for c in key if c in pos]
+        if len(idx) == len(key):
+            keys[k] = [(int.from_bytes(hashlib.blake2b(
+                           "\x1f".join(parts).encode(), digest_size=8).digest(), "little"), line)
+                       for parts, line in zip(zip(*(columns[j] for j in idx)), lines)]
+    return nlines, len(rows), errors, keys
+
+# --- result cache -----------------------------------------------------------
+
+class KeyIndex:
+    # First line of each unique-key digest: a sorted array carried over from
+    # the cached prefix, plus a dict for the rows checked in this run
+    def __init__(self, digests=None, lines=None):
+        self.digests = np.empty(0, np.uint64) if digests is None else digests
+        self.lines = np.empty(0, np.int64) if lines is None else lines
+        self.new = {}
+
+    def add(self, digests, line0):
+        # Yields (line, first line) for each repeat
+        if len(self.digests):
+            arr = np.fromiter((d for d, _ in digests), np.uint64, len(digests))
+            pos = np.minimum(np.searchsorted(self.digests, arr), len(self.digests) - 1)
+            hit = np.flatnonzero(self.digests[pos] == arr)
+            old = dict(zip(hit.tolist(), self.lines[pos[hit]].tolist()))
+        else:
+            old = {}
+        new = self.new
+        for i, (digest, rel) in enumerate(digests):
+            prev = old.get(i) or new.setdefault(digest, line0 + rel)
+            if prev != line0 + rel:
+                yield line0 + rel, prev
+
+    def arrays(self):
+        d = np.concatenate([self.digests, np.fromiter(self.new, np.uint64, len(self.new))])
+        l = np.concatenate([self.lines, np.fromiter(self.new.values(), np.int64, len(self.new))])
+        order = np.argsort(d, kind="stable")
+        return d[order], l[order]
+
+def cache_path(cache_dir, path, spec):
+    key = hashlib.sha256(json.dumps([CACHE_VERSION, os.path.abspath(path), spec],
+                                    sort_keys=True).encode()).hexdigest()[:32]
+    return os.path.join(cache_dir, f"{key}.npz")
+
+def load_state(cpath):
+    try:
+        with np.load(cpath) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("version") != CACHE_VERSION:
+                return None
+            meta["keys"] = [(z[f"d{k}"], z[f"l{k}"]) for k in range(meta["nkeys"])]
+            return meta
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_state(cpath, meta, indexes):
+    try:
+        os.makedirs(os.path.dirname(cpath), exist_ok=True)
+        arrays = {}
+        for k, idx in enumerate(indexes):
+            arrays[f"d{k}"], arrays[f"l{k}"] = idx.arrays()
+        meta = dict(meta, version=CACHE_VERSION, nkeys=len(indexes))
+        tmp = f"{cpath}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, cpath)
+    except OSError:
+        pass  # the cache is only an optimisation
+
+def match_state(path, state):
+    # -> ("hit" | "append" | "miss", sha256 of the whole file). Unchanged
+    # size+mtime is trusted without hashing; otherwise the cached prefix has
+    # to hash to what was validated, and must have ended on a line boundary.
+    st = os.stat(path)
+    if state and state["size"] == st.st_size and state["mtime_ns"] == st.st_mtime_ns:
+        return "hit", state["sha256"]
+    h = hashlib.sha256()
+    how = "miss"
+    with open(path, "rb") as f:
+        if state and st.st_size >= state["size"]:
+            left = state["size"]
+            while left:
+                block = f.read(min(left, 1 << 20))
+                if not block:
+                    break
+                h.update(block)
+                left -= len(block)
+            if h.hexdigest() == state["sha256"]:
+                how = "hit" if st.st_size == state["size"] else "append" if state["ends_newline"] else "miss"
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return how, h.hexdigest()
+
+# --- driver -----------------------------------------------------------------
+
+def split_ranges(path, start, chunk_bytes):
+    # Byte ranges that end on a newline
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def validate(path, schema, spec=None, workers=None, max_errors=MAX_ERRORS, chunk_bytes=CHUNK_BYTES,
+             cache_dir=None):
+    # Returns a JSON-ready report. `spec` (the schema's JSON) is what worker
+    # processes rebuild the schema from; without it everything runs inline.
+    # With a cache_dir (and spec) complete results are cached and reused.
+    t0 = time.perf_counter()
+    report = {"file": path, "schema": schema.name, "rows": 0, "errors": [],
+              "truncated": False, "ok": False, "cache": "off", "checked_bytes": 0}
+    with open(path, "rb") as f:
+        first = f.readline()
+        body_start = f.tell()
+    header = [h.strip() for h in next(csv.reader([first.decode("utf-8-sig")]), [])]
+    missing = schema.missing_columns(header)
+    if missing:
+        report["errors"] = [{"line": 1, "column": c, "code": "missing_column", "value": None,
+                             "message": f"missing required column {c}"} for c in missing]
+        report["seconds"] = round(time.perf_counter() - t0, 3)
+        return report
+
+    seen = [KeyIndex() for _ in schema.unique]
+    errors, line0, rows = report["errors"], 1, 0
+    cpath = cache_path(cache_dir, path, spec) if cache_dir and spec is not None else None
+    if cpath:
+        state = load_state(cpath)
+        how, digest = match_state(path, state)
+        report["cache"] = how
+        if how == "hit":
+            report["rows"] = state["rows"]
+            report["errors"] = state["errors"][:max_errors]
+            report["truncated"] = len(state["errors"]) > max_errors
+            report["ok"] = not state["errors"]
+            report["seconds"] = round(time.perf_counter() - t0, 3)
+            return report
+        if how == "append":
+            body_start, line0, rows = state["size"], state["lines"], state["rows"]
+            errors.extend(state["errors"][:max_errors])
+            seen = [KeyIndex(d, l) for d, l in state["keys"]]
+    jobs = [(path, s, e, header, max_errors) for s, e in split_ranges(path, body_start, chunk_bytes)]
+    report["checked_bytes"] = jobs[-1][2] - body_start if jobs else 0
+
+    def consume(results):
+        nonlocal line0, rows
+        for nlines, nrows, errs, keys in results:
+            found = [{"line": line0 + rel, "column": c, "code": code, "value": raw, "message": msg}
+                     for rel, c, code, raw, msg in errs]
+            for k, digests in keys.items():
+                for line, prev in seen[k].add(digests, line0):
+                    found.append({"line": line, "column": ",".join(schema.unique[k]),
+                                  "code": "duplicate", "value": None,
+                                  "message": f"duplicate ({', '.join(schema.unique[k])}) of line {prev}"})
+            found.sort(key=lambda e: e["line"])
+            errors.extend(found)
+            line0 += nlines
+            rows += nrows
+            if len(errors) >= max_errors:
+                del errors[max_errors:]
+                report["truncated"] = True
+                return
+
+    if len(jobs) <= 1 or workers == 1 or spec is None:
+        _use_schema(schema)
+        with no_gc():
+            consume(map(check_chunk, jobs))
+    else:
+        ex = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec,))
+        try:
+            with no_gc():
+                consume(ex.map(check_chunk, jobs))
+        finally:
+            ex.shutdown(wait=True, cancel_futures=True)
+    report["rows"] = rows
+    report["ok"] = not errors
+    if cpath and not report["truncated"]:
+        # Only complete runs are resumable
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            f.seek(max(st.st_size - 1, 0))
+            ends_newline = f.read(1) in (b"\n", b"")
+        save_state(cpath, {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest,
+                           "ends_newline": ends_newline, "lines": line0, "rows": rows,
+                           "errors": errors}, seen)
+    report["seconds"] = round(time.perf_counter() - t0, 3)
+    return report
+
+def find_file(schema):
+    for p in schema.files:
+        if os.path.isfile(p):
+            return p
+    return None
+
+def cache_note(report):
+    how = report.get("cache", "off")
+    if how == "off":
+        return ""
+    if how == "hit":
+        return " (cache hit)"
+    return f" (cache {how}: checked {report['checked_bytes']} bytes)"
+
+def print_text(report, out=sys.stdout):
+    status = "✅" if report["ok"] else "❌"
+    print(f"{status} {report['file']} ({report['schema']}): {report['rows']} rows, "
+          f"{len(report['errors'])} error(s){' (stopped early)' if report['truncated'] else ''} "
+          f"in {report['seconds']}s{cache_note(report)}", file=out)
+    for e in report["errors"]:
+        print(f" - Line {e['line']}: {e['message']}", file=out)
+
+def run(schema_name, path=None, fmt="text", workers=None, max_errors=MAX_ERRORS, cache_dir=CACHE_DIR):
+    # Shared by the CLI and the stock/bond wrappers. Exit codes: 0 ok,
+    # 1 row errors, 2 missing columns or unusable schema, 0 with a note if
+    # there is no file to check.
+    try:
+        sp = schema_path(schema_name)
+        with open(sp, encoding="utf-8") as f:
+            spec = json.load(f)
+        schema = Schema(spec)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: schema {schema_name}: {e}", file=sys.stderr)
+        return 2
+    path = path or find_file(schema)
+    if not path:
+        print(f"NOTE: no {schema.name} CSV found; skipping validation.")
+        return 0
+    report = validate(path, schema, spec, workers=workers, max_errors=max_errors, cache_dir=cache_dir)
+    if fmt == "json":
+        print(json.dumps(report, ensure_ascii=False))
+    elif fmt == "jsonl":
+        for e in report["errors"]:
+            print(json.dumps({"file": path, **e}, ensure_ascii=False))
+    else:
+        print_text(report)
+    if report["ok"]:
+        return 0
+    return 2 if any(e["code"] == "missing_column" for e in report["errors"]) else 1
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("schema", help="schema name (stock, bond) or path to a *.schema.json")
+    p.add_argument("csv", nargs="?", help="file to check (default: the schema's `files`)")
+    p.add_argument("--format", choices=("text", "json", "jsonl"), default="json")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--max-errors", type=int, default=MAX_ERRORS)
+    p.add_argument("--cache-dir", default=CACHE_DIR)
+    p.add_argument("--no-cache", action="store_true", help="validate the whole file, ignore cached results")
+    args = p.parse_args()
+    return run(args.schema, args.csv, args.format, args.workers, args.max_errors,
+               None if args.no_cache else args.cache_dir)
+
+if __name__ == "__main__":
+    sys.exit(main())
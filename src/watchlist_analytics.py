@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# Vectorized watchlist analytics: day/month % change, ranks, top/bottom-N
+# movers and threshold buckets in one NumPy pass over prices.csv, emitted in
+# the `movers` shape base_email.html.j2 consumes.
+import argparse, json, math, os, sys
+import numpy as np
+
+from price_history import HISTORY_DIR, PriceHistory
+from report_model import WatchlistRow, read_columns
+
+# Same cut-offs as the Movers table styling in base_email.html.j2
+BUCKETS = ("strong_down", "down", "flat", "up", "strong_up")
+
+def floats(values):
+    return np.fromiter((math.nan if v is None else v for v in values), dtype=np.float64,
+                       count=len(values))
+
+def load_watchlist(path, history=None, snapshot=None):
+    # month_ago_close comes from the price history store when it has a close
+    # for the ticker; the CSV column is only the fallback. With a packed input
+    # snapshot only its prices.* sections are read.
+    cols = snapshot.columns("prices", WatchlistRow) if snapshot else read_columns(path, WatchlistRow)
+    wl = {
+        "ticker": np.array(cols["ticker"], dtype=object),
+        "name": np.array(cols["name"], dtype=object),
+        "last": floats(cols["last"]),
+        "prev_close": floats(cols["prev_close"]),
+        "month_ago_close": floats(cols["month_ago_close"]),
+    }
+    if history is not None and history.length:
+        stored = history.month_ago_close(cols["ticker"])
+        wl["month_ago_close"] = np.where(np.isnan(stored), wl["month_ago_close"], stored)
+    return wl
+
+def open_history(root):
+    try:
+        return PriceHistory(root)
+    except FileNotFoundError:
+        return None
+
+def pct_change(new, old):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = (new / old - 1.0) * 100.0
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+def rank_desc(x):
+    # 1 = largest; NaNs rank after every real value
+    order = np.argsort(np.where(np.isnan(x), -np.inf, x), kind="stable")[::-1]
+    ranks = np.empty(len(x), dtype=np.int64)
+    ranks[order] = np.arange(1, len(x) + 1)
+    return ranks
+
+def bucketize(x):
+    # Index into BUCKETS, -1 for NaN: > 2 strong_up, > 0.5 up, < -2
+    # strong_down, < -0.5 down, otherwise flat
+    idx = np.select([x > 2.0, x > 0.5, x < -2.0, x < -0.5], [4, 3, 0, 1], default=2)
+    return np.where(np.isnan(x), -1, idx)
+
+def top_n(x, n, largest=True):
+    # argpartition keeps this O(len) before sorting only the winners
+    valid = np.flatnonzero(~np.isnan(x))
+    n = min(n, len(valid))
+    if n == 0:
+        return valid[:0]
+    vals = x[valid] if largest else -x[valid]
+    part = valid[np.argpartition(-vals, n - 1)[:n]]
+    key = x[part] if largest else -x[part]
+    return part[np.argsort(-key, kind="stable")]
+
+def analyze(wl, n=5, by="day"):
+    day = pct_change(wl["last"], wl["prev_close"])
+    month = pct_change(wl["last"], wl["month_ago_close"])
+    metric = day if by == "day" else month
+    ranks = rank_desc(metric)
+    buckets = bucketize(metric)
+
+    gainers = top_n(metric, n, largest=True)
+    losers = top_n(metric, n, largest=False)
+    losers = losers[~np.isin(losers, gainers)]
+
+    def pct(v):
+        return None if np.isnan(v) else round(float(v), 4)
+
+    def row(i):
+        # delta_pct (what the template shows) is the change that was ranked
+        # and bucketed; both changes are kept alongside
+        return {
+            "ticker": wl["ticker"][i],
+            "name": wl["name"][i],
+            "delta_pct": pct(metric[i]),
+            "day_pct": pct(day[i]),
+            "month_pct": pct(month[i]),
+            "rank": int(ranks[i]),
+            "bucket": BUCKETS[buckets[i]] if buckets[i] >= 0 else None,
+        }
+
+    counts = np.bincount(buckets[buckets >= 0], minlength=len(BUCKETS))
+    return {
+        "movers": [row(i) for i in np.concatenate([gainers, losers])],
+        "buckets": {b: int(c) for b, c in zip(BUCKETS, counts)},
+        "by": by,
+        "count": int(len(metric)),
+        "missing": int(np.isnan(metric).sum()),
+    }
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--prices", default="prices.csv")
+    p.add_argument("--snapshot", default=os.getenv("INPUT_SNAPSHOT"),
+                   help="read prices from a packed input snapshot instead of --prices")
+    p.add_argument("--history", default=HISTORY_DIR, help="price history store for month_ago_close")
+    p.add_argument("--top", type=int, default=5, help="N gainers and N losers")
+    p.add_argument("--by", choices=("day", "month"), default="day")
+    p.add_argument("--out", help="write the result JSON here (default: stdout)")
+    p.add_argument("--merge", metavar="PAYLOAD",
+                   help="set movers/mover_buckets in this email payload JSON in place")
+    args = p.parse_args()
+
+    snap = None
+    if args.snapshot:
+        from input_snapshot import Snapshot
+        snap = Snapshot(args.snapshot)
+    wl = load_watchlist(args.prices, open_history(args.history), snap)
+    result = analyze(wl, n=args.top, by=args.by)
+
+    if args.merge:
+        with open(args.merge, encoding="utf-8") as f:
+            payload = json.load(f)
+        payload["movers"] = result["movers"]
+        payload["mover_buckets"] = result["buckets"]
+        tmp = f"{args.merge}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, args.merge)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    elif not args.merge:
+        print(text)
+
+if __name__ == "__main__":
+    sys.exit(main())